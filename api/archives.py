@@ -0,0 +1,61 @@
+"""
+Archive Module
+Iterates over the images contained in uploaded files (plain images, zip or tar archives)
+"""
+import os
+import tarfile
+import zipfile
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp')
+ZIP_CONTENT_TYPES = ('application/zip', 'application/x-zip-compressed')
+TAR_CONTENT_TYPES = ('application/x-tar', 'application/gzip', 'application/x-gzip', 'application/x-gtar')
+
+
+def archive_kind(filename: Optional[str], content_type: Optional[str]) -> Optional[str]:
+    """Return 'zip', 'tar' or None (plain file) for an uploaded file"""
+    name = (filename or "").lower()
+    content_type = (content_type or "").lower()
+    if name.endswith('.zip') or content_type in ZIP_CONTENT_TYPES:
+        return 'zip'
+    if name.endswith(('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')) or content_type in TAR_CONTENT_TYPES:
+        return 'tar'
+    return None
+
+
+def _is_image_name(name: str) -> bool:
+    base = os.path.basename(name)
+    return not base.startswith('.') and base.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def iter_archive_images(fileobj: BinaryIO, kind: str, max_bytes: Optional[int] = None) -> Iterator[Tuple[str, Optional[bytes]]]:
+    """
+    Lazily yield (member name, bytes) for every image inside an archive
+
+    Members are read one at a time, so memory stays bounded by the largest
+    single image rather than the archive size. Members larger than
+    ``max_bytes`` (uncompressed) are not read; they are yielded with None.
+    """
+    if kind == 'zip':
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not _is_image_name(info.filename):
+                    continue
+                if max_bytes and info.file_size > max_bytes:
+                    yield info.filename, None
+                    continue
+                yield info.filename, archive.read(info)
+    elif kind == 'tar':
+        # Streaming mode ("r|*") reads members sequentially without seeking
+        with tarfile.open(fileobj=fileobj, mode='r|*') as archive:
+            for member in archive:
+                if not member.isfile() or not _is_image_name(member.name):
+                    continue
+                if max_bytes and member.size > max_bytes:
+                    yield member.name, None
+                    continue
+                extracted = archive.extractfile(member)
+                if extracted is not None:
+                    yield member.name, extracted.read()
+    else:
+        raise ValueError(f"Unsupported archive type: {kind}")
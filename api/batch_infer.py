@@ -0,0 +1,373 @@
+"""
+Offline Bulk Inference
+Runs the model over directories of images without going through the HTTP API
+
+Usage:
+    python -m api.batch_infer photos/ --output results.jsonl
+    python -m api.batch_infer "field_2024/**/*.jpg" --output results.sqlite --batch-size 16
+    python -m api.batch_infer photos/ --output results_parquet/ --format parquet --resume
+
+Images are decoded (at reduced JPEG resolution when possible) in a process
+pool while the main process runs batched inference, so decoding and the model
+keep all cores busy. Successfully predicted paths are appended to a checkpoint
+file after every write; with --resume they are skipped, so an interrupted run
+continues where it stopped and images that failed are tried again.
+
+Failed images are written too, with their error. A resumed run therefore
+appends a second row for each image it retries: JSONL and Parquet readers
+must keep the last row per path (SQLite output replaces the row itself).
+For example with pandas:
+
+    df.drop_duplicates("path", keep="last")
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+from PIL import Image
+
+from .archives import IMAGE_EXTENSIONS
+
+OUTPUT_FORMATS = ("jsonl", "parquet", "sqlite")
+
+
+def find_images(inputs: Iterable[str], recursive: bool = True) -> List[str]:
+    """Expand files, directories and glob patterns into a sorted, de-duplicated list of image paths"""
+    found = set()
+    for entry in inputs:
+        if os.path.isdir(entry):
+            pattern = os.path.join(entry, "**", "*") if recursive else os.path.join(entry, "*")
+            candidates = glob.iglob(pattern, recursive=recursive)
+        elif glob.has_magic(entry):
+            candidates = glob.iglob(entry, recursive=True)
+        else:
+            candidates = [entry]
+        for path in candidates:
+            if os.path.isfile(path) and path.lower().endswith(IMAGE_EXTENSIONS):
+                found.add(os.path.normpath(path))
+    return sorted(found)
+
+
+def _load_image(path: str, input_size: Optional[int], max_pixels: int) -> Tuple[str, Optional[np.ndarray], Optional[Tuple[int, int]], Optional[str]]:
+    """Decode one image in a worker process; returns (path, RGB array, original size, error)"""
+    from .decoding import decode_image, open_image
+
+    try:
+        with open(path, "rb") as f:
+            image = open_image(f.read(), max_pixels)
+        original_size = image.size
+        return path, np.asarray(decode_image(image, input_size)), original_size, None
+    except Exception as e:
+        return path, None, None, f"Error decoding image: {str(e)}"
+
+
+def iter_decoded(paths: List[str], workers: int, input_size: Optional[int], max_pixels: int, prefetch: int) -> Iterator[Tuple[str, Optional[np.ndarray], Optional[Tuple[int, int]], Optional[str]]]:
+    """
+    Decode images in a process pool, in input order
+
+    At most ``prefetch`` decoded images wait for the model at any time, so
+    memory stays bounded however far decoding runs ahead.
+    """
+    # spawn, not fork: the parent already runs inference threads
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        pending = deque()
+        remaining = iter(paths)
+        for path in remaining:
+            pending.append(pool.submit(_load_image, path, input_size, max_pixels))
+            if len(pending) >= prefetch:
+                break
+        while pending:
+            result = pending.popleft().result()
+            next_path = next(remaining, None)
+            if next_path is not None:
+                pending.append(pool.submit(_load_image, next_path, input_size, max_pixels))
+            yield result
+
+
+class Checkpoint:
+    """Append-only list of successfully predicted image paths"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self) -> Set[str]:
+        if not os.path.exists(self.path):
+            return set()
+        with open(self.path) as f:
+            return {line.rstrip("\n") for line in f if line.strip()}
+
+    def add(self, paths: List[str]):
+        with open(self.path, "a") as f:
+            f.write("".join(p + "\n" for p in paths))
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class JsonlWriter:
+    """One JSON object per image, appended (a retried path appears again; the last line wins)"""
+
+    def __init__(self, path: str):
+        self._file = open(path, "a")
+
+    def write(self, rows: List[Dict]) -> bool:
+        self._file.write("".join(json.dumps(row) + "\n" for row in rows))
+        self._file.flush()
+        return True
+
+    def close(self):
+        self._file.close()
+
+
+class SqliteWriter:
+    """Rows in a batch_predictions table, one transaction per batch (re-runs replace rows)"""
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS batch_predictions (
+                path TEXT PRIMARY KEY,
+                model_version TEXT,
+                width INTEGER,
+                height INTEGER,
+                num_detections INTEGER,
+                predictions_json TEXT,
+                error TEXT
+            )
+        """)
+        self._conn.commit()
+
+    def write(self, rows: List[Dict]) -> bool:
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO batch_predictions VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        row["path"], row["model_version"], row["width"], row["height"], row["num_detections"],
+                        json.dumps({k: row[k] for k in ("boxes", "classes", "confidences")}) if row["error"] is None else None,
+                        row["error"],
+                    )
+                    for row in rows
+                ],
+            )
+        return True
+
+    def close(self):
+        self._conn.close()
+
+
+class ParquetWriter:
+    """
+    Parquet part files in an output directory
+
+    A Parquet file is only readable once its footer is written, so rows are
+    buffered and written as complete part files of ``rows_per_file`` rows.
+    ``write`` returns True when the buffered rows became durable. Retried
+    paths reappear in a later part file; the row in the highest part wins.
+    """
+
+    def __init__(self, path: str, rows_per_file: int = 10000):
+        import pyarrow as pa
+
+        self.directory = path
+        self.rows_per_file = max(1, rows_per_file)
+        os.makedirs(path, exist_ok=True)
+        self._part = len(glob.glob(os.path.join(path, "part-*.parquet")))
+        self._rows: List[Dict] = []
+        self._schema = pa.schema([
+            ("path", pa.string()),
+            ("model_version", pa.string()),
+            ("width", pa.int32()),
+            ("height", pa.int32()),
+            ("num_detections", pa.int32()),
+            ("boxes", pa.list_(pa.list_(pa.float32()))),
+            ("classes", pa.list_(pa.string())),
+            ("confidences", pa.list_(pa.float32())),
+            ("error", pa.string()),
+        ])
+
+    def write(self, rows: List[Dict]) -> bool:
+        self._rows.extend(rows)
+        if len(self._rows) < self.rows_per_file:
+            return False
+        self._flush()
+        return True
+
+    def _flush(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not self._rows:
+            return
+        columns = {name: [row.get(name) for row in self._rows] for name in self._schema.names}
+        target = os.path.join(self.directory, f"part-{self._part:05d}.parquet")
+        pq.write_table(pa.Table.from_pydict(columns, schema=self._schema), target + ".tmp", compression="zstd")
+        os.replace(target + ".tmp", target)  # never leave a half-written part behind
+        self._part += 1
+        self._rows = []
+
+    def close(self):
+        self._flush()
+
+
+def open_writer(path: str, output_format: str, parquet_rows: int):
+    if output_format == "jsonl":
+        return JsonlWriter(path)
+    if output_format == "sqlite":
+        return SqliteWriter(path)
+    if output_format == "parquet":
+        return ParquetWriter(path, parquet_rows)
+    raise ValueError(f"Unknown output format: {output_format}")
+
+
+def infer_format(output: str) -> str:
+    """Guess the output format from the output path"""
+    lower = output.lower()
+    if lower.endswith((".sqlite", ".sqlite3", ".db")):
+        return "sqlite"
+    if lower.endswith(".parquet") or lower.endswith("/"):
+        return "parquet"
+    return "jsonl"
+
+
+def run(
+    paths: List[str],
+    writer,
+    checkpoint: Checkpoint,
+    batch_size: int,
+    workers: int,
+    input_size: Optional[int],
+    max_pixels: int,
+    model_version: Optional[str],
+    progress_interval: float = 10.0,
+) -> Dict:
+    """Decode, predict and write every path; returns throughput statistics"""
+    from .decoding import rescale_predictions
+    from .predictor import predict_batch
+
+    start = time.perf_counter()
+    last_report = start
+    inference_seconds = 0.0
+    done = failed = 0
+    unsaved: List[str] = []  # written but not yet durable (Parquet buffering)
+
+    decoded = iter_decoded(paths, workers, input_size, max_pixels, prefetch=batch_size * 4)
+    while True:
+        chunk = [item for _, item in zip(range(batch_size), decoded)]
+        if not chunk:
+            break
+
+        images = [Image.fromarray(array) for _, array, _, error in chunk if error is None]
+        t0 = time.perf_counter()
+        results = iter(predict_batch(images) if images else [])
+        inference_seconds += time.perf_counter() - t0
+
+        rows = []
+        for path, array, original_size, error in chunk:
+            predictions = next(results) if error is None else None
+            if error is None and predictions is None:
+                error = "Prediction failed"
+            if predictions is not None:
+                predictions = rescale_predictions(predictions, (array.shape[1], array.shape[0]), original_size)
+            rows.append({
+                "path": path,
+                "model_version": model_version,
+                "width": original_size[0] if original_size else None,
+                "height": original_size[1] if original_size else None,
+                "num_detections": len(predictions["boxes"]) if predictions else 0,
+                "boxes": predictions["boxes"] if predictions else None,
+                "classes": predictions["classes"] if predictions else None,
+                "confidences": predictions["confidences"] if predictions else None,
+                "error": error,
+            })
+            failed += error is not None
+
+        # Failed images are written with their error but not checkpointed, so --resume retries them
+        unsaved.extend(row["path"] for row in rows if row["error"] is None)
+        if writer.write(rows):
+            checkpoint.add(unsaved)
+            unsaved = []
+        done += len(chunk)
+
+        now = time.perf_counter()
+        if now - last_report >= progress_interval:
+            last_report = now
+            rate = done / (now - start)
+            print(f"{done}/{len(paths)} images, {rate:.1f} images/s, {failed} failed", file=sys.stderr)
+
+    writer.close()
+    if unsaved:
+        checkpoint.add(unsaved)
+
+    elapsed = time.perf_counter() - start
+    return {
+        "images": done,
+        "failed": failed,
+        "seconds": round(elapsed, 3),
+        "images_per_second": round(done / elapsed, 2) if elapsed > 0 else 0.0,
+        "inference_seconds": round(inference_seconds, 3),
+        "batch_size": batch_size,
+        "decode_workers": workers,
+    }
+
+
+def main(argv=None):
+    from . import config
+    from .model_loader import get_model, get_model_version, load_model
+    from .predictor import get_input_size
+
+    parser = argparse.ArgumentParser(description="Run weed detection over directories of images")
+    parser.add_argument("inputs", nargs="+", help="Image files, directories or glob patterns")
+    parser.add_argument("--output", required=True, help="Output file (.jsonl, .sqlite) or directory (Parquet)")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default=None, help="Output format (default: from --output)")
+    parser.add_argument("--model", default=None, help="Model path (default: auto-detect in models/)")
+    parser.add_argument("--batch-size", type=int, default=config.BATCH_MAX_SIZE, help="Images per forward pass")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Decode processes")
+    parser.add_argument("--no-recursive", action="store_true", help="Do not descend into subdirectories")
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint file (default: <output>.checkpoint)")
+    parser.add_argument("--resume", action="store_true", help="Skip images listed in the checkpoint")
+    parser.add_argument("--full-decode", action="store_true", help="Decode JPEGs at full resolution")
+    parser.add_argument("--parquet-rows", type=int, default=10000, help="Rows per Parquet part file")
+    args = parser.parse_args(argv)
+
+    output_format = args.format or infer_format(args.output)
+    checkpoint = Checkpoint(args.checkpoint or args.output.rstrip("/") + ".checkpoint")
+    if not args.resume and os.path.exists(checkpoint.path):
+        print(f"❌ {checkpoint.path} exists. Pass --resume to continue that run or delete it.", file=sys.stderr)
+        return 1
+
+    paths = find_images(args.inputs, recursive=not args.no_recursive)
+    finished = checkpoint.load() if args.resume else set()
+    todo = [p for p in paths if p not in finished]
+    print(f"Found {len(paths)} images, {len(paths) - len(todo)} already done", file=sys.stderr)
+    if not todo:
+        return 0
+
+    load_model(args.model)
+    input_size = None if args.full_decode else max(get_input_size(get_model()))
+    writer = open_writer(args.output, output_format, args.parquet_rows)
+    stats = run(
+        todo,
+        writer,
+        checkpoint,
+        batch_size=max(1, args.batch_size),
+        workers=max(1, args.workers),
+        input_size=input_size,
+        max_pixels=config.MAX_IMAGE_PIXELS,
+        model_version=get_model_version(),
+    )
+    print(json.dumps(stats), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+"""
+Batching Module
+Collects concurrent /predict requests into batched forward passes
+"""
+import asyncio
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+
+from PIL import Image
+
+from .executors import BoundedExecutor, ExecutorBusyError
+
+
+class InferenceBatcher:
+    """
+    In-process dynamic micro-batching scheduler
+
+    Requests are queued as they arrive. A background task takes the first
+    queued request, waits up to ``max_wait_ms`` for more to arrive (or until
+    ``max_batch_size`` is reached) and runs them through the model as one
+    batch. Every caller gets its own result back through a future.
+
+    Batches run on ``executor`` (the loop's default pool when None), with at
+    most one batch in flight per executor worker. At most ``max_queue``
+    requests may wait; beyond that ``submit`` raises ExecutorBusyError.
+    """
+
+    def __init__(
+        self,
+        predict_fn: Callable[[List[Image.Image]], List[Optional[Dict]]],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10.0,
+        executor: Optional[BoundedExecutor] = None,
+        max_queue: int = 0,
+        retry_after: int = 1,
+    ):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.executor = executor
+        self.max_queue = max(0, max_queue)
+        self.retry_after = retry_after
+        self.max_concurrent_batches = executor.max_workers if executor is not None else 1
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._running = set()
+
+        # Metrics
+        self._batches = 0
+        self._items = 0
+        self._batch_sizes = Counter()
+
+    async def start(self):
+        """Start the background batching task (call from the running event loop)"""
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the batching task and fail any requests still waiting"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Batcher stopped"))
+
+    async def submit(self, image: Image.Image) -> Optional[Dict]:
+        """Queue an image for prediction and wait for its result"""
+        if self._task is None:
+            raise RuntimeError("Batcher not started")
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((image, future))
+        except asyncio.QueueFull:
+            raise ExecutorBusyError("batcher", self.retry_after)
+        return await future
+
+    async def _collect(self) -> List[tuple]:
+        """Wait for one request, then gather more until the batch is full or the wait expires"""
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+
+        # Take anything that is already queued without waiting further
+        while len(batch) < self.max_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        """Main loop of the batching task"""
+        while True:
+            # Only form a batch once a worker is free, so requests keep
+            # accumulating (and batches grow) while the model is busy
+            await self._slots.acquire()
+            try:
+                batch = await self._collect()
+            except BaseException:
+                self._slots.release()
+                raise
+            # Drop requests whose callers already gave up
+            batch = [(image, future) for image, future in batch if not future.done()]
+            if not batch:
+                self._slots.release()
+                continue
+
+            task = asyncio.create_task(self._run_batch(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run_batch(self, batch: List[tuple]):
+        """Run one batch through the model and resolve its futures"""
+        try:
+            images = [image for image, _ in batch]
+            if self.executor is not None:
+                results = await self.executor.run_admitted(self.predict_fn, images)
+            else:
+                results = await asyncio.get_running_loop().run_in_executor(None, self.predict_fn, images)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+
+        self._record(len(batch))
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def _record(self, size: int):
+        """Record the size of a completed batch"""
+        self._batches += 1
+        self._items += size
+        self._batch_sizes[size] += 1
+
+    def stats(self) -> Dict:
+        """Achieved batching statistics"""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queue_size": self._queue.qsize() if self._queue is not None else 0,
+            "batches_in_flight": len(self._running),
+            "batches": self._batches,
+            "images": self._items,
+            "avg_batch_size": round(self._items / self._batches, 3) if self._batches else 0.0,
+            "batch_size_histogram": {str(size): count for size, count in sorted(self._batch_sizes.items())},
+        }
@@ -0,0 +1,184 @@
+"""
+Prediction Cache Module
+Content-addressed LRU/TTL cache of prediction results, with an optional SQLite tier
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Iterable, Optional
+
+
+def hash_bytes(data: bytes) -> str:
+    """SHA-256 of an upload, used as its content address"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def make_key(image_hash: str, model_version: str, params: Dict) -> str:
+    """Cache key: image content + model version + every parameter that affects the result"""
+    encoded = json.dumps(params, sort_keys=True, separators=(",", ":"))
+    return f"{image_hash}:{model_version}:{encoded}"
+
+
+class PredictionCache:
+    """
+    Thread-safe LRU cache with per-entry expiry
+
+    Entries live in memory (bounded by ``max_entries``). When ``db_path`` is
+    set they are also written to a SQLite table, so results survive restarts
+    and are shared by all workers on the node. Entries are tied to a model
+    version; when the set of served versions changes (a model is reloaded),
+    everything cached for versions no longer served is dropped. Workers may
+    serve different versions, so a worker only deletes shared rows of
+    versions it served itself and has retired; the rest expire with the TTL.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600.0, db_path: Optional[str] = None):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl_seconds
+        self.db_path = db_path or None
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, value, model_version)
+        self._lock = threading.Lock()
+        self._model_versions: FrozenSet[str] = frozenset()
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+        if self.db_path:
+            self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=5.0, check_same_thread=False)
+
+    def _init_db(self):
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS prediction_cache (
+                    key TEXT PRIMARY KEY,
+                    model_version TEXT,
+                    value TEXT,
+                    expires_at REAL
+                )
+            """)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def retain_model_versions(self, model_versions: Iterable[str]):
+        """
+        Drop every in-memory entry produced by a model version that is not in
+        ``model_versions``, and the shared rows of versions this process stopped serving
+        """
+        versions = frozenset(v for v in model_versions if v)
+        if versions == self._model_versions:
+            return
+        with self._lock:
+            if versions == self._model_versions:
+                return
+            retired = self._model_versions - versions
+            if self._model_versions:
+                self._invalidations += 1
+            self._model_versions = versions
+            for key in [k for k, entry in self._entries.items() if entry[2] not in versions]:
+                del self._entries[key]
+        if self.db_path and retired:
+            # Cascade entries are stored under "<fast>+<accurate>"; match each part
+            condition = " OR ".join("instr('+' || model_version || '+', ?) > 0" for _ in retired)
+            conn = self._connect()
+            try:
+                conn.execute(f"DELETE FROM prediction_cache WHERE {condition}", tuple(f"+{v}+" for v in retired))
+                conn.commit()
+            finally:
+                conn.close()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Return the cached value or None (counts a hit or a miss)"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return entry[1]
+                del self._entries[key]
+
+        row = self._get_from_disk(key, now) if self.db_path else None
+        with self._lock:
+            if row is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._disk_hits += 1
+        value, model_version = row
+        self._put_memory(key, value, now + self.ttl, model_version)
+        return value
+
+    def _get_from_disk(self, key: str, now: float) -> Optional[Dict]:
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT value, model_version FROM prediction_cache WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+        finally:
+            conn.close()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def put(self, key: str, value: Dict, model_version: Optional[str] = None):
+        """Store a value for ``ttl_seconds``"""
+        expires_at = time.time() + self.ttl
+        self._put_memory(key, value, expires_at, model_version)
+        if self.db_path:
+            conn = self._connect()
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO prediction_cache (key, model_version, value, expires_at) VALUES (?, ?, ?, ?)",
+                    (key, model_version, json.dumps(value), expires_at),
+                )
+                conn.execute("DELETE FROM prediction_cache WHERE expires_at <= ?", (time.time(),))
+                conn.commit()
+            finally:
+                conn.close()
+
+    def _put_memory(self, key: str, value: Dict, expires_at: float, model_version: Optional[str]):
+        with self._lock:
+            self._entries[key] = (expires_at, value, model_version)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self):
+        """Remove every entry"""
+        with self._lock:
+            self._entries.clear()
+        if self.db_path:
+            conn = self._connect()
+            try:
+                conn.execute("DELETE FROM prediction_cache")
+                conn.commit()
+            finally:
+                conn.close()
+
+    def stats(self) -> Dict:
+        """Hit/miss counters"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "disk_tier": bool(self.db_path),
+                "model_versions": sorted(self._model_versions),
+                "hits": self._hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+            }
@@ -0,0 +1,150 @@
+"""
+Configuration Module
+Runtime settings read from environment variables (set them in docker-compose or .env)
+"""
+import os
+import tempfile
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    """Read a boolean environment variable ("1", "true", "yes", "on" are true)"""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_int(name: str, default: int) -> int:
+    """Read an integer environment variable"""
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_float(name: str, default: float) -> float:
+    """Read a float environment variable"""
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+
+# Dynamic micro-batching for /predict
+BATCHING_ENABLED = _env_bool("BATCHING_ENABLED", True)
+BATCH_MAX_SIZE = _env_int("BATCH_MAX_SIZE", 8)          # images per forward pass
+BATCH_MAX_WAIT_MS = _env_float("BATCH_MAX_WAIT_MS", 10.0)  # how long the first request waits for company
+
+# Executors: inference (decode + model) and I/O (disk + database) run in separate bounded pools
+INFERENCE_WORKERS = _env_int("INFERENCE_WORKERS", 2)
+INFERENCE_QUEUE_DEPTH = _env_int("INFERENCE_QUEUE_DEPTH", 32)  # waiting requests before answering 503
+IO_WORKERS = _env_int("IO_WORKERS", 4)
+IO_QUEUE_DEPTH = _env_int("IO_QUEUE_DEPTH", 64)
+RETRY_AFTER_SECONDS = _env_int("RETRY_AFTER_SECONDS", 1)  # Retry-After header on 503 responses
+
+# POST /predict/batch
+BATCH_ENDPOINT_MAX_IMAGES = _env_int("BATCH_ENDPOINT_MAX_IMAGES", 2000)  # images per request (archives included)
+
+# Model serving mode: "local" loads the model in every API worker, "shared" sends
+# inference to one model host process per node (python -m api.model_host)
+MODEL_SERVING_MODE = os.getenv("MODEL_SERVING_MODE", "local").strip().lower()
+# The socket lives in a directory only this user can enter (created with mode 0700)
+MODEL_HOST_ADDRESS = os.getenv("MODEL_HOST_ADDRESS", "") or os.path.join(
+    tempfile.gettempdir(), f"cotton_weed_model_host_{getattr(os, 'getuid', lambda: 0)()}", "host.sock"
+)
+MODEL_HOST_AUTHKEY = os.getenv("MODEL_HOST_AUTHKEY", "").encode() or None  # required in shared mode (gunicorn_conf generates one)
+MODEL_HOST_START_TIMEOUT = _env_float("MODEL_HOST_START_TIMEOUT", 120.0)  # seconds to wait for the host to come up
+
+# Detection postprocessing (defaults match the ultralytics predictor)
+CONFIDENCE_THRESHOLD = _env_float("CONFIDENCE_THRESHOLD", 0.25)
+IOU_THRESHOLD = _env_float("IOU_THRESHOLD", 0.7)
+MAX_DETECTIONS = _env_int("MAX_DETECTIONS", 300)
+# Per-request overrides (?conf=, ?iou=, ?max_det=, ?classes=, ?imgsz=)
+RESULT_CONFIDENCE_FLOOR = _env_float("RESULT_CONFIDENCE_FLOOR", 0.05)  # /predict keeps detections down to this, so ?conf= changes need no new forward pass
+MAX_DETECTIONS_LIMIT = _env_int("MAX_DETECTIONS_LIMIT", 1000)  # upper bound for ?max_det=
+MAX_INPUT_SIZE = _env_int("MAX_INPUT_SIZE", 1920)  # upper bound for ?imgsz= (multiples of 32)
+
+# Preprocessing for raw PyTorch/ONNX models
+MODEL_INPUT_SIZE = _env_int("MODEL_INPUT_SIZE", 640)  # square letterbox size when the model does not fix it
+PREPROCESS_PIN_MEMORY = _env_bool("PREPROCESS_PIN_MEMORY", False)  # page-locked input buffers (CUDA only)
+
+# Upload guards and decoding
+MAX_UPLOAD_BYTES = _env_int("MAX_UPLOAD_BYTES", 50 * 1024 * 1024)  # per image, 0 = unlimited
+MAX_IMAGE_PIXELS = _env_int("MAX_IMAGE_PIXELS", 80_000_000)  # width * height, 0 = unlimited
+JPEG_DRAFT_DECODE = _env_bool("JPEG_DRAFT_DECODE", True)  # decode JPEGs at reduced scale when not tiling
+
+# Video inference (/predict/video, python -m api.video)
+VIDEO_FRAME_STRIDE = _env_int("VIDEO_FRAME_STRIDE", 1)  # process every n-th frame
+VIDEO_MAX_BYTES = _env_int("VIDEO_MAX_BYTES", 1024 * 1024 * 1024)  # 0 = unlimited
+VIDEO_MAX_FRAMES = _env_int("VIDEO_MAX_FRAMES", 10000)  # processed frames per request, 0 = unlimited
+TRACKER_IOU_THRESHOLD = _env_float("TRACKER_IOU_THRESHOLD", 0.3)
+TRACKER_MAX_AGE = _env_int("TRACKER_MAX_AGE", 5)  # processed frames a track survives without a match
+TRACKER_HIGH_CONFIDENCE = _env_float("TRACKER_HIGH_CONFIDENCE", 0.5)  # only detections above this start tracks
+
+# Sliced inference for large images (/predict?tiled=true, or automatic)
+TILING_MODE = os.getenv("TILING_MODE", "off").strip().lower()  # off, auto (large images only) or always
+TILE_SIZE = _env_int("TILE_SIZE", 640)  # tile edge in image pixels
+TILE_OVERLAP = _env_float("TILE_OVERLAP", 0.2)  # fraction shared by neighbouring tiles
+TILE_BATCH_SIZE = _env_int("TILE_BATCH_SIZE", 8)  # tiles per forward pass (and in memory at once)
+TILING_MIN_SCALE = _env_float("TILING_MIN_SCALE", 1.5)  # auto mode tiles images longer than TILE_SIZE * this
+TILING_FULL_IMAGE = _env_bool("TILING_FULL_IMAGE", True)  # also predict the downscaled full image
+TILING_MERGE_THRESHOLD = _env_float("TILING_MERGE_THRESHOLD", 0.5)  # intersection over smaller box
+TILING_MAX_DETECTIONS = _env_int("TILING_MAX_DETECTIONS", 3000)
+
+# Model startup
+MODEL_PATH = os.getenv("MODEL_PATH", "")  # model file; empty = search models/ (slower, and ambiguous with several files)
+# Several named models: "yolov8n=models/yolov8n.onnx,yolov8s=models/yolov8s.onnx" (overrides MODEL_PATH)
+MODELS = {
+    name.strip(): path.strip()
+    for name, _, path in (item.partition("=") for item in os.getenv("MODELS", "").split(","))
+    if name.strip() and path.strip()
+}
+DEFAULT_MODEL = os.getenv("DEFAULT_MODEL", next(iter(MODELS), "default"))  # model used when a request names none
+MODEL_DIR = os.getenv("MODEL_DIR", "models")  # /models/{name}/reload only loads files from here
+API_WORKERS = _env_int("API_WORKERS", 1)  # API worker processes on this node (gunicorn_conf.py sets it); local-mode reloads need 1
+MODEL_ADMIN_TOKEN = os.getenv("MODEL_ADMIN_TOKEN", "")  # X-Admin-Token for POST /models/{name}/reload; empty = reloads disabled
+MODEL_FORMAT = os.getenv("MODEL_FORMAT", "auto").strip().lower()  # auto, yolo, pytorch, onnx or tensorflow
+WARMUP_ITERATIONS = _env_int("WARMUP_ITERATIONS", 2)  # forward passes per warm-up batch size, 0 = no warm-up
+WARMUP_BATCH_SIZES = [int(b) for b in os.getenv("WARMUP_BATCH_SIZES", "").split(",") if b.strip()]  # empty = serving batch sizes
+
+# Model cascade: a fast model answers, images it is unsure about are re-run on an accurate model
+CASCADE_ENABLED = _env_bool("CASCADE_ENABLED", False)  # serves requests that name no model
+CASCADE_FAST_MODEL = os.getenv("CASCADE_FAST_MODEL", "") or DEFAULT_MODEL  # names from MODELS
+CASCADE_ACCURATE_MODEL = os.getenv("CASCADE_ACCURATE_MODEL", "")
+CASCADE_UNCERTAIN_LOW = _env_float("CASCADE_UNCERTAIN_LOW", 0.1)  # fast-model confidences in [low, high) are uncertain
+CASCADE_UNCERTAIN_HIGH = _env_float("CASCADE_UNCERTAIN_HIGH", 0.5)
+CASCADE_MIN_UNCERTAIN = _env_int("CASCADE_MIN_UNCERTAIN", 1)  # uncertain detections that escalate an image
+
+# ONNX Runtime backend (CPU)
+PREFER_ONNX = _env_bool("PREFER_ONNX", True)  # serve <model>.onnx instead of <model>.pt when it is up to date
+ORT_INTRA_OP_THREADS = _env_int("ORT_INTRA_OP_THREADS", 0)  # 0 = let onnxruntime decide (one per physical core)
+ORT_INTER_OP_THREADS = _env_int("ORT_INTER_OP_THREADS", 0)
+ORT_GRAPH_OPTIMIZATION = os.getenv("ORT_GRAPH_OPTIMIZATION", "all").strip().lower()  # disable, basic, extended, all
+ORT_EXECUTION_MODE = os.getenv("ORT_EXECUTION_MODE", "sequential").strip().lower()  # sequential or parallel
+ORT_PROVIDERS = [p.strip() for p in os.getenv("ORT_PROVIDERS", "CPUExecutionProvider").split(",") if p.strip()]
+ORT_IO_BINDING = _env_bool("ORT_IO_BINDING", True)
+MODEL_PRECISION = os.getenv("MODEL_PRECISION", "fp32").strip().lower()  # fp32 or int8 (<model>_int8.onnx)
+
+# Content-addressed prediction cache (image hash + model version + thresholds)
+PREDICTION_CACHE_ENABLED = _env_bool("PREDICTION_CACHE_ENABLED", True)
+PREDICTION_CACHE_SIZE = _env_int("PREDICTION_CACHE_SIZE", 1024)  # in-memory entries per worker
+PREDICTION_CACHE_TTL = _env_float("PREDICTION_CACHE_TTL", 3600.0)  # seconds
+PREDICTION_CACHE_DB = os.getenv("PREDICTION_CACHE_DB", "")  # optional SQLite file shared by all workers
+
+# Write-behind persistence of uploads and prediction rows
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+PERSIST_BATCH_SIZE = _env_int("PERSIST_BATCH_SIZE", 64)  # rows per transaction
+PERSIST_FLUSH_INTERVAL_MS = _env_float("PERSIST_FLUSH_INTERVAL_MS", 200.0)
+PERSIST_QUEUE_SIZE = _env_int("PERSIST_QUEUE_SIZE", 10000)  # pending writes before answering 503
+PERSIST_QUEUE_MAX_BYTES = _env_int("PERSIST_QUEUE_MAX_BYTES", 512 * 1024 * 1024)  # pending upload bytes before answering 503, 0 = unlimited
+
+# Live feed (/predictions/stream)
+LIVE_FEED_BUFFER_SIZE = _env_int("LIVE_FEED_BUFFER_SIZE", 1024)  # recent events kept for resume and slow clients
+LIVE_FEED_POLL_MS = _env_float("LIVE_FEED_POLL_MS", 1000.0)  # how quickly rows saved by other workers show up
+LIVE_FEED_HEARTBEAT_S = _env_float("LIVE_FEED_HEARTBEAT_S", 15.0)
+LIVE_FEED_MAX_CLIENTS = _env_int("LIVE_FEED_MAX_CLIENTS", 256)  # per worker
+LIVE_FEED_MAX_BACKFILL = _env_int("LIVE_FEED_MAX_BACKFILL", 1000)  # rows replayed from the database on resume
+
+# Prediction history (/predictions, /predictions/export)
+HISTORY_MAX_PAGE_SIZE = _env_int("HISTORY_MAX_PAGE_SIZE", 500)
+EXPORT_PAGE_SIZE = _env_int("EXPORT_PAGE_SIZE", 1000)  # rows read from the database per export chunk
+
+# Observability
+METRICS_ENABLED = _env_bool("METRICS_ENABLED", True)  # Prometheus text format on /metrics
+SERVER_TIMING_ENABLED = _env_bool("SERVER_TIMING_ENABLED", False)  # per-stage Server-Timing header on /predict
@@ -1,27 +1,38 @@
 """
 Database module for storing predictions and enabling real-time sync
 Uses SQLite for simplicity (can be upgraded to PostgreSQL for production)
+
+Connections are pooled per process: one writer connection (serialized by a
+lock) and a small pool of reader connections. The database runs in WAL mode,
+so readers never block the writer and vice versa.
 """
 import sqlite3
 import json
-from datetime import datetime
-from typing import Dict, List, Optional
+import queue
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 import os
 
 DB_PATH = os.getenv("DB_PATH", "predictions.db")
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "4"))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+# How long a worker waits while another process migrates the database
+DB_MIGRATION_TIMEOUT_MS = int(os.getenv("DB_MIGRATION_TIMEOUT_MS", "600000"))
 
-def get_db_connection():
-    """Get database connection"""
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    return conn
+# Applied to every connection
+PRAGMAS = (
+    f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}",
+    "PRAGMA synchronous = NORMAL",    # safe with WAL, fsync only at checkpoints
+    "PRAGMA cache_size = -20000",     # ~20 MB page cache
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA mmap_size = 268435456",   # 256 MB memory-mapped reads
+    "PRAGMA foreign_keys = ON",
+)
 
-def init_db():
-    """Initialize database tables"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
+def _create_schema(conn: sqlite3.Connection):
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS predictions (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             image_path TEXT,
@@ -30,52 +41,424 @@ def init_db():
             device_type TEXT
         )
     """)
-    
-    conn.commit()
-    conn.close()
+
+def _add_prediction_indexes(conn: sqlite3.Connection):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_predictions_created_at ON predictions (created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_predictions_device_type ON predictions (device_type, created_at)")
+
+_INSERT_DETECTION = """
+    INSERT INTO detections (prediction_id, class_name, confidence, x1, y1, x2, y2, created_at, device_type)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+def _detection_rows(prediction_id: int, predictions: Dict, created_at: str, device_type: str) -> List[tuple]:
+    """Flatten a predictions dict into detections table rows"""
+    boxes = predictions.get("boxes") or []
+    classes = predictions.get("classes") or []
+    confidences = predictions.get("confidences") or []
+    rows = []
+    for box, class_name, confidence in zip(boxes, classes, confidences):
+        x1, y1, x2, y2 = (list(box) + [None] * 4)[:4]
+        rows.append((prediction_id, str(class_name), float(confidence), x1, y1, x2, y2, created_at, device_type))
+    return rows
+
+# Predictions rows read per query while backfilling detections
+_BACKFILL_PAGE_SIZE = 1000
+
+def _create_detections(conn: sqlite3.Connection):
+    # One row per detected box, so aggregates run in SQL instead of parsing
+    # predictions_json. created_at and device_type are copied from the parent
+    # row so the analytics queries never need a join.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS detections (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            prediction_id INTEGER NOT NULL REFERENCES predictions (id) ON DELETE CASCADE,
+            class_name TEXT NOT NULL,
+            confidence REAL NOT NULL,
+            x1 REAL,
+            y1 REAL,
+            x2 REAL,
+            y2 REAL,
+            created_at TIMESTAMP NOT NULL,
+            device_type TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_detections_prediction ON detections (prediction_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_detections_created_at ON detections (created_at, class_name, confidence)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_detections_class ON detections (class_name, created_at, confidence)")
+
+    # Backfill from the JSON already stored, a page of rows at a time. Rows that
+    # already have detections are skipped, so running it twice adds nothing.
+    last_id = 0
+    while True:
+        rows = conn.execute("""
+            SELECT id, predictions_json, created_at, device_type FROM predictions AS p
+            WHERE id > ? AND NOT EXISTS (SELECT 1 FROM detections AS d WHERE d.prediction_id = p.id)
+            ORDER BY id
+            LIMIT ?
+        """, (last_id, _BACKFILL_PAGE_SIZE)).fetchall()
+        if not rows:
+            break
+        for prediction_id, predictions_json, created_at, device_type in rows:
+            try:
+                predictions = json.loads(predictions_json) if predictions_json else {}
+            except ValueError:
+                continue
+            conn.executemany(_INSERT_DETECTION, _detection_rows(prediction_id, predictions, created_at, device_type))
+        last_id = rows[-1][0]
+
+# Schema migrations, applied in order. PRAGMA user_version records how many
+# have run, so existing predictions.db files are upgraded in place on startup.
+# Every worker process calls init_db(); each migration runs in its own
+# BEGIN IMMEDIATE transaction that re-reads user_version, so exactly one
+# process applies it and the others wait, then find it done.
+MIGRATIONS = [
+    _create_schema,
+    _add_prediction_indexes,
+    _create_detections,
+]
+
+def get_db_connection():
+    """Get a new, fully configured database connection"""
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, timeout=DB_BUSY_TIMEOUT_MS / 1000.0)
+    conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+class ConnectionPool:
+    """One writer connection plus a bounded pool of reader connections"""
+
+    def __init__(self, read_pool_size: int):
+        self.read_pool_size = max(1, read_pool_size)
+        self._pid = os.getpid()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self._readers = queue.LifoQueue()
+        self._reader_slots = threading.BoundedSemaphore(self.read_pool_size)
+
+    def _check_fork(self):
+        # Connections must not be shared with forked worker processes
+        if self._pid != os.getpid():
+            self.__init__(self.read_pool_size)
+
+    @contextmanager
+    def writer(self):
+        """Exclusive access to the writer connection, inside a transaction"""
+        self._check_fork()
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = get_db_connection()
+            with self._writer:  # commit on success, rollback on error
+                yield self._writer
+
+    @contextmanager
+    def reader(self):
+        """Borrow a reader connection"""
+        self._check_fork()
+        self._reader_slots.acquire()
+        try:
+            try:
+                conn = self._readers.get_nowait()
+            except queue.Empty:
+                conn = get_db_connection()
+            try:
+                yield conn
+            finally:
+                self._readers.put(conn)
+        finally:
+            self._reader_slots.release()
+
+    def close(self):
+        """Close all pooled connections"""
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+
+_pool = ConnectionPool(DB_READ_POOL_SIZE)
+
+# Called with the new row ids after every committed save (e.g. the live feed)
+_save_listeners: List[Callable[[List[int]], None]] = []
+
+def add_save_listener(listener: Callable[[List[int]], None]):
+    """Register a callback for newly saved predictions (runs on the saving thread)"""
+    _save_listeners.append(listener)
+
+def init_db():
+    """Initialize database tables, switch to WAL mode and apply pending migrations (safe to run from several processes)"""
+    conn = get_db_connection()
+    conn.isolation_level = None  # transactions are managed explicitly below
+    conn.execute(f"PRAGMA busy_timeout = {DB_MIGRATION_TIMEOUT_MS}")
+    try:
+        conn.execute("PRAGMA journal_mode = WAL")
+        migrated = False
+        while True:
+            # Take the write lock first, then decide: another process may have migrated meanwhile
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                if version >= len(MIGRATIONS):
+                    conn.execute("COMMIT")
+                    break
+                MIGRATIONS[version](conn)
+                conn.execute(f"PRAGMA user_version = {version + 1}")
+                conn.execute("COMMIT")
+                migrated = True
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        if migrated:
+            conn.execute("ANALYZE")
+    finally:
+        conn.close()
+
+def close_db():
+    """Close pooled connections (call on shutdown)"""
+    _pool.close()
 
 def save_prediction(image_path: str, predictions: Dict, device_type: str = "unknown"):
     """Save prediction to database"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        INSERT INTO predictions (image_path, predictions_json, device_type)
-        VALUES (?, ?, ?)
-    """, (image_path, json.dumps(predictions), device_type))
-    
-    conn.commit()
-    prediction_id = cursor.lastrowid
-    conn.close()
-    return prediction_id
+    return save_predictions([(image_path, predictions, device_type)])[0]
+
+def save_predictions(records: List[Tuple[str, Dict, str]]) -> List[int]:
+    """
+    Save several predictions in a single transaction
+
+    Args:
+        records: (image_path, predictions, device_type) tuples
+
+    Returns:
+        IDs of the inserted rows, in order
+    """
+    ids = []
+    # Same format as CURRENT_TIMESTAMP, shared by the prediction and its detections
+    created_at = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    with _pool.writer() as conn:
+        cursor = conn.cursor()
+        detections = []
+        for image_path, predictions, device_type in records:
+            cursor.execute("""
+                INSERT INTO predictions (image_path, predictions_json, created_at, device_type)
+                VALUES (?, ?, ?, ?)
+            """, (image_path, json.dumps(predictions), created_at, device_type))
+            ids.append(cursor.lastrowid)
+            detections.extend(_detection_rows(cursor.lastrowid, predictions, created_at, device_type))
+        cursor.executemany(_INSERT_DETECTION, detections)
+    for listener in _save_listeners:
+        try:
+            listener(ids)
+        except Exception as e:
+            print(f"WARNING: Save listener failed: {e}")
+    return ids
 
 def get_latest_predictions(limit: int = 10) -> List[Dict]:
     """Get latest predictions"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT * FROM predictions
-        ORDER BY created_at DESC
-        LIMIT ?
-    """, (limit,))
-    
-    rows = cursor.fetchall()
-    conn.close()
-    
+    with _pool.reader() as conn:
+        rows = conn.execute("""
+            SELECT * FROM predictions
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        """, (limit,)).fetchall()
+
     return [dict(row) for row in rows]
 
 def get_prediction_by_id(prediction_id: int) -> Optional[Dict]:
     """Get prediction by ID"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT * FROM predictions WHERE id = ?", (prediction_id,))
-    row = cursor.fetchone()
-    conn.close()
-    
+    with _pool.reader() as conn:
+        row = conn.execute("SELECT * FROM predictions WHERE id = ?", (prediction_id,)).fetchone()
+
     return dict(row) if row else None
 
+def get_predictions_after(after_id: int, limit: int = 100) -> List[Dict]:
+    """Predictions with an id greater than ``after_id``, oldest first"""
+    with _pool.reader() as conn:
+        rows = conn.execute("""
+            SELECT * FROM predictions
+            WHERE id > ?
+            ORDER BY id
+            LIMIT ?
+        """, (after_id, limit)).fetchall()
+
+    return [dict(row) for row in rows]
+
+def format_timestamp(value: Optional[datetime]) -> Optional[str]:
+    """Convert a datetime to the UTC text format stored in created_at"""
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.strftime("%Y-%m-%d %H:%M:%S")
+
+def _prediction_filters(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    device_type: Optional[str] = None,
+    class_name: Optional[str] = None,
+    min_confidence: float = 0.0,
+) -> Tuple[List[str], list]:
+    """WHERE clauses and parameters for filtering the predictions table"""
+    clauses, params = [], []
+    if start is not None:
+        clauses.append("created_at >= ?")
+        params.append(format_timestamp(start))
+    if end is not None:
+        clauses.append("created_at < ?")
+        params.append(format_timestamp(end))
+    if device_type is not None:
+        clauses.append("device_type = ?")
+        params.append(device_type)
+    if class_name is not None or min_confidence > 0:
+        # At least one detection matching the class/confidence filter
+        detection_clauses = ["d.prediction_id = predictions.id"]
+        if class_name is not None:
+            detection_clauses.append("d.class_name = ?")
+            params.append(class_name)
+        if min_confidence > 0:
+            detection_clauses.append("d.confidence >= ?")
+            params.append(min_confidence)
+        clauses.append(f"EXISTS (SELECT 1 FROM detections d WHERE {' AND '.join(detection_clauses)})")
+    return clauses, params
+
+def query_predictions(
+    cursor: Optional[int] = None,
+    limit: int = 50,
+    descending: bool = True,
+    **filters,
+) -> List[Dict]:
+    """
+    One page of predictions, keyset-paginated on id
+
+    Args:
+        cursor: Id of the last row of the previous page (None = first page)
+        limit: Maximum rows to return
+        descending: Newest first (True) or oldest first (False)
+        **filters: start, end, device_type, class_name, min_confidence
+
+    Returns:
+        Rows in page order; pass the last row's id as the next cursor
+    """
+    clauses, params = _prediction_filters(**filters)
+    if cursor is not None:
+        clauses.insert(0, "id < ?" if descending else "id > ?")
+        params.insert(0, cursor)
+    where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+    order = "DESC" if descending else "ASC"
+    with _pool.reader() as conn:
+        rows = conn.execute(f"""
+            SELECT * FROM predictions {where}
+            ORDER BY id {order}
+            LIMIT ?
+        """, params + [limit]).fetchall()
+
+    return [dict(row) for row in rows]
+
+def iter_predictions(page_size: int = 1000, **filters) -> Iterator[List[Dict]]:
+    """
+    Yield every matching prediction oldest first, one page at a time
+
+    Each page is a separate short read, so an export never holds a read
+    transaction open (which would stop WAL checkpoints) or the whole result
+    in memory.
+    """
+    cursor = None
+    while True:
+        rows = query_predictions(cursor, page_size, descending=False, **filters)
+        if not rows:
+            return
+        yield rows
+        if len(rows) < page_size:
+            return
+        cursor = rows[-1]["id"]
+
+def get_last_prediction_id() -> int:
+    """Highest prediction id (0 for an empty table)"""
+    with _pool.reader() as conn:
+        row = conn.execute("SELECT MAX(id) FROM predictions").fetchone()
+
+    return row[0] or 0
+
+# Time buckets for detection rates (strftime formats, same layout as created_at)
+RATE_BUCKETS = {
+    "minute": "%Y-%m-%d %H:%M:00",
+    "hour": "%Y-%m-%d %H:00:00",
+    "day": "%Y-%m-%d 00:00:00",
+}
+
+def _detection_filters(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    class_name: Optional[str] = None,
+    device_type: Optional[str] = None,
+    min_confidence: float = 0.0,
+) -> Tuple[str, list]:
+    """WHERE clause and parameters shared by the aggregate queries"""
+    clauses, params = [], []
+    if start is not None:
+        clauses.append("created_at >= ?")
+        params.append(format_timestamp(start))
+    if end is not None:
+        clauses.append("created_at < ?")
+        params.append(format_timestamp(end))
+    if class_name is not None:
+        clauses.append("class_name = ?")
+        params.append(class_name)
+    if device_type is not None:
+        clauses.append("device_type = ?")
+        params.append(device_type)
+    if min_confidence > 0:
+        clauses.append("confidence >= ?")
+        params.append(min_confidence)
+    return ("WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+def count_detections_by_class(**filters) -> List[Dict]:
+    """Detections per class with their mean confidence"""
+    where, params = _detection_filters(**filters)
+    with _pool.reader() as conn:
+        rows = conn.execute(f"""
+            SELECT class_name, COUNT(*) AS count, AVG(confidence) AS avg_confidence,
+                   COUNT(DISTINCT prediction_id) AS images_with_detections
+            FROM detections {where}
+            GROUP BY class_name
+            ORDER BY count DESC
+        """, params).fetchall()
+    return [dict(row) for row in rows]
+
+def confidence_histogram(bins: int = 10, **filters) -> List[Dict]:
+    """Detection counts in ``bins`` equal-width confidence bins over [0, 1]"""
+    bins = max(1, bins)
+    where, params = _detection_filters(**filters)
+    with _pool.reader() as conn:
+        rows = conn.execute(f"""
+            SELECT MIN(CAST(confidence * ? AS INTEGER), ? - 1) AS bin, COUNT(*) AS count
+            FROM detections {where}
+            GROUP BY bin
+        """, [bins, bins] + params).fetchall()
+    counts = {row["bin"]: row["count"] for row in rows}
+    return [
+        {"lower": round(i / bins, 6), "upper": round((i + 1) / bins, 6), "count": counts.get(i, 0)}
+        for i in range(bins)
+    ]
+
+def detection_rate(bucket: str = "hour", **filters) -> List[Dict]:
+    """Detections and images per time bucket (``minute``, ``hour`` or ``day``)"""
+    if bucket not in RATE_BUCKETS:
+        raise ValueError(f"Unknown bucket {bucket!r}, expected one of {sorted(RATE_BUCKETS)}")
+    where, params = _detection_filters(**filters)
+    with _pool.reader() as conn:
+        rows = conn.execute(f"""
+            SELECT strftime(?, created_at) AS bucket, COUNT(*) AS detections,
+                   COUNT(DISTINCT prediction_id) AS images_with_detections
+            FROM detections {where}
+            GROUP BY bucket
+            ORDER BY bucket
+        """, [RATE_BUCKETS[bucket]] + params).fetchall()
+    return [dict(row) for row in rows]
+
 # Initialize database on import
 init_db()
-
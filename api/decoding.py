@@ -0,0 +1,96 @@
+"""
+Decoding Module
+Size-guarded upload reading and reduced-resolution image decoding
+"""
+import io
+from typing import Dict, Optional, Tuple
+
+from PIL import Image
+
+# Bytes read from an upload per await
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class ImageTooLargeError(ValueError):
+    """Raised when an upload exceeds the byte or pixel limit (answered with 413)"""
+
+
+async def read_upload(file, max_bytes: int) -> bytes:
+    """
+    Read an UploadFile in chunks, failing as soon as it exceeds ``max_bytes``
+
+    Args:
+        file: FastAPI/Starlette UploadFile
+        max_bytes: Maximum upload size (0 = unlimited)
+    """
+    size = getattr(file, "size", None)
+    if max_bytes and size is not None and size > max_bytes:
+        raise ImageTooLargeError(f"Upload is {size} bytes, the limit is {max_bytes}")
+    chunks = []
+    total = 0
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        total += len(chunk)
+        if max_bytes and total > max_bytes:
+            raise ImageTooLargeError(f"Upload exceeds the limit of {max_bytes} bytes")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def open_image(image_bytes: bytes, max_pixels: int) -> Image.Image:
+    """Open an image lazily (header only) and enforce the pixel limit before anything is decoded"""
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+    except Image.DecompressionBombError as e:
+        raise ImageTooLargeError(str(e))
+    width, height = image.size
+    if max_pixels and width * height > max_pixels:
+        raise ImageTooLargeError(f"Image is {width}x{height} pixels, the limit is {max_pixels}")
+    return image
+
+
+def image_size(image_bytes: bytes) -> Tuple[int, int]:
+    """Width and height of an encoded image, read from its header"""
+    return open_image(image_bytes, 0).size
+
+
+def draft_size(original_size: Tuple[int, int], input_size: int) -> Tuple[int, int]:
+    """Smallest size that still fills a square ``input_size`` letterbox at full resolution"""
+    width, height = original_size
+    scale = min(1.0, input_size / max(width, height))
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def decode_image(image: Image.Image, input_size: Optional[int] = None) -> Image.Image:
+    """
+    Decode an opened image to RGB
+
+    When ``input_size`` is given and the image is a JPEG, libjpeg decodes it
+    directly at 1/2, 1/4 or 1/8 scale (``Image.draft``), never smaller than
+    what the model input needs. A 24 MP photo then decodes at roughly 1/8 of
+    the pixels, memory and time. The returned image may therefore be smaller
+    than the original; map boxes back with ``rescale_predictions``.
+    """
+    if input_size and image.format == "JPEG":
+        image.draft("RGB", draft_size(image.size, input_size))
+    # Convert to RGB if necessary
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    else:
+        image.load()
+    return image
+
+
+def rescale_predictions(predictions: Dict, from_size: Tuple[int, int], to_size: Tuple[int, int]) -> Dict:
+    """Map predicted boxes from an image of ``from_size`` to the same image at ``to_size``"""
+    if from_size == to_size or not predictions.get("boxes"):
+        return predictions
+    scale_x = to_size[0] / from_size[0]
+    scale_y = to_size[1] / from_size[1]
+    boxes = [
+        [min(x1 * scale_x, to_size[0]), min(y1 * scale_y, to_size[1]), min(x2 * scale_x, to_size[0]), min(y2 * scale_y, to_size[1])]
+        for x1, y1, x2, y2 in predictions["boxes"]
+    ]
+    return {**predictions, "boxes": boxes}
@@ -0,0 +1,92 @@
+"""
+Executor Module
+Bounded thread pools that keep blocking work (inference, disk, database) off the event loop
+"""
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict
+
+
+class ExecutorBusyError(Exception):
+    """Raised when an executor's queue is full and new work is rejected"""
+
+    def __init__(self, name: str, retry_after: int = 1):
+        super().__init__(f"{name} executor is busy, try again later")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class BoundedExecutor:
+    """
+    Thread pool with a bounded backlog
+
+    At most ``max_workers`` tasks run at once and at most ``max_queue`` more
+    wait for a thread. Anything beyond that is rejected immediately with
+    ExecutorBusyError so the API can answer 503 instead of piling up work.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int, retry_after: int = 1):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.retry_after = retry_after
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._rejected = 0
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Submit work, raising ExecutorBusyError if the backlog is full"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise ExecutorBusyError(self.name, self.retry_after)
+        with self._lock:
+            self._pending += 1
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """Run work in the pool and await its result from the event loop"""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    async def run_admitted(self, fn: Callable, *args, **kwargs):
+        """
+        Run work that was already admitted elsewhere (e.g. through the batcher's
+        bounded queue) without counting it against this pool's backlog
+        """
+        return await asyncio.wrap_future(self._executor.submit(fn, *args, **kwargs))
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def is_saturated(self) -> bool:
+        """True when new work would currently be rejected"""
+        with self._lock:
+            return self._pending >= self.max_workers + self.max_queue
+
+    def stats(self) -> Dict:
+        """Current load of the executor"""
+        with self._lock:
+            pending = self._pending
+            rejected = self._rejected
+        return {
+            "workers": self.max_workers,
+            "queue_depth": self.max_queue,
+            "in_flight": min(pending, self.max_workers),
+            "queued": max(0, pending - self.max_workers),
+            "rejected": rejected,
+        }
+
+    def shutdown(self, wait: bool = True):
+        """Stop the pool, waiting for running work when ``wait`` is True"""
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,98 @@
+"""
+Model Export
+Converts the YOLOv8 .pt weights into an ONNX model for the onnxruntime serving backend
+
+Usage:
+    python -m api.export                          # exports the model found by get_model_path()
+    python -m api.export --weights models/yolov8n_best_model.pt --imgsz 640
+
+The exported file is written next to the weights with the same name and a
+.onnx extension, where load_model() picks it up automatically (PREFER_ONNX).
+"""
+import argparse
+import os
+import shutil
+import sys
+import time
+
+from .model_loader import get_model_path
+
+
+def export_onnx(weights: str, imgsz: int = 640, opset: int = 17, dynamic: bool = True, simplify: bool = True) -> str:
+    """
+    Export YOLOv8 weights to ONNX
+
+    Args:
+        weights: Path to the .pt file
+        imgsz: Square input size baked into the graph
+        opset: ONNX opset version
+        dynamic: Allow any batch size (required for batched serving)
+        simplify: Run onnx-simplifier (constant folding, dead node removal)
+
+    Returns:
+        Path of the exported .onnx file (next to the weights)
+    """
+    from ultralytics import YOLO
+
+    model = YOLO(weights)
+    exported = model.export(format="onnx", imgsz=imgsz, opset=opset, dynamic=dynamic, simplify=simplify)
+
+    target = os.path.splitext(weights)[0] + ".onnx"
+    if os.path.abspath(str(exported)) != os.path.abspath(target):
+        shutil.move(str(exported), target)
+    return target
+
+
+def verify_onnx(onnx_path: str, imgsz: int, batch_size: int) -> float:
+    """Load the export with the serving backend and time one batched forward pass (ms)"""
+    import numpy as np
+    from .onnx_backend import OnnxModel
+
+    model = OnnxModel(onnx_path)
+    input_name = model.get_inputs()[0].name
+    batch = np.random.rand(batch_size, 3, imgsz, imgsz).astype(np.float32)
+    model.run(None, {input_name: batch})  # warm-up
+    start = time.perf_counter()
+    outputs = model.run(None, {input_name: batch})
+    elapsed = (time.perf_counter() - start) * 1000.0
+    print(f"Output shape: {outputs[0].shape}, classes: {model.class_names or 'unknown'}")
+    return elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the YOLOv8 model to optimized ONNX")
+    parser.add_argument("--weights", default=None, help="Path to .pt weights (default: auto-detect in models/)")
+    parser.add_argument("--imgsz", type=int, default=640, help="Input image size")
+    parser.add_argument("--opset", type=int, default=17, help="ONNX opset version")
+    parser.add_argument("--static-batch", action="store_true", help="Export with a fixed batch size of 1")
+    parser.add_argument("--no-simplify", action="store_true", help="Skip onnx-simplifier")
+    parser.add_argument("--verify-batch", type=int, default=4, help="Batch size for the post-export check (0 to skip)")
+    args = parser.parse_args(argv)
+
+    weights = args.weights or get_model_path()
+    if weights is None or not os.path.exists(weights):
+        print("❌ No .pt weights found. Pass --weights or place the model in models/")
+        return 1
+    if not weights.endswith(".pt"):
+        print(f"❌ Expected YOLOv8 .pt weights, got: {weights}")
+        return 1
+
+    print(f"Exporting {weights} -> ONNX (imgsz={args.imgsz}, opset={args.opset})")
+    onnx_path = export_onnx(
+        weights,
+        imgsz=args.imgsz,
+        opset=args.opset,
+        dynamic=not args.static_batch,
+        simplify=not args.no_simplify,
+    )
+    print(f"Exported model written to {onnx_path}")
+
+    if args.verify_batch > 0:
+        batch_size = 1 if args.static_batch else args.verify_batch
+        elapsed = verify_onnx(onnx_path, args.imgsz, batch_size)
+        print(f"Batch of {batch_size}: {elapsed:.1f} ms ({elapsed / batch_size:.1f} ms/image)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
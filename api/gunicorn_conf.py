@@ -0,0 +1,42 @@
+"""
+Gunicorn configuration
+Starts the shared model host next to the workers when MODEL_SERVING_MODE=shared
+
+Usage: gunicorn -c api/gunicorn_conf.py -k uvicorn.workers.UvicornWorker api.main:app
+"""
+import os
+import secrets
+import subprocess
+import sys
+
+SERVING_MODE = os.getenv("MODEL_SERVING_MODE", "local").strip().lower()
+
+# The host only accepts clients that present this key. Without an explicit
+# MODEL_HOST_AUTHKEY a random one is generated here, in the master, so the host
+# and every worker forked later inherit it (setdefault keeps it across reloads)
+if SERVING_MODE == "shared":
+    os.environ.setdefault("MODEL_HOST_AUTHKEY", secrets.token_hex(32))
+
+_model_host = None
+
+
+def on_starting(server):
+    """Launch one model host process before any worker is forked"""
+    global _model_host
+    # Workers inherit it; a reload in local mode would only reach one of them
+    os.environ["API_WORKERS"] = str(server.cfg.workers)
+    if SERVING_MODE != "shared":
+        return
+    server.log.info("Starting shared model host")
+    _model_host = subprocess.Popen([sys.executable, "-m", "api.model_host"])
+
+
+def on_exit(server):
+    """Stop the model host together with the gunicorn master"""
+    if _model_host is not None and _model_host.poll() is None:
+        server.log.info("Stopping shared model host")
+        _model_host.terminate()
+        try:
+            _model_host.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            _model_host.kill()
@@ -0,0 +1,107 @@
+"""
+History Export Module
+Encodes pages of prediction rows as NDJSON, CSV or Parquet for streaming downloads
+"""
+import csv
+import io
+import json
+from typing import Dict, Iterable, Iterator, List
+
+# Columns of the predictions table, in export order
+EXPORT_COLUMNS = ["id", "created_at", "device_type", "image_path", "predictions_json"]
+
+# format -> (media type, file extension)
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def parquet_available() -> bool:
+    """Parquet export needs the optional pyarrow package"""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def encode_ndjson(pages: Iterable[List[Dict]]) -> Iterator[bytes]:
+    """One JSON object per row"""
+    for rows in pages:
+        yield "".join(json.dumps({c: row.get(c) for c in EXPORT_COLUMNS}) + "\n" for row in rows).encode("utf-8")
+
+
+def encode_csv(pages: Iterable[List[Dict]]) -> Iterator[bytes]:
+    """CSV with a header row"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS, extrasaction="ignore")
+    writer.writeheader()
+    for rows in pages:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def encode_parquet(pages: Iterable[List[Dict]]) -> Iterator[bytes]:
+    """Parquet file with one row group per page, flushed as each page is written"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("id", pa.int64()),
+        ("created_at", pa.string()),
+        ("device_type", pa.string()),
+        ("image_path", pa.string()),
+        ("predictions_json", pa.string()),
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        for rows in pages:
+            columns = {c: [row.get(c) for row in rows] for c in EXPORT_COLUMNS}
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()  # footer
+
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back in chunks but keeps the absolute position"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+ENCODERS = {
+    "ndjson": encode_ndjson,
+    "csv": encode_csv,
+    "parquet": encode_parquet,
+}
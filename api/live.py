@@ -0,0 +1,228 @@
+"""
+Live Feed Module
+In-memory pub/sub hub that pushes new predictions to connected clients
+"""
+import asyncio
+import bisect
+import json
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from .executors import BoundedExecutor, ExecutorBusyError
+
+
+class LiveHub:
+    """
+    Fan-out of saved predictions to live-feed subscribers
+
+    One background task per worker tails the predictions table (``id > last
+    seen``) and appends new rows to a shared ring buffer of the last
+    ``buffer_size`` events. Saves made by this worker wake the task
+    immediately; rows written by other workers are picked up within
+    ``poll_interval_ms``. The database is therefore queried once per worker,
+    no matter how many clients are connected.
+
+    Clients do not get their own queues. Each one only keeps a cursor (the last
+    id it was sent) into the shared buffer and, whenever it is woken, receives
+    everything newer in a single write. A slow client therefore costs no extra
+    memory: if its cursor falls out of the buffer, the missed events are
+    dropped and it is sent one ``gap`` event describing the skipped id range.
+    """
+
+    def __init__(
+        self,
+        fetch_after: Callable[[int, int], List[Dict]],
+        get_last_id: Callable[[], int],
+        buffer_size: int = 1024,
+        poll_interval_ms: float = 1000.0,
+        max_clients: int = 256,
+        max_backfill: int = 1000,
+        executor: Optional[BoundedExecutor] = None,
+        retry_after: int = 1,
+    ):
+        self.fetch_after = fetch_after
+        self.get_last_id = get_last_id
+        self.buffer_size = max(1, buffer_size)
+        self.poll_interval = max(0.01, poll_interval_ms / 1000.0)
+        self.max_clients = max(1, max_clients)
+        self.max_backfill = max(0, max_backfill)
+        self.executor = executor
+        self.retry_after = retry_after
+
+        self._ids: List[int] = []
+        self._events: List[Dict] = []
+        self._last_id = 0
+        self._dropped_through = 0  # every event with id > this is in the buffer
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._new_events: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._clients = 0
+
+        # Metrics
+        self._published = 0
+        self._gaps = 0
+
+    async def start(self):
+        """Start tailing from the newest saved prediction (call from the running event loop)"""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._new_events = asyncio.Event()
+        self._last_id = await self._call(self.get_last_id, admitted=True)
+        self._dropped_through = self._last_id
+        self._stopping = False
+        self._task = asyncio.create_task(self._tail())
+
+    async def stop(self):
+        """Stop the tail task and wake every client so its stream can end"""
+        if self._task is None:
+            return
+        # wait_for() can swallow a cancellation that races with the wake-up
+        # (a save notified during shutdown), so the loop also checks a flag
+        self._stopping = True
+        self._wake.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._new_events.set()
+
+    def notify(self, ids: Optional[List[int]] = None):
+        """Wake the tail task after a local save (safe to call from any thread)"""
+        if self._loop is None or self._loop.is_closed():
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._wake.set)
+        except RuntimeError:
+            pass  # loop already shut down
+
+    async def _call(self, fn: Callable, *args, admitted: bool = False):
+        if self.executor is None:
+            return await asyncio.to_thread(fn, *args)
+        if admitted:
+            return await self.executor.run_admitted(fn, *args)
+        return await self.executor.run(fn, *args)
+
+    async def _tail(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            if self._stopping:
+                break
+            self._wake.clear()
+            try:
+                # Drain in pages so a burst never loads unbounded rows
+                while True:
+                    rows = await self._call(self.fetch_after, self._last_id, self.buffer_size, admitted=True)
+                    if rows:
+                        self._publish(rows)
+                    if len(rows) < self.buffer_size:
+                        break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"WARNING: Live feed could not read new predictions: {e}")
+
+    def _publish(self, rows: List[Dict]):
+        for row in rows:
+            self._ids.append(row["id"])
+            self._events.append(row)
+        self._last_id = self._ids[-1]
+        self._published += len(rows)
+        # Trim in chunks so the list copy is amortized
+        if len(self._ids) > 2 * self.buffer_size:
+            self._dropped_through = self._ids[-self.buffer_size - 1]
+            del self._ids[:-self.buffer_size]
+            del self._events[:-self.buffer_size]
+        # Wake all waiting clients, then arm a fresh event for the next round
+        self._new_events.set()
+        self._new_events = asyncio.Event()
+
+    def _events_after(self, cursor: int) -> List[Dict]:
+        start = bisect.bisect_right(self._ids, cursor)
+        return self._events[start:]
+
+    def is_full(self) -> bool:
+        """True when no more subscribers are accepted"""
+        return self._clients >= self.max_clients
+
+    async def subscribe(self, after_id: Optional[int] = None, heartbeat: float = 15.0) -> AsyncIterator[List[Dict]]:
+        """
+        Yield batches of messages for one client
+
+        Each batch holds everything that is pending for the client, so it can
+        be written in one go. Messages are ``{"type": "prediction", "id", "data"}``,
+        ``{"type": "gap", "from_id", "to_id"}`` or ``{"type": "heartbeat"}``.
+
+        Args:
+            after_id: Resume after this prediction id (None = only new predictions)
+            heartbeat: Seconds of silence before a heartbeat message is sent
+        """
+        if self._task is None:
+            raise RuntimeError("LiveHub is not started")
+        if self.is_full():
+            raise ExecutorBusyError("live_feed", self.retry_after)
+        self._clients += 1
+        try:
+            cursor = self._last_id if after_id is None else after_id
+
+            # Resume point older than the buffer: replay from the database first
+            if cursor < self._dropped_through and self.max_backfill > 0:
+                rows = await self._call(self.fetch_after, cursor, self.max_backfill)
+                batch = []
+                for row in rows:
+                    if row["id"] > self._dropped_through:
+                        break  # the rest is still in the buffer
+                    cursor = row["id"]
+                    batch.append({"type": "prediction", "id": row["id"], "data": row})
+                if batch:
+                    yield batch
+
+            while self._task is not None:
+                batch = []
+                if cursor < self._dropped_through:
+                    # Events we never sent fell out of the buffer: skip ahead
+                    self._gaps += 1
+                    batch.append({"type": "gap", "from_id": cursor + 1, "to_id": self._dropped_through})
+                    cursor = self._dropped_through
+                for event in self._events_after(cursor):
+                    batch.append({"type": "prediction", "id": event["id"], "data": event})
+                    cursor = event["id"]
+                if batch:
+                    yield batch
+                    continue
+                new_events = self._new_events
+                try:
+                    await asyncio.wait_for(new_events.wait(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield [{"type": "heartbeat"}]
+        finally:
+            self._clients -= 1
+
+    def stats(self) -> Dict:
+        """Subscriber and throughput counters"""
+        return {
+            "clients": self._clients,
+            "max_clients": self.max_clients,
+            "buffered": len(self._ids),
+            "buffer_size": self.buffer_size,
+            "last_id": self._last_id,
+            "published": self._published,
+            "gaps": self._gaps,
+        }
+
+
+def format_sse(message: Dict) -> str:
+    """Encode a hub message as a Server-Sent Events frame"""
+    if message["type"] == "heartbeat":
+        return ": keep-alive\n\n"
+    if message["type"] == "gap":
+        data = {"from_id": message["from_id"], "to_id": message["to_id"]}
+        return f"event: gap\ndata: {json.dumps(data)}\n\n"
+    return f"id: {message['id']}\nevent: prediction\ndata: {json.dumps(message['data'])}\n\n"
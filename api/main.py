@@ -2,34 +2,324 @@
 FastAPI Backend Application
 Handles image predictions and model inference
 """
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import Depends, FastAPI, File, Header, UploadFile, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
-from typing import List, Optional
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict
+from starlette.background import BackgroundTask
+from typing import Iterator, List, Optional, Tuple
 from contextlib import asynccontextmanager
 import uvicorn
-from .predictor import predict_image
-from .model_loader import load_model, get_model
-from .database import save_prediction, get_latest_predictions
+from .predictor import (
+    InferenceParams, InvalidParamsError, cascade_stats, check_params, predict_batch, predict_cascade,
+    predict_with_model, get_input_size, load_serving_model, select_detections, start_model_reload,
+)
+from .batcher import InferenceBatcher
+from .executors import BoundedExecutor, ExecutorBusyError
+from .archives import archive_kind, iter_archive_images
+from .model_host import ModelHostClient, wait_for_host
+from .cache import PredictionCache, hash_bytes, make_key
+from .tiling import predict_tiled, should_tile
+from .decoding import ImageTooLargeError, decode_image, image_size, open_image, read_upload, rescale_predictions
+from .video import IoUTracker, is_video, iter_video_frames, predict_video, video_summary
+from . import config
+from .model_loader import configured_models, get_model, reload_model_path, registry as model_registry
+from .registry import ModelLoadingError, ModelNotFoundError
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsMiddleware, ServerTiming, histogram_samples, in_flight_requests, registry
+from .database import (
+    save_predictions, get_latest_predictions, close_db,
+    add_save_listener, get_predictions_after, get_last_prediction_id,
+    query_predictions, iter_predictions,
+    count_detections_by_class, confidence_histogram, detection_rate, RATE_BUCKETS,
+)
+from .persistence import WriteBehindWriter
+from .live import LiveHub, format_sse
+from .history_export import ENCODERS, EXPORT_FORMATS, parquet_available
+import asyncio
+import functools
+import hmac
 import io
+from datetime import datetime
+import json
+import tempfile
+import time
 from PIL import Image
 import os
-from datetime import datetime
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    """Lifespan context manager for startup and shutdown events"""
-    # Startup
+# Blocking work never runs on the event loop: image decode and inference use
+# one bounded pool, disk and database access use another
+inference_executor = BoundedExecutor(
+    "inference",
+    max_workers=config.INFERENCE_WORKERS,
+    max_queue=config.INFERENCE_QUEUE_DEPTH,
+    retry_after=config.RETRY_AFTER_SECONDS,
+)
+io_executor = BoundedExecutor(
+    "io",
+    max_workers=config.IO_WORKERS,
+    max_queue=config.IO_QUEUE_DEPTH,
+    retry_after=config.RETRY_AFTER_SECONDS,
+)
+
+# In "shared" serving mode the model lives in one model host process per node
+# and this worker only decodes images and forwards them
+host_client = ModelHostClient(config.MODEL_HOST_ADDRESS) if config.MODEL_SERVING_MODE == "shared" else None
+
+def run_predict_batch(
+    images: List[Image.Image],
+    model: Optional[str] = None,
+    model_version: Optional[str] = None,
+    params: Optional[InferenceParams] = None,
+) -> List[Optional[dict]]:
+    """Batched prediction on this worker's models, or in the model host in shared mode"""
+    if host_client is not None:
+        return host_client.predict_batch(images, model, model_version, params)
+    return predict_batch(images, model, model_version, params)
+
+def uses_cascade(model: Optional[str], model_version: Optional[str]) -> bool:
+    """Requests that name no model are served by the cascade when it is enabled"""
+    return config.CASCADE_ENABLED and model is None and model_version is None
+
+def run_serving_batch(
+    images: List[Image.Image],
+    model: Optional[str] = None,
+    model_version: Optional[str] = None,
+    hard: bool = False,
+    params: Optional[InferenceParams] = None,
+) -> List[Optional[dict]]:
+    """Batched prediction for request images: the cascade, or the requested model"""
+    if uses_cascade(model, model_version):
+        return predict_cascade(images, run_predict_batch, hard=hard, params=params)
+    return run_predict_batch(images, model, model_version, params)
+
+# Uploads and prediction rows are written in the background, in batches
+persistence = WriteBehindWriter(
+    save_predictions,
+    upload_dir=config.UPLOAD_DIR,
+    max_batch=config.PERSIST_BATCH_SIZE,
+    flush_interval_ms=config.PERSIST_FLUSH_INTERVAL_MS,
+    max_queue=config.PERSIST_QUEUE_SIZE,
+    max_bytes=config.PERSIST_QUEUE_MAX_BYTES,
+    retry_after=config.RETRY_AFTER_SECONDS,
+)
+
+# Results for uploads we have already seen (retries, re-uploaded photos)
+prediction_cache = PredictionCache(
+    max_entries=config.PREDICTION_CACHE_SIZE,
+    ttl_seconds=config.PREDICTION_CACHE_TTL,
+    db_path=config.PREDICTION_CACHE_DB,
+)
+
+# Pushes saved predictions to /predictions/stream clients
+live_hub = LiveHub(
+    get_predictions_after,
+    get_last_prediction_id,
+    buffer_size=config.LIVE_FEED_BUFFER_SIZE,
+    poll_interval_ms=config.LIVE_FEED_POLL_MS,
+    max_clients=config.LIVE_FEED_MAX_CLIENTS,
+    max_backfill=config.LIVE_FEED_MAX_BACKFILL,
+    executor=io_executor,
+    retry_after=config.RETRY_AFTER_SECONDS,
+)
+add_save_listener(live_hub.notify)
+
+def current_model_version() -> Optional[str]:
+    """Version of the default model that serves this worker's predictions"""
+    if host_client is not None:
+        return host_client.model_version
+    handle = model_registry.get()
+    return handle.version if handle is not None else None
+
+def served_version(model: Optional[str] = None, model_version: Optional[str] = None) -> str:
+    """
+    Version that serves a request for ``model`` / ``model_version`` right now
+    
+    Raises:
+        ModelNotFoundError: if no such model or version is served (404)
+    """
+    if host_client is not None:
+        return host_client.resolve(model, model_version)
+    return model_registry.resolve(model, model_version).version
+
+def request_version(model: Optional[str] = None, model_version: Optional[str] = None) -> str:
+    """Version a request's result is cached under: the serving version, or "<fast>+<accurate>" for the cascade"""
+    if uses_cascade(model, model_version):
+        return f"{served_version(config.CASCADE_FAST_MODEL)}+{served_version(config.CASCADE_ACCURATE_MODEL)}"
+    return served_version(model, model_version)
+
+def served_versions() -> List[str]:
+    """Every model version that may still produce results (live and draining)"""
+    served = host_client.served if host_client is not None else model_registry.served()
+    return list(served["models"].values()) + served["draining"]
+
+def inference_params(
+    conf: float = Query(config.CONFIDENCE_THRESHOLD, ge=0, le=1, description="Confidence threshold"),
+    iou: float = Query(config.IOU_THRESHOLD, ge=0, le=1, description="NMS IoU threshold"),
+    max_det: int = Query(config.MAX_DETECTIONS, ge=1, le=config.MAX_DETECTIONS_LIMIT, description="Maximum detections per image"),
+    classes: Optional[str] = Query(None, description="Comma-separated class names to keep (default: all)"),
+    imgsz: Optional[int] = Query(None, ge=32, le=config.MAX_INPUT_SIZE, multiple_of=32, description="Model input size (default: MODEL_INPUT_SIZE)"),
+) -> InferenceParams:
+    """Detection settings from the query string (out-of-range values are answered with 422)"""
+    names = tuple(sorted({name.strip() for name in (classes or "").split(",") if name.strip()}))
+    return InferenceParams(conf=conf, iou=iou, max_det=max_det, classes=names or None, imgsz=imgsz)
+
+def raw_params(params: InferenceParams) -> InferenceParams:
+    """
+    Settings /predict runs the model with: every detection down to
+    RESULT_CONFIDENCE_FLOOR, so the result can be cached once and narrowed to
+    any conf, max_det and classes with select_detections
+    """
+    return params._replace(
+        conf=min(config.RESULT_CONFIDENCE_FLOOR, params.conf),
+        max_det=config.MAX_DETECTIONS_LIMIT,
+        classes=None,
+    )
+
+# What /predict runs the model with when a request changes no setting that needs a new forward pass
+DEFAULT_RAW_PARAMS = raw_params(InferenceParams())
+
+def validate_params(params: InferenceParams, model: Optional[str] = None, model_version: Optional[str] = None):
+    """
+    Reject settings the serving model(s) cannot honour, before any decoding (runs in the I/O pool)
+    
+    Raises:
+        ModelNotFoundError: if the requested model or version is not served (404)
+        InvalidParamsError: for unknown classes or an imgsz a fixed-size model cannot take (400)
+    """
+    models = [config.CASCADE_FAST_MODEL, config.CASCADE_ACCURATE_MODEL] if uses_cascade(model, model_version) else [model]
+    for name in models:
+        if host_client is None:
+            check_params(model_registry.resolve(name, model_version), params)
+            continue
+        served_version(name, model_version)
+        # The host checks imgsz (and classes of pinned versions) on a cache miss
+        name = name or host_client.served["default"]
+        known = host_client.served["class_names"].get(name)
+        if params.classes and known and not model_version:
+            unknown = set(params.classes) - set(known)
+            if unknown:
+                raise InvalidParamsError(f"Unknown classes for model {name}: {', '.join(sorted(unknown))}")
+
+def make_batcher(predict_fn) -> InferenceBatcher:
+    return InferenceBatcher(
+        predict_fn,
+        max_batch_size=config.BATCH_MAX_SIZE,
+        max_wait_ms=config.BATCH_MAX_WAIT_MS,
+        executor=inference_executor,
+        max_queue=config.INFERENCE_QUEUE_DEPTH,
+        retry_after=config.RETRY_AFTER_SECONDS,
+    )
+
+# Micro-batching scheduler shared by all /predict requests on this worker
+# (requests that name a model get a batcher per model, created on first use)
+batcher = make_batcher(functools.partial(run_serving_batch, params=DEFAULT_RAW_PARAMS))
+model_batchers = {}
+
+async def get_batcher(model: Optional[str]) -> InferenceBatcher:
+    """Batcher for requests that name ``model`` (the default batcher when None)"""
+    if model is None:
+        return batcher
+    if model not in model_batchers:
+        model_batchers[model] = make_batcher(functools.partial(run_predict_batch, model=model, params=DEFAULT_RAW_PARAMS))
+        await model_batchers[model].start()
+    return model_batchers[model]
+
+def all_batchers() -> List[InferenceBatcher]:
+    return [batcher, *model_batchers.values()]
+
+# Startup progress, reported by /ready, /stats and /metrics
+startup_state = {"status": "starting", "error": None, "phases": {}}
+
+def is_ready() -> bool:
+    """True once the model is loaded (or the model host is reachable) and warmed up"""
+    return startup_state["status"] == "ready"
+
+def require_ready():
+    """Answer 503 with Retry-After while the model is still loading or failed to load"""
+    if not is_ready():
+        raise HTTPException(
+            status_code=503,
+            detail=f"Model is not ready ({startup_state['status']})",
+            headers={"Retry-After": str(config.RETRY_AFTER_SECONDS)},
+        )
+
+def prepare_model():
+    """Resolve, load and warm up the models (or wait for the model host); runs in a thread"""
+    phases = startup_state["phases"]
+    start = time.perf_counter()
+    if host_client is not None:
+        # The host warms its model up before it starts listening
+        if not wait_for_host(config.MODEL_HOST_ADDRESS, config.MODEL_HOST_START_TIMEOUT):
+            raise RuntimeError(f"Model host at {config.MODEL_HOST_ADDRESS} is not reachable")
+        # Also learns the host's model version; a host without a model cannot serve
+        if not host_client.stats()["model_loaded"]:
+            raise RuntimeError(f"Model host at {config.MODEL_HOST_ADDRESS} has no model loaded")
+        phases["connect_model_host"] = round(time.perf_counter() - start, 3)
+        print(f"Connected to model host at {config.MODEL_HOST_ADDRESS}")
+        check_cascade()
+        return
+    
+    # Resolved once; set MODEL_PATH (or MODELS) to skip searching models/
+    models = configured_models()
+    phases["resolve_model_path"] = round(time.perf_counter() - start, 3)
+    for name, model_path in models:
+        # Loading includes warm-up, so the model only serves once it is warm
+        start = time.perf_counter()
+        handle = load_serving_model(name, model_path, default=name == config.DEFAULT_MODEL)
+        phases[f"load_model:{name}" if len(models) > 1 else "load_model"] = round(time.perf_counter() - start, 3)
+        print(f"Model {name} loaded successfully ({handle.model_type}, {handle.version}, {time.perf_counter() - start:.2f} s)")
+    check_cascade()
+
+def check_cascade():
+    """Fail startup when the cascade is enabled but one of its models is not served"""
+    if not config.CASCADE_ENABLED:
+        return
+    if not config.CASCADE_ACCURATE_MODEL:
+        raise RuntimeError("CASCADE_ENABLED needs CASCADE_ACCURATE_MODEL (a model name from MODELS)")
+    print(f"Cascade: {served_version(config.CASCADE_FAST_MODEL)} -> {served_version(config.CASCADE_ACCURATE_MODEL)}")
+
+async def run_startup():
+    """Background part of startup: the server answers /live while the model loads"""
+    start = time.perf_counter()
     try:
-        load_model()
-        print("Model loaded successfully")
+        await asyncio.to_thread(prepare_model)
+        startup_state["status"] = "ready"
     except Exception as e:
+        startup_state["status"] = "failed"
+        startup_state["error"] = str(e)
         print(f"❌ Error loading model: {str(e)}")
-        print("WARNING: Make sure your model file is in the models/ folder")
+        print("WARNING: Set MODEL_PATH or put your model file in the models/ folder")
+    startup_state["phases"]["model_total"] = round(time.perf_counter() - start, 3)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Lifespan context manager for startup and shutdown events"""
+    # Startup: services first, then the model in the background so probes answer right away
+    start = time.perf_counter()
+    persistence.start()
+    await live_hub.start()
+    if config.BATCHING_ENABLED:
+        await batcher.start()
+    startup_state["phases"]["start_services"] = round(time.perf_counter() - start, 3)
+    startup_task = asyncio.create_task(run_startup())
     yield
-    # Shutdown (if needed)
-    pass
+    # Shutdown
+    if not startup_task.done():
+        startup_task.cancel()
+        try:
+            await startup_task
+        except asyncio.CancelledError:
+            pass
+    for model_batcher in all_batchers():
+        await model_batcher.stop()
+    # Drain pending writes before the process exits
+    await asyncio.to_thread(persistence.stop)
+    await live_hub.stop()
+    inference_executor.shutdown()
+    io_executor.shutdown()
+    if host_client is not None:
+        host_client.close()
+    close_db()
 
 app = FastAPI(
     title="Cotton Weed Detection API",
@@ -50,14 +340,141 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Cache"],
 )
 
+if config.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+def collect_serving_metrics():
+    """Scrape-time gauges and counters read from the serving components' stats()"""
+    executors = {"inference": inference_executor.stats(), "io": io_executor.stats()}
+    batchings = [b.stats() for b in all_batchers()]
+    cache = prediction_cache.stats()
+    writes = persistence.stats()
+    if host_client is not None:
+        served = host_client.served
+        backends = {}
+    else:
+        served = model_registry.served()
+        backends = {m["name"]: m["type"] for m in model_registry.stats()["models"]}
+    yield "cotton_weed_http_requests_in_flight", "gauge", "HTTP requests being handled", [
+        ("cotton_weed_http_requests_in_flight", {}, in_flight_requests()),
+    ]
+    yield "cotton_weed_ready", "gauge", "1 once the model is loaded and warmed up", [
+        ("cotton_weed_ready", {}, int(is_ready())),
+    ]
+    yield "cotton_weed_startup_phase_seconds", "gauge", "Duration of each startup phase", [
+        ("cotton_weed_startup_phase_seconds", {"phase": phase}, seconds) for phase, seconds in list(startup_state["phases"].items())
+    ]
+    yield "cotton_weed_model_info", "gauge", "Served models: backend and live version", [
+        ("cotton_weed_model_info", {
+            "model": name,
+            "backend": backends.get(name, "shared"),
+            "version": version,
+            "default": str(name == served["default"]).lower(),
+            "serving_mode": config.MODEL_SERVING_MODE,
+        }, 1)
+        for name, version in served["models"].items()
+    ]
+    yield "cotton_weed_model_versions_draining", "gauge", "Replaced model versions still finishing in-flight batches", [
+        ("cotton_weed_model_versions_draining", {}, len(served["draining"])),
+    ]
+    yield "cotton_weed_executor_in_flight", "gauge", "Tasks running per executor", [
+        ("cotton_weed_executor_in_flight", {"executor": name}, s["in_flight"]) for name, s in executors.items()
+    ]
+    yield "cotton_weed_executor_queued", "gauge", "Tasks waiting for a thread per executor", [
+        ("cotton_weed_executor_queued", {"executor": name}, s["queued"]) for name, s in executors.items()
+    ]
+    yield "cotton_weed_executor_rejected_total", "counter", "Tasks rejected with 503 per executor", [
+        ("cotton_weed_executor_rejected_total", {"executor": name}, s["rejected"]) for name, s in executors.items()
+    ]
+    yield "cotton_weed_batcher_queue_depth", "gauge", "Images waiting for a micro-batch", [
+        ("cotton_weed_batcher_queue_depth", {}, sum(b["queue_size"] for b in batchings)),
+    ]
+    yield "cotton_weed_batches_in_flight", "gauge", "Micro-batches running on the model", [
+        ("cotton_weed_batches_in_flight", {}, sum(b["batches_in_flight"] for b in batchings)),
+    ]
+    sizes = {}
+    for batching in batchings:
+        for size, count in batching["batch_size_histogram"].items():
+            sizes[int(size)] = sizes.get(int(size), 0) + count
+    yield "cotton_weed_batch_size", "histogram", "Images per micro-batch forward pass", histogram_samples(
+        "cotton_weed_batch_size", sizes, [b for b in (1, 2, 4, 8, 16, 32, 64) if b < batcher.max_batch_size] + [batcher.max_batch_size]
+    )
+    if config.CASCADE_ENABLED:
+        cascade = cascade_stats.stats()
+        yield "cotton_weed_cascade_images_total", "counter", "Cascade images answered by the fast model or escalated, by reason", [
+            ("cotton_weed_cascade_images_total", {"outcome": "fast"}, cascade["fast"]),
+        ] + [
+            ("cotton_weed_cascade_images_total", {"outcome": f"escalated_{reason}"}, count) for reason, count in cascade["escalated"].items()
+        ]
+        yield "cotton_weed_cascade_escalation_ratio", "gauge", "Share of cascade images re-run on the accurate model since startup", [
+            ("cotton_weed_cascade_escalation_ratio", {}, cascade["escalation_rate"]),
+        ]
+    yield "cotton_weed_cache_lookups_total", "counter", "Prediction cache lookups by result", [
+        ("cotton_weed_cache_lookups_total", {"result": "hit"}, cache["hits"] - cache["disk_hits"]),
+        ("cotton_weed_cache_lookups_total", {"result": "disk_hit"}, cache["disk_hits"]),
+        ("cotton_weed_cache_lookups_total", {"result": "miss"}, cache["misses"]),
+    ]
+    yield "cotton_weed_cache_hit_ratio", "gauge", "Prediction cache hit rate since startup", [
+        ("cotton_weed_cache_hit_ratio", {}, cache["hit_rate"]),
+    ]
+    yield "cotton_weed_persistence_queue_depth", "gauge", "Predictions waiting to be written", [
+        ("cotton_weed_persistence_queue_depth", {}, writes["queued"]),
+    ]
+    yield "cotton_weed_persistence_queue_bytes", "gauge", "Upload bytes waiting to be written", [
+        ("cotton_weed_persistence_queue_bytes", {}, writes["queued_bytes"]),
+    ]
+    yield "cotton_weed_persisted_total", "counter", "Predictions written by the write-behind queue", [
+        ("cotton_weed_persisted_total", {"result": "written"}, writes["written"]),
+        ("cotton_weed_persisted_total", {"result": "failed"}, writes["failed"]),
+    ]
+    yield "cotton_weed_live_feed_clients", "gauge", "Connected /predictions/stream clients", [
+        ("cotton_weed_live_feed_clients", {}, live_hub.stats()["clients"]),
+    ]
+
+registry.add_collector(collect_serving_metrics)
+
+@app.exception_handler(ImageTooLargeError)
+async def image_too_large_handler(request, exc: ImageTooLargeError):
+    """Reject oversized uploads before they are decoded"""
+    return JSONResponse(status_code=413, content={"detail": str(exc)})
+
+@app.exception_handler(ModelNotFoundError)
+async def model_not_found_handler(request, exc: ModelNotFoundError):
+    """Requests for a model name or version that is not served"""
+    return JSONResponse(status_code=404, content={"detail": str(exc)})
+
+@app.exception_handler(InvalidParamsError)
+async def invalid_params_handler(request, exc: InvalidParamsError):
+    """Inference settings the requested model cannot honour"""
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+@app.exception_handler(ExecutorBusyError)
+async def executor_busy_handler(request, exc: ExecutorBusyError):
+    """Fail fast with 503 when the server is saturated"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
 # Response model
 class PredictionResponse(BaseModel):
+    model_config = ConfigDict(protected_namespaces=())  # allow the model_version field
+    
     boxes: List[List[float]]
     classes: List[str]
     confidences: List[float]
     num_detections: int
+    model_version: Optional[str] = None
+    escalated: Optional[bool] = None  # cascade mode: re-run on the accurate model
+
+# One NDJSON line of a /predict/batch response
+class BatchPredictionItem(PredictionResponse):
+    index: int
+    filename: str
 
 @app.get("/")
 async def root():
@@ -67,7 +484,18 @@ async def root():
         "status": "running",
         "endpoints": {
             "predict": "/predict",
+            "predict_batch": "/predict/batch",
+            "predict_video": "/predict/video",
             "health": "/health",
+            "live": "/live",
+            "ready": "/ready",
+            "stats": "/stats",
+            "metrics": "/metrics",
+            "models": "/models",
+            "predictions": "/predictions",
+            "export": "/predictions/export",
+            "live_feed": "/predictions/stream",
+            "analytics": ["/analytics/classes", "/analytics/confidence", "/analytics/rate"],
             "docs": "/docs"
         }
     }
@@ -75,67 +503,775 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    model = get_model()
+    if host_client is not None:
+        try:
+            model_loaded = (await io_executor.run(host_client.stats))["model_loaded"]
+        except Exception:
+            model_loaded = False
+    else:
+        model_loaded = get_model() is not None
     return {
         "status": "healthy",
-        "model_loaded": model is not None
+        "model_loaded": model_loaded,
+        "ready": is_ready()
+    }
+
+@app.get("/live")
+async def liveness():
+    """Liveness probe: the process and its event loop respond (the model may still be loading)"""
+    return {"status": "alive"}
+
+@app.get("/ready")
+async def readiness():
+    """Readiness probe: 200 once the model is loaded and warmed up, 503 before that or if loading failed"""
+    body = {
+        "status": startup_state["status"],
+        "model_version": current_model_version(),
+        "startup_seconds": startup_state["phases"],
+    }
+    if startup_state["error"]:
+        body["error"] = startup_state["error"]
+    return JSONResponse(body, status_code=200 if is_ready() else 503)
+
+@app.get("/stats")
+async def stats():
+    """Serving statistics (achieved batch sizes etc.)"""
+    model_host = None
+    if host_client is not None:
+        try:
+            model_host = await io_executor.run(host_client.stats)
+        except Exception as e:
+            model_host = {"error": str(e)}
+    return {
+        "serving_mode": config.MODEL_SERVING_MODE,
+        "startup": startup_state,
+        "model_host": model_host,
+        "batching": {
+            "enabled": config.BATCHING_ENABLED,
+            **batcher.stats(),
+            "models": {name: b.stats() for name, b in model_batchers.items()},
+        },
+        "cache": {"enabled": config.PREDICTION_CACHE_ENABLED, **prediction_cache.stats()},
+        "cascade": {"enabled": config.CASCADE_ENABLED, **cascade_stats.stats()},
+        "executors": {
+            "inference": inference_executor.stats(),
+            "io": io_executor.stats(),
+        },
+        "persistence": persistence.stats(),
+        "live_feed": live_hub.stats(),
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics (text exposition format)"""
+    if not config.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(registry.render(), media_type=METRICS_CONTENT_TYPE)
+
+@app.get("/models")
+async def list_models():
+    """Served models, versions still draining after a reload, and reloads in progress"""
+    if host_client is not None:
+        return await io_executor.run(host_client.models)
+    return model_registry.stats()
+
+@app.post("/models/{name}/reload", status_code=202)
+async def reload_model(
+    name: str,
+    path: Optional[str] = Query(None, description="Model file inside MODEL_DIR (default: the file the model was configured with)"),
+    x_admin_token: Optional[str] = Header(None),
+):
+    """
+    Load a new version of a model (or a new named model) without downtime
+    
+    The file is loaded and warmed up in the background while the current
+    version keeps serving; then new requests switch to it and requests that
+    already started on the old version finish there. Watch /models for the
+    result.
+    
+    In local serving mode this only works with a single worker process: a
+    reload would reach just the worker that received the request.
+    """
+    if not config.MODEL_ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Model reloads are disabled (set MODEL_ADMIN_TOKEN)")
+    if not hmac.compare_digest((x_admin_token or "").encode(), config.MODEL_ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+    if host_client is None and config.API_WORKERS > 1:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Reloads in local serving mode would only reach one of {config.API_WORKERS} workers; "
+                   "use MODEL_SERVING_MODE=shared or restart the workers",
+        )
+    try:
+        if host_client is not None:
+            return await io_executor.run(host_client.reload, name, path)
+        model_path = reload_model_path(name, path)
+        start_model_reload(name, model_path)
+        return {"name": name, "path": model_path}
+    except ModelLoadingError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
 @app.get("/predictions/latest")
 async def get_latest():
     """Get latest predictions for real-time sync"""
-    predictions = get_latest_predictions(limit=10)
+    predictions = await io_executor.run(get_latest_predictions, limit=10)
     return {"predictions": predictions}
 
+@app.get("/predictions")
+async def list_predictions(
+    cursor: Optional[int] = Query(None, ge=0, description="next_cursor of the previous page"),
+    limit: int = Query(50, ge=1),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    device_type: Optional[str] = None,
+    class_name: Optional[str] = None,
+    min_confidence: float = Query(0.0, ge=0.0, le=1.0),
+):
+    """
+    Prediction history, keyset-paginated
+    
+    ``class_name`` and ``min_confidence`` keep predictions with at least one
+    matching detection. Pass ``next_cursor`` back as ``cursor`` for the next page.
+    """
+    limit = min(limit, config.HISTORY_MAX_PAGE_SIZE)
+    rows = await io_executor.run(
+        query_predictions,
+        cursor,
+        limit,
+        descending=order == "desc",
+        start=start,
+        end=end,
+        device_type=device_type,
+        class_name=class_name,
+        min_confidence=min_confidence,
+    )
+    next_cursor = rows[-1]["id"] if len(rows) == limit else None
+    return {"predictions": rows, "next_cursor": next_cursor}
+
+async def stream_export(chunks: Iterator[bytes]):
+    """Pull encoded chunks (each one a database page) in the I/O pool"""
+    while True:
+        chunk = await io_executor.run_admitted(next, chunks, None)
+        if chunk is None:
+            break
+        if chunk:
+            yield chunk
+
+@app.get("/predictions/export")
+async def export_predictions(
+    format: str = Query("ndjson", pattern="^(" + "|".join(EXPORT_FORMATS) + ")$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    device_type: Optional[str] = None,
+    class_name: Optional[str] = None,
+    min_confidence: float = Query(0.0, ge=0.0, le=1.0),
+):
+    """Stream every matching prediction, oldest first, as NDJSON, CSV or Parquet"""
+    if format == "parquet" and not parquet_available():
+        raise HTTPException(status_code=400, detail="Parquet export requires the pyarrow package")
+    # Admission is checked once; the export then reads page by page
+    if io_executor.is_saturated():
+        raise ExecutorBusyError(io_executor.name, config.RETRY_AFTER_SECONDS)
+    pages = iter_predictions(
+        config.EXPORT_PAGE_SIZE,
+        start=start,
+        end=end,
+        device_type=device_type,
+        class_name=class_name,
+        min_confidence=min_confidence,
+    )
+    media_type, extension = EXPORT_FORMATS[format]
+    return StreamingResponse(
+        stream_export(ENCODERS[format](pages)),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="predictions.{extension}"'},
+    )
+
+async def stream_live_feed(request: Request, after_id: Optional[int]):
+    """Server-Sent Events frames for one client; everything pending is sent in one write"""
+    async for batch in live_hub.subscribe(after_id, heartbeat=config.LIVE_FEED_HEARTBEAT_S):
+        if await request.is_disconnected():
+            break
+        yield "".join(format_sse(message) for message in batch)
+
+@app.get("/predictions/stream")
+async def predictions_stream(
+    request: Request,
+    after_id: Optional[int] = Query(None, ge=0),
+    last_event_id: Optional[str] = Header(None),
+):
+    """
+    Live feed of new predictions (Server-Sent Events)
+    
+    Resumes after ``after_id`` or the ``Last-Event-ID`` header that browsers
+    send when they reconnect; otherwise only predictions saved from now on
+    are sent.
+    """
+    if after_id is None and last_event_id and last_event_id.isdigit():
+        after_id = int(last_event_id)
+    if live_hub.is_full():
+        raise ExecutorBusyError("live_feed", config.RETRY_AFTER_SECONDS)
+    return StreamingResponse(
+        stream_live_feed(request, after_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def detection_filters(
+    start: Optional[datetime],
+    end: Optional[datetime],
+    class_name: Optional[str],
+    device_type: Optional[str],
+    min_confidence: float,
+) -> dict:
+    """Filters shared by the /analytics endpoints (timestamps are UTC unless they carry an offset)"""
+    return {
+        "start": start,
+        "end": end,
+        "class_name": class_name,
+        "device_type": device_type,
+        "min_confidence": min_confidence,
+    }
+
+@app.get("/analytics/classes")
+async def analytics_classes(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    class_name: Optional[str] = None,
+    device_type: Optional[str] = None,
+    min_confidence: float = Query(0.0, ge=0.0, le=1.0),
+):
+    """Detection counts per class"""
+    filters = detection_filters(start, end, class_name, device_type, min_confidence)
+    classes = await io_executor.run(count_detections_by_class, **filters)
+    return {"classes": classes, "total": sum(row["count"] for row in classes)}
+
+@app.get("/analytics/confidence")
+async def analytics_confidence(
+    bins: int = Query(10, ge=1, le=100),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    class_name: Optional[str] = None,
+    device_type: Optional[str] = None,
+    min_confidence: float = Query(0.0, ge=0.0, le=1.0),
+):
+    """Histogram of detection confidences"""
+    filters = detection_filters(start, end, class_name, device_type, min_confidence)
+    histogram = await io_executor.run(confidence_histogram, bins, **filters)
+    return {"bins": histogram}
+
+@app.get("/analytics/rate")
+async def analytics_rate(
+    bucket: str = Query("hour", pattern="^(" + "|".join(RATE_BUCKETS) + ")$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    class_name: Optional[str] = None,
+    device_type: Optional[str] = None,
+    min_confidence: float = Query(0.0, ge=0.0, le=1.0),
+):
+    """Detections per minute, hour or day"""
+    filters = detection_filters(start, end, class_name, device_type, min_confidence)
+    rate = await io_executor.run(detection_rate, bucket, **filters)
+    return {"bucket": bucket, "series": rate}
+
+def decode_input_size(imgsz: Optional[int] = None) -> Optional[int]:
+    """Model input size that JPEGs are draft-decoded to (None disables draft decoding)"""
+    if not config.JPEG_DRAFT_DECODE:
+        return None
+    model = get_model() if host_client is None else None
+    if model is not None:
+        return max(get_input_size(model, imgsz))
+    return imgsz or config.MODEL_INPUT_SIZE
+
+def decode_upload(image_bytes: bytes, tiled: Optional[bool] = None, imgsz: Optional[int] = None) -> Tuple[Image.Image, Tuple[int, int], bool]:
+    """
+    Check limits and decode uploaded bytes into an RGB PIL Image (runs in the inference pool)
+    
+    Returns:
+        (image, original size, whether to use tiled inference). Unless the image
+        is tiled it may be decoded at reduced resolution; boxes predicted on it
+        have to be rescaled to the original size.
+    """
+    image = open_image(image_bytes, config.MAX_IMAGE_PIXELS)
+    original_size = image.size
+    tiling = use_tiling(original_size, tiled)
+    # Tiling needs every pixel; the plain path only needs the model input scale
+    image = decode_image(image, None if tiling else decode_input_size(imgsz))
+    return image, original_size, tiling
+
+def cache_params(
+    raw: InferenceParams = DEFAULT_RAW_PARAMS,
+    tiled: Optional[bool] = None,
+    cascade: bool = False,
+    hard: bool = False,
+) -> dict:
+    """
+    Settings that change prediction results and therefore belong in the cache key
+    
+    Entries hold the raw result (see raw_params): conf, max_det and classes
+    are applied per request, so they are not part of the key.
+    """
+    params = {
+        "floor": raw.conf,
+        "iou": raw.iou,
+        "max_det": raw.max_det,
+        "imgsz": raw.imgsz,
+        "draft": config.JPEG_DRAFT_DECODE,
+    }
+    if tiled or (tiled is None and config.TILING_MODE != "off"):
+        params["tiling"] = {
+            "mode": "always" if tiled else config.TILING_MODE,
+            "tile": config.TILE_SIZE,
+            "overlap": config.TILE_OVERLAP,
+            "min_scale": config.TILING_MIN_SCALE,
+            "full_image": config.TILING_FULL_IMAGE,
+            "merge": config.TILING_MERGE_THRESHOLD,
+            "max_det": config.TILING_MAX_DETECTIONS,
+        }
+    if cascade:
+        params["cascade"] = {
+            "low": config.CASCADE_UNCERTAIN_LOW,
+            "high": config.CASCADE_UNCERTAIN_HIGH,
+            "min": config.CASCADE_MIN_UNCERTAIN,
+            "hard": hard,
+        }
+    return params
+
+def use_tiling(image_size: Tuple[int, int], tiled: Optional[bool]) -> bool:
+    """Whether an image goes through sliced inference (request flag first, then TILING_MODE)"""
+    if tiled is not None:
+        return tiled
+    if config.TILING_MODE == "always":
+        return True
+    return config.TILING_MODE == "auto" and should_tile(image_size, config.TILE_SIZE, config.TILING_MIN_SCALE)
+
+def predict_tiled_image(
+    image: Image.Image,
+    model: Optional[str] = None,
+    model_version: Optional[str] = None,
+    params: Optional[InferenceParams] = None,
+) -> Optional[dict]:
+    """Sliced inference through this worker's batched prediction path (runs in the inference pool)"""
+    def tile(predict_fn) -> Optional[dict]:
+        return predict_tiled(
+            image,
+            predict_fn,
+            tile_size=config.TILE_SIZE,
+            overlap=config.TILE_OVERLAP,
+            batch_size=config.TILE_BATCH_SIZE,
+            include_full_image=config.TILING_FULL_IMAGE,
+            merge_threshold=config.TILING_MERGE_THRESHOLD,
+            max_detections=config.TILING_MAX_DETECTIONS,
+        )
+    
+    if host_client is not None:
+        # Pinned to one version, so a reload in the host cannot mix two models in one image
+        version = model_version or host_client.resolve(model)
+        predictions = tile(functools.partial(host_client.predict_batch, model=model, model_version=version, params=params))
+    else:
+        # Holding the model keeps this version alive for every tile even if it is replaced meanwhile
+        with model_registry.acquire(model, model_version) as handle:
+            version = handle.version
+            predictions = tile(functools.partial(predict_with_model, handle, params=params))
+    if predictions is not None:
+        predictions["model_version"] = version
+    return predictions
+
+def lookup_cached_prediction(
+    image_bytes: bytes,
+    tiled: Optional[bool] = None,
+    model: Optional[str] = None,
+    model_version: Optional[str] = None,
+    hard: bool = False,
+    raw: InferenceParams = DEFAULT_RAW_PARAMS,
+) -> Tuple[Optional[str], Optional[str], Optional[dict]]:
+    """
+    Hash the upload and look it up in the cache (runs in the I/O pool)
+    
+    Returns:
+        (cache key, model version the key was built for, cached raw predictions or None)
+    
+    Raises:
+        ModelNotFoundError: if the requested model or version is not served
+    """
+    version = request_version(model, model_version)
+    # Entries of replaced versions are dropped once the versions in use change
+    prediction_cache.retain_model_versions(served_versions())
+    key = make_key(hash_bytes(image_bytes), version, cache_params(raw, tiled, uses_cascade(model, model_version), hard))
+    return key, version, prediction_cache.get(key)
+
 @app.post("/predict", response_model=PredictionResponse)
-async def predict(file: UploadFile = File(...)):
+async def predict(
+    response: Response,
+    file: UploadFile = File(...),
+    tiled: Optional[bool] = Query(None, description="Sliced inference for large images (default: TILING_MODE)"),
+    model: Optional[str] = Query(None, description="Model name (default: DEFAULT_MODEL)"),
+    model_version: Optional[str] = Query(None, description="Exact model version (see /models)"),
+    hard: bool = Query(False, description="Cascade mode: skip the fast model for an image known to be difficult"),
+    params: InferenceParams = Depends(inference_params),
+    original_width: Optional[int] = Query(None, ge=1, description="Width of the image before the client downscaled it"),
+    original_height: Optional[int] = Query(None, ge=1, description="Height of the image before the client downscaled it"),
+):
     """
     Predict weeds in uploaded image
     
     Args:
         file: Image file (jpg, png, etc.)
+        tiled: Force sliced inference on or off
+        model: Model to use, by name
+        model_version: Model to use, by version
+        hard: Send the image straight to the cascade's accurate model
+        params: conf, iou, max_det, classes and imgsz from the query string
+        original_width, original_height: Size of the photo the client
+            downscaled the upload from; boxes are returned in that resolution
     
     Returns:
-        JSON with bounding boxes, classes, and confidences
+        JSON with bounding boxes, classes, confidences and the model version
+        that produced them
     """
     try:
         # Validate file type
         if not file.content_type.startswith("image/"):
             raise HTTPException(status_code=400, detail="File must be an image")
+        if (original_width is None) != (original_height is None):
+            raise HTTPException(status_code=400, detail="original_width and original_height go together")
+        require_ready()
+        
+        timing = ServerTiming()
+        request_start = time.perf_counter()
         
-        # Read image
-        image_bytes = await file.read()
-        image = Image.open(io.BytesIO(image_bytes))
+        # Read image in chunks, rejecting oversized uploads early
+        image_bytes = await read_upload(file, config.MAX_UPLOAD_BYTES)
+        timing.since("upload_read", request_start)
         
-        # Convert to RGB if necessary
-        if image.mode != "RGB":
-            image = image.convert("RGB")
+        # 404/400 before any decoding
+        if model is not None or model_version is not None or params.classes or params.imgsz:
+            await io_executor.run(validate_params, params, model, model_version)
         
-        # Get predictions
-        predictions = predict_image(image)
+        # The model keeps every detection down to the confidence floor, so a
+        # re-upload with other conf/max_det/classes is answered from the cache
+        raw = raw_params(params)
+        
+        # Identical uploads (retries, re-uploaded photos) are answered from the cache
+        cache_key, cache_version, predictions, upload_size = None, None, None, None
+        if config.PREDICTION_CACHE_ENABLED:
+            start = time.perf_counter()
+            cache_key, cache_version, predictions = await io_executor.run(lookup_cached_prediction, image_bytes, tiled, model, model_version, hard, raw)
+            timing.since("cache_lookup", start)
+        response.headers["X-Cache"] = "HIT" if predictions is not None else "MISS"
         
         if predictions is None:
-            raise HTTPException(status_code=500, detail="Prediction failed")
+            start = time.perf_counter()
+            image, original_size, tiling = await inference_executor.run(decode_upload, image_bytes, tiled, raw.imgsz)
+            timing.since("decode", start)
+            
+            # Get predictions (batched together with concurrent requests when enabled)
+            # "predict" includes waiting for a batch and a free worker
+            start = time.perf_counter()
+            if tiling:
+                # Tiles are batched among themselves
+                predictions = await inference_executor.run(predict_tiled_image, image, model, model_version, raw)
+            elif config.BATCHING_ENABLED and model_version is None and not hard and raw == DEFAULT_RAW_PARAMS:
+                predictions = await (await get_batcher(model)).submit(image)
+            else:
+                # Pinned versions, hard images and custom iou/imgsz are rare and run unbatched
+                predictions = (await inference_executor.run(run_serving_batch, [image], model, model_version, hard, raw))[0]
+            timing.since("predict", start)
+            
+            if predictions is None:
+                raise HTTPException(status_code=500, detail="Prediction failed")
+            predictions = rescale_predictions(predictions, image.size, original_size)
+            upload_size = original_size
+            
+            # The cache key is only valid if the model was not replaced while we were predicting
+            if cache_key is not None and predictions.get("model_version") in cache_version.split("+"):
+                try:
+                    io_executor.submit(prediction_cache.put, cache_key, predictions, cache_version)
+                except ExecutorBusyError:
+                    pass  # caching is best effort
+        
+        predictions = select_detections(predictions, params.conf, params.classes, params.max_det)
+        
+        # Save prediction to database for real-time sync (written behind, in batches)
+        # The original upload bytes are stored (optional - you can store in cloud storage instead)
+        try:
+            persistence.submit(image_bytes, file.filename, predictions, device_type="api")
+        except ExecutorBusyError:
+            print(f"WARNING: Persistence queue full, {file.filename} was not saved")
         
-        # Save prediction to database for real-time sync
-        # Save image temporarily (optional - you can store in cloud storage instead)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        image_path = f"uploads/{timestamp}_{file.filename}"
-        os.makedirs("uploads", exist_ok=True)
-        image.save(image_path)
+        # Boxes are stored with the upload they were predicted on, and answered
+        # in the resolution of the photo a client downscaled before sending
+        if original_width is not None:
+            if upload_size is None:
+                upload_size = await io_executor.run(image_size, image_bytes)
+            predictions = rescale_predictions(predictions, upload_size, (original_width, original_height))
         
-        save_prediction(image_path, predictions, device_type="api")
+        if config.SERVER_TIMING_ENABLED:
+            timing.add("total", time.perf_counter() - request_start)
+            response.headers["Server-Timing"] = timing.header()
         
         return PredictionResponse(
             boxes=predictions["boxes"],
             classes=predictions["classes"],
             confidences=predictions["confidences"],
-            num_detections=len(predictions["boxes"])
+            num_detections=len(predictions["boxes"]),
+            model_version=predictions.get("model_version", cache_version),
+            escalated=predictions.get("escalated"),
         )
     
+    except (HTTPException, ExecutorBusyError, ImageTooLargeError, ModelNotFoundError, InvalidParamsError):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
 
+def iter_upload_images(files: List[UploadFile]) -> Iterator[Tuple[str, Optional[bytes]]]:
+    """
+    Yield (filename, bytes) for every image in the uploaded files, expanding archives lazily
+    
+    Images larger than MAX_UPLOAD_BYTES are yielded with None instead of being read.
+    """
+    for file in files:
+        kind = archive_kind(file.filename, file.content_type)
+        if kind is not None:
+            file.file.seek(0)
+            yield from iter_archive_images(file.file, kind, max_bytes=config.MAX_UPLOAD_BYTES)
+        else:
+            size = file.file.seek(0, io.SEEK_END)
+            file.file.seek(0)
+            too_large = config.MAX_UPLOAD_BYTES and size > config.MAX_UPLOAD_BYTES
+            yield file.filename or "image", None if too_large else file.file.read()
+
+def load_chunk(source: Iterator[Tuple[str, Optional[bytes]]], size: int, imgsz: Optional[int] = None) -> List[Tuple[str, bytes, Optional[Image.Image], Optional[Tuple[int, int]], Optional[str]]]:
+    """
+    Read and decode up to ``size`` images from ``source`` (runs in the inference pool)
+    
+    Returns:
+        (filename, bytes, image, original size, error) tuples
+    """
+    chunk = []
+    input_size = decode_input_size(imgsz)
+    for filename, image_bytes in source:
+        if image_bytes is None:
+            chunk.append((filename, b"", None, None, f"Image exceeds the limit of {config.MAX_UPLOAD_BYTES} bytes"))
+        else:
+            try:
+                image = open_image(image_bytes, config.MAX_IMAGE_PIXELS)
+                original_size = image.size
+                chunk.append((filename, image_bytes, decode_image(image, input_size), original_size, None))
+            except Exception as e:
+                chunk.append((filename, image_bytes, None, None, f"Error decoding image: {str(e)}"))
+        if len(chunk) >= size:
+            break
+    return chunk
+
+async def stream_batch_predictions(
+    files: List[UploadFile],
+    model: Optional[str] = None,
+    model_version: Optional[str] = None,
+    params: Optional[InferenceParams] = None,
+):
+    """
+    Run uploaded images through the model chunk by chunk and yield NDJSON lines
+
+    The next chunk is read and decoded while the current one is in the model,
+    and only two chunks are held in memory at a time.
+    """
+    source = iter_upload_images(files)
+    chunk_size = config.BATCH_MAX_SIZE
+    imgsz = params.imgsz if params is not None else None
+    index = 0
+    
+    next_chunk = asyncio.ensure_future(inference_executor.run_admitted(load_chunk, source, chunk_size, imgsz))
+    while True:
+        try:
+            chunk = await next_chunk
+        except Exception as e:
+            yield json.dumps({"index": index, "error": f"Error reading upload: {str(e)}"}) + "\n"
+            return
+        if not chunk:
+            return
+        
+        remaining = config.BATCH_ENDPOINT_MAX_IMAGES - index
+        limit_reached = len(chunk) >= remaining
+        chunk = chunk[:remaining]
+        if not limit_reached:
+            # Prefetch the following chunk while this one runs through the model
+            next_chunk = asyncio.ensure_future(inference_executor.run_admitted(load_chunk, source, chunk_size, imgsz))
+        
+        images = [image for _, _, image, _, _ in chunk if image is not None]
+        results = iter(await inference_executor.run_admitted(run_serving_batch, images, model, model_version, False, params))
+        
+        for filename, image_bytes, image, original_size, error in chunk:
+            predictions = next(results) if image is not None else None
+            if image is not None and predictions is None:
+                error = "Prediction failed"
+            elif predictions is not None:
+                predictions = rescale_predictions(predictions, image.size, original_size)
+            
+            if error is not None:
+                yield json.dumps({"index": index, "filename": filename, "error": error}) + "\n"
+            else:
+                try:
+                    persistence.submit(image_bytes, filename, predictions, device_type="api_batch")
+                except ExecutorBusyError:
+                    print(f"WARNING: Persistence queue full, {filename} was not saved")
+                item = BatchPredictionItem(
+                    index=index,
+                    filename=filename,
+                    boxes=predictions["boxes"],
+                    classes=predictions["classes"],
+                    confidences=predictions["confidences"],
+                    num_detections=len(predictions["boxes"]),
+                    model_version=predictions.get("model_version"),
+                    escalated=predictions.get("escalated"),
+                )
+                yield item.model_dump_json() + "\n"
+            index += 1
+        
+        if limit_reached:
+            yield json.dumps({
+                "index": index,
+                "error": f"Image limit of {config.BATCH_ENDPOINT_MAX_IMAGES} per request reached"
+            }) + "\n"
+            return
+
+@app.post("/predict/batch")
+async def predict_batch_endpoint(
+    files: List[UploadFile] = File(...),
+    model: Optional[str] = Query(None, description="Model name (default: DEFAULT_MODEL)"),
+    model_version: Optional[str] = Query(None, description="Exact model version (see /models)"),
+    params: InferenceParams = Depends(inference_params),
+):
+    """
+    Predict weeds in many images with one request
+    
+    Args:
+        files: Image files and/or zip/tar archives of images
+        model: Model to use, by name
+        model_version: Model to use, by version
+        params: conf, iou, max_det, classes and imgsz from the query string
+    
+    Returns:
+        NDJSON stream with one line per image (PredictionResponse fields plus
+        index and filename, or index, filename and error)
+    """
+    for file in files:
+        content_type = file.content_type or ""
+        if archive_kind(file.filename, content_type) is None and not content_type.startswith("image/"):
+            raise HTTPException(status_code=400, detail=f"{file.filename} is neither an image nor a zip/tar archive")
+    require_ready()
+    if model is not None or model_version is not None or params.classes or params.imgsz:
+        await io_executor.run(validate_params, params, model, model_version)
+    
+    if inference_executor.is_saturated():
+        raise ExecutorBusyError(inference_executor.name, inference_executor.retry_after)
+    
+    return StreamingResponse(stream_batch_predictions(files, model, model_version, params), media_type="application/x-ndjson")
+
+async def save_upload_to_temp(file: UploadFile, max_bytes: int) -> str:
+    """Copy an upload to a temporary file in chunks (OpenCV needs a path); returns the path"""
+    suffix = os.path.splitext(file.filename or "")[1] or ".mp4"
+    handle = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
+    total = 0
+    try:
+        with handle:
+            while True:
+                chunk = await file.read(1024 * 1024)
+                if not chunk:
+                    break
+                total += len(chunk)
+                if max_bytes and total > max_bytes:
+                    raise ImageTooLargeError(f"Video exceeds the limit of {max_bytes} bytes")
+                await io_executor.run(handle.write, chunk)
+    except BaseException:
+        os.unlink(handle.name)
+        raise
+    return handle.name
+
+async def stream_video_predictions(
+    path: str,
+    stride: int,
+    track: bool,
+    model: Optional[str] = None,
+    model_version: Optional[str] = None,
+    params: Optional[InferenceParams] = None,
+):
+    """
+    Decode, predict and (optionally) track video frames, yielding NDJSON lines
+    
+    Frames are decoded and predicted one batch at a time in the inference pool,
+    so only one batch of frames is held in memory.
+    """
+    tracker = IoUTracker(config.TRACKER_IOU_THRESHOLD, config.TRACKER_MAX_AGE, config.TRACKER_HIGH_CONFIDENCE) if track else None
+    frames = iter_video_frames(path, stride, config.VIDEO_MAX_FRAMES)
+    predict_fn = functools.partial(run_serving_batch, model=model, model_version=model_version, params=params)
+    items = predict_video(frames, predict_fn, config.BATCH_MAX_SIZE, tracker)
+    processed = detections = 0
+    try:
+        while True:
+            try:
+                item = await inference_executor.run_admitted(next, items, None)
+            except Exception as e:
+                yield json.dumps({"frame": None, "error": f"Error reading video: {str(e)}"}) + "\n"
+                break
+            if item is None:
+                break
+            processed += 1
+            detections += item.get("num_detections", 0)
+            yield json.dumps(item) + "\n"
+        yield json.dumps(video_summary(processed, tracker, detections)) + "\n"
+    finally:
+        try:
+            items.close()  # releases the VideoCapture
+        except ValueError:
+            pass  # still running in the pool after a disconnect; it is released when collected
+        remove_file(path)
+
+def remove_file(path: str):
+    """Delete a temporary file if it still exists"""
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+@app.post("/predict/video")
+async def predict_video_endpoint(
+    file: UploadFile = File(...),
+    stride: int = Query(config.VIDEO_FRAME_STRIDE, ge=1, description="Process every n-th frame"),
+    track: bool = Query(False, description="Assign persistent track ids across frames"),
+    model: Optional[str] = Query(None, description="Model name (default: DEFAULT_MODEL)"),
+    model_version: Optional[str] = Query(None, description="Exact model version (see /models)"),
+    params: InferenceParams = Depends(inference_params),
+):
+    """
+    Predict weeds in a video, frame by frame
+    
+    Returns:
+        NDJSON stream with one line per processed frame (frame, timestamp_ms,
+        boxes, classes, confidences, num_detections, model_version, and
+        track_ids when tracking), then a summary line with unique object
+        counts per class
+    """
+    if not is_video(file.filename, file.content_type):
+        raise HTTPException(status_code=400, detail="File must be a video")
+    require_ready()
+    if model is not None or model_version is not None or params.classes or params.imgsz:
+        await io_executor.run(validate_params, params, model, model_version)
+    if inference_executor.is_saturated():
+        raise ExecutorBusyError(inference_executor.name, inference_executor.retry_after)
+    
+    path = await save_upload_to_temp(file, config.VIDEO_MAX_BYTES)
+    return StreamingResponse(
+        stream_video_predictions(path, stride, track, model, model_version, params),
+        media_type="application/x-ndjson",
+        background=BackgroundTask(remove_file, path),  # also cleans up if the stream never started
+    )
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
 
@@ -0,0 +1,216 @@
+"""
+Metrics Module
+Lightweight Prometheus instrumentation: stage timing histograms and scrape-time gauges
+
+Histograms are updated on the request path (a lock and a bisect per
+observation); everything else (queue depths, in-flight work, cache hit
+rates, batch sizes) is read from the components' existing ``stats()`` at
+scrape time, so it costs nothing per request. The text format follows the
+Prometheus exposition format 0.0.4, without needing prometheus_client.
+"""
+import bisect
+import math
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers sub-millisecond NMS up to slow multi-second tiled requests
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, int) or value.is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+class Histogram:
+    """
+    Cumulative histogram with optional labels
+
+    ``observe`` is thread-safe and cheap enough for the request path.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, ...], List] = {}  # label values -> [bucket counts, sum, count]
+
+    def observe(self, value: float, *labelvalues: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            snapshot = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labelvalues, (counts, total, count) in sorted(snapshot.items()):
+            labels = dict(zip(self.labelnames, labelvalues))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Histograms plus collector callbacks rendered together on /metrics
+
+    A collector returns ``(name, type, help, samples)`` families where samples
+    are ``(sample name, labels, value)`` tuples (the sample name differs from
+    the family name only for histogram ``_bucket``/``_sum``/``_count``
+    series). Collectors run only when /metrics is scraped.
+    """
+
+    def __init__(self):
+        self._histograms: List[Histogram] = []
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, Iterable[Tuple[str, Dict, float]]]]]] = []
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        histogram = Histogram(name, documentation, labelnames, buckets)
+        self._histograms.append(histogram)
+        return histogram
+
+    def add_collector(self, collector: Callable):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for histogram in self._histograms:
+            lines.extend(histogram.collect())
+        for collector in self._collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                print(f"WARNING: Metrics collector failed: {e}")
+                continue
+            for name, kind, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for sample_name, labels, value in samples:
+                    lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# Where a request's time goes: upload read, decode, preprocess, inference,
+# postprocess, cache lookup, and the write-behind file and database writes
+stage_seconds = registry.histogram(
+    "cotton_weed_stage_duration_seconds", "Time spent per processing stage", ("stage",)
+)
+request_seconds = registry.histogram(
+    "cotton_weed_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status")
+)
+
+_in_flight = 0
+_in_flight_lock = threading.Lock()
+
+
+def observe_stage(stage: str, seconds: float):
+    """Record one stage duration (module-level helper for code without a ServerTiming)"""
+    stage_seconds.observe(seconds, stage)
+
+
+class ServerTiming:
+    """
+    Per-request stage timer
+
+    Every stage is recorded into ``stage_seconds``; the collected durations
+    can also be returned to the client as a ``Server-Timing`` header.
+    """
+    __slots__ = ("_entries",)
+
+    def __init__(self):
+        self._entries: List[Tuple[str, float]] = []
+
+    def add(self, stage: str, seconds: float):
+        stage_seconds.observe(seconds, stage)
+        self._entries.append((stage, seconds))
+
+    def since(self, stage: str, start: float):
+        """Record the time since ``start`` (a ``time.perf_counter()`` value)"""
+        self.add(stage, time.perf_counter() - start)
+
+    def header(self) -> str:
+        return ", ".join(f"{stage};dur={seconds * 1000.0:.2f}" for stage, seconds in self._entries)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request latency and in-flight HTTP requests
+
+    Latency is labelled with the route template (``/predictions/{id}``), not
+    the raw path, to keep the number of series bounded. Unmatched paths are
+    grouped under "unmatched".
+    """
+
+    def __init__(self, app, exclude: Sequence[str] = ("/metrics",)):
+        self.app = app
+        self.exclude = set(exclude)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("path") in self.exclude:
+            await self.app(scope, receive, send)
+            return
+        global _in_flight
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        with _in_flight_lock:
+            _in_flight += 1
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            with _in_flight_lock:
+                _in_flight -= 1
+            route = scope.get("route")
+            request_seconds.observe(
+                time.perf_counter() - start, scope.get("method", ""), getattr(route, "path", "unmatched"), str(status[0])
+            )
+
+
+def in_flight_requests() -> int:
+    return _in_flight
+
+
+def histogram_samples(name: str, counts: Dict[int, int], bounds: Sequence[int], labels: Optional[Dict] = None) -> List[Tuple[str, Dict, float]]:
+    """Histogram samples for a counter of exact integer values (e.g. achieved batch sizes)"""
+    labels = labels or {}
+    samples = []
+    for bound in list(bounds) + [math.inf]:
+        samples.append((f"{name}_bucket", {**labels, "le": _format_value(float(bound))}, sum(c for v, c in counts.items() if v <= bound)))
+    samples.append((f"{name}_sum", labels, sum(v * c for v, c in counts.items())))
+    samples.append((f"{name}_count", labels, sum(counts.values())))
+    return samples
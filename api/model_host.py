@@ -0,0 +1,391 @@
+"""
+Model Host Module
+Serves one shared copy of the model to all API worker processes on a node
+
+Run with: python -m api.model_host
+
+The host process loads the model once and listens on a local (Unix) socket.
+API workers send decoded images through shared memory and receive the
+predictions back over the socket. Requests from all workers are collected
+into common batches, so batching works across workers too. With several
+models (MODELS) each batch runs on one model version, and reloads requested
+by any worker happen in the host.
+"""
+import os
+import queue
+import stat
+import threading
+import time
+from multiprocessing import resource_tracker
+from multiprocessing.connection import Client, Connection, Listener
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from . import config
+from .predictor import InferenceParams, InvalidParamsError
+from .registry import ModelLoadingError, ModelNotFoundError
+
+# (shared memory name, array shape) of one RGB uint8 image
+ImageDescriptor = Tuple[str, Tuple[int, ...]]
+
+# Exceptions that are re-raised in the worker with their own type (the API maps them to status codes)
+_REMOTE_ERRORS = {cls.__name__: cls for cls in (ModelNotFoundError, ModelLoadingError, InvalidParamsError, FileNotFoundError, ValueError)}
+
+
+def _socket_family(address: str) -> str:
+    return 'AF_UNIX' if not address.startswith('\\\\.\\pipe\\') else 'AF_PIPE'
+
+
+def _require_authkey() -> bytes:
+    """
+    The host unpickles whatever arrives on its socket, so only clients that
+    know the key may connect (raises RuntimeError when MODEL_HOST_AUTHKEY is unset)
+    """
+    if not config.MODEL_HOST_AUTHKEY:
+        raise RuntimeError("MODEL_HOST_AUTHKEY must be set in shared serving mode (gunicorn_conf.py generates one)")
+    return config.MODEL_HOST_AUTHKEY
+
+
+def _prepare_socket_dir(address: str):
+    """
+    Create the socket's directory with mode 0700, or check that an existing
+    one belongs to this user and is not accessible to anyone else
+    """
+    directory = os.path.dirname(os.path.abspath(address))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.lstat(directory)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise RuntimeError(f"Model host socket directory {directory} must be a directory owned by this user with mode 0700")
+
+
+class _PendingRequest:
+    """One worker request waiting for its images to go through a batch"""
+
+    def __init__(self, images: List[Image.Image], model: Optional[str], model_version: Optional[str], params: Optional[InferenceParams]):
+        self.images = images
+        self.model = model
+        self.model_version = model_version
+        self.params = params
+        self.results: List[Optional[Dict]] = []
+        self.error: Optional[Exception] = None
+        self.done = threading.Event()
+
+
+class ModelHost:
+    """Loads the models and serves batched predictions to local clients"""
+
+    def __init__(self, address: str, max_batch_size: int, max_wait_ms: float):
+        self.address = address
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._requests: "queue.Queue[_PendingRequest]" = queue.Queue()
+        self._batches = 0
+        self._images = 0
+        self._model_loaded = False
+
+    def serve_forever(self):
+        """Load the models, then accept worker connections until interrupted"""
+        from .model_loader import configured_models, registry
+        from .predictor import load_serving_model
+
+        authkey = _require_authkey()
+        if _socket_family(self.address) == 'AF_UNIX':
+            _prepare_socket_dir(self.address)
+
+        # Workers connect once the host listens, so they never see a cold model
+        for name, path in configured_models():
+            try:
+                handle = load_serving_model(name, path, default=name == config.DEFAULT_MODEL)
+                print(f"Model {name} loaded successfully ({handle.version})")
+            except Exception as e:
+                print(f"❌ Error loading model {name}: {str(e)}")
+        self._model_loaded = registry.get() is not None
+        if not self._model_loaded:
+            # Exit instead of serving errors, so the failure is visible to gunicorn and the healthcheck
+            raise SystemExit("Model host: no model could be loaded")
+        threading.Thread(target=self._batch_loop, name="model-host-batcher", daemon=True).start()
+
+        if os.path.exists(self.address):
+            os.remove(self.address)
+        with Listener(self.address, family=_socket_family(self.address), authkey=authkey) as listener:
+            print(f"Model host listening on {self.address}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    print(f"WARNING: Rejected model host connection: {e}")
+                    continue
+                threading.Thread(target=self._handle_connection, args=(conn,), daemon=True).start()
+
+    def _handle_connection(self, conn: Connection):
+        """Serve requests from one worker connection"""
+        with conn:
+            while True:
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    return
+                command = message[0]
+                try:
+                    if command == "predict":
+                        conn.send(("ok", self._predict(*message[1:])))
+                    elif command == "stats":
+                        conn.send(("ok", self.stats()))
+                    elif command == "models":
+                        conn.send(("ok", self.models()))
+                    elif command == "reload":
+                        conn.send(("ok", self.reload(*message[1:])))
+                    else:
+                        conn.send(("error", ("RuntimeError", f"Unknown command: {command}")))
+                except Exception as e:
+                    conn.send(("error", (type(e).__name__, str(e))))
+
+    def _predict(
+        self,
+        descriptors: List[ImageDescriptor],
+        model: Optional[str] = None,
+        model_version: Optional[str] = None,
+        params: Optional[InferenceParams] = None,
+    ) -> Dict:
+        """Read images from shared memory and wait for them to be batched"""
+        from .model_loader import registry
+
+        images = [_read_shared_image(name, shape) for name, shape in descriptors]
+        request = _PendingRequest(images, model, model_version, params)
+        self._requests.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return {"results": request.results, "served": registry.served()}
+
+    def _batch_loop(self):
+        """Collect requests from all connections into shared batches"""
+        from .predictor import predict_batch
+
+        while True:
+            requests = [self._requests.get()]
+            size = len(requests[0].images)
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                requests.append(request)
+                size += len(request.images)
+
+            # One forward pass per requested model and settings (usually all requests want the defaults)
+            groups: Dict[tuple, List[_PendingRequest]] = {}
+            for request in requests:
+                groups.setdefault((request.model, request.model_version, request.params), []).append(request)
+            for (model, model_version, params), group in groups.items():
+                images = [image for request in group for image in request.images]
+                try:
+                    results = predict_batch(images, model, model_version, params)
+                except Exception as e:
+                    for request in group:
+                        request.error = e
+                        request.done.set()
+                    continue
+                self._batches += 1
+                self._images += len(images)
+
+                offset = 0
+                for request in group:
+                    request.results = results[offset:offset + len(request.images)]
+                    offset += len(request.images)
+                    request.done.set()
+
+    def stats(self) -> Dict:
+        """Model host status and batching statistics"""
+        from .model_loader import get_model_version, registry
+
+        return {
+            "model_loaded": self._model_loaded,
+            "model_version": get_model_version(),
+            "served": registry.served(),
+            "batches": self._batches,
+            "images": self._images,
+            "avg_batch_size": round(self._images / self._batches, 3) if self._batches else 0.0,
+        }
+
+    def models(self) -> Dict:
+        """Models served by the host (registry statistics)"""
+        from .model_loader import registry
+
+        return registry.stats()
+
+    def reload(self, name: str, path: Optional[str] = None) -> Dict:
+        """Start loading a new version of ``name`` in the background"""
+        from .model_loader import reload_model_path
+        from .predictor import start_model_reload
+
+        model_path = reload_model_path(name, path)
+        start_model_reload(name, model_path)
+        return {"name": name, "path": model_path}
+
+
+def _read_shared_image(name: str, shape: Tuple[int, ...]) -> Image.Image:
+    """Copy an image out of a worker's shared memory block"""
+    shm = SharedMemory(name=name)
+    try:
+        # The worker owns (and unlinks) the block; stop our resource tracker from cleaning it up too
+        resource_tracker.unregister(shm._name, "shared_memory")
+        array = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        return Image.fromarray(array.copy())
+    finally:
+        shm.close()
+
+
+class ModelHostClient:
+    """
+    Client used by API workers to run predictions in the shared model host
+
+    Keeps a small pool of socket connections so several inference threads
+    can talk to the host at the same time.
+    """
+
+    # How long the host's served versions are trusted before asking again
+    SERVED_MAX_AGE = 1.0
+
+    def __init__(self, address: str):
+        self.address = address
+        self.model_version: Optional[str] = None  # version of the host's default model, as last reported
+        self.served: Dict = {"default": None, "models": {}, "class_names": {}, "draining": []}  # registry.served() of the host
+        self._served_at = 0.0
+        self._connections: "queue.LifoQueue[Connection]" = queue.LifoQueue()
+
+    def _connect(self) -> Connection:
+        return Client(self.address, family=_socket_family(self.address), authkey=_require_authkey())
+
+    def _request(self, message: tuple):
+        try:
+            conn = self._connections.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            conn.send(message)
+            status, payload = conn.recv()
+        except Exception:
+            conn.close()
+            raise
+        self._connections.put(conn)
+        if status != "ok":
+            kind, text = payload
+            if kind in _REMOTE_ERRORS:
+                raise _REMOTE_ERRORS[kind](text)
+            raise RuntimeError(f"Model host error: {text}")
+        return payload
+
+    def _update_served(self, served: Dict):
+        self.served = served
+        self._served_at = time.monotonic()
+        self.model_version = served["models"].get(served["default"])
+
+    def resolve(self, model: Optional[str] = None, model_version: Optional[str] = None) -> str:
+        """
+        Version of the host's model that serves ``model`` / ``model_version``
+
+        Asks the host again when its last report is older than
+        SERVED_MAX_AGE, or before giving up, in case a reload happened since.
+
+        Raises:
+            ModelNotFoundError: if the host does not serve it
+        """
+        for refresh in (time.monotonic() - self._served_at > self.SERVED_MAX_AGE, True):
+            if refresh:
+                self.stats()
+            served = self.served
+            if model_version:
+                if (model_version in served["draining"] and not model) or any(
+                    version == model_version and (not model or name == model) for name, version in served["models"].items()
+                ):
+                    return model_version
+            else:
+                version = served["models"].get(model or served["default"])
+                if version is not None:
+                    return version
+        if model_version:
+            raise ModelNotFoundError(f"Model version {model_version} is not served")
+        raise ModelNotFoundError(f"Model {model} is not loaded" if model else "No model loaded")
+
+    def predict_batch(
+        self,
+        images: List[Image.Image],
+        model: Optional[str] = None,
+        model_version: Optional[str] = None,
+        params: Optional[InferenceParams] = None,
+    ) -> List[Optional[Dict]]:
+        """Same contract as predictor.predict_batch, executed in the model host"""
+        if not images:
+            return []
+        blocks = []
+        try:
+            descriptors = []
+            for image in images:
+                array = np.asarray(image.convert("RGB") if image.mode != "RGB" else image, dtype=np.uint8)
+                shm = SharedMemory(create=True, size=max(1, array.nbytes))
+                blocks.append(shm)
+                np.ndarray(array.shape, dtype=np.uint8, buffer=shm.buf)[...] = array
+                descriptors.append((shm.name, array.shape))
+            reply = self._request(("predict", descriptors, model, model_version, params))
+            self._update_served(reply["served"])
+            return reply["results"]
+        except (ModelNotFoundError, InvalidParamsError):
+            raise
+        except Exception as e:
+            print(f"Error in model host prediction: {str(e)}")
+            return [None] * len(images)
+        finally:
+            for shm in blocks:
+                shm.close()
+                shm.unlink()
+
+    def stats(self) -> Dict:
+        """Status of the model host"""
+        stats = self._request(("stats",))
+        self._update_served(stats["served"])
+        return stats
+
+    def models(self) -> Dict:
+        """Models served by the host"""
+        return self._request(("models",))
+
+    def reload(self, name: str, path: Optional[str] = None) -> Dict:
+        """Ask the host to load a new version of ``name`` in the background"""
+        return self._request(("reload", name, path))
+
+    def close(self):
+        """Close pooled connections"""
+        while True:
+            try:
+                self._connections.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def wait_for_host(address: str, timeout: float) -> bool:
+    """Wait until the model host accepts connections"""
+    _require_authkey()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            ModelHostClient(address).stats()
+            return True
+        except Exception:
+            time.sleep(0.5)
+    return False
+
+
+if __name__ == "__main__":
+    ModelHost(
+        config.MODEL_HOST_ADDRESS,
+        max_batch_size=config.BATCH_MAX_SIZE,
+        max_wait_ms=config.BATCH_MAX_WAIT_MS,
+    ).serve_forever()
@@ -2,18 +2,28 @@
 Model Loading Module
 Loads the trained model based on file format
 """
+import hashlib
 import os
-import torch
-import torch.nn as nn
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
+from . import config
+from .registry import ModelRegistry
+
+# torch, ultralytics and tensorflow are imported only by the loader that needs
+# them: importing torch alone takes seconds and hundreds of MB, which a
+# container serving an ONNX model never has to pay
 
-# Global model variable
-_model = None
-_model_path = None
-_model_type = None  # 'yolo', 'pytorch', 'tensorflow', 'onnx'
 
 def get_model_path():
-    """Get the path to the model file"""
+    """
+    Get the path to the model file
+    
+    MODEL_PATH wins when set (it is returned even if it does not exist, so a
+    typo fails loudly instead of silently loading another file). Otherwise
+    the usual locations under models/ are searched.
+    """
+    if config.MODEL_PATH:
+        return os.path.abspath(config.MODEL_PATH)
+    
     # Get the project root directory (parent of api/ folder)
     current_file = os.path.abspath(__file__)
     api_dir = os.path.dirname(current_file)
@@ -57,18 +67,58 @@ def get_model_path():
     
     return None
 
-def load_model(model_path: Optional[str] = None):
+def get_exported_onnx_path(model_path: str, precision: str = "fp32") -> Optional[str]:
+    """
+    Return the ONNX export that sits next to a model file if it exists and is
+    not older than the weights
+    
+    For precision "int8" the quantized export (<name>_int8.onnx, see
+    `python -m api.quantize`) is returned; otherwise <name>.onnx next to
+    .pt/.pth weights.
+    """
+    stem, ext = os.path.splitext(model_path)
+    ext = ext.lower()
+    if stem.endswith('_int8'):
+        return None
+    if precision == "int8" and ext in ('.pt', '.pth', '.onnx'):
+        candidates = [stem + '_int8.onnx']
+    elif ext in ('.pt', '.pth'):
+        candidates = [stem + '.onnx']
+    else:
+        return None
+    
+    for onnx_path in candidates:
+        if not os.path.exists(onnx_path):
+            continue
+        if os.path.getmtime(onnx_path) < os.path.getmtime(model_path):
+            print(f"WARNING: {onnx_path} is older than {model_path}, re-run the export. Ignoring it.")
+            continue
+        return onnx_path
+    if precision == "int8":
+        print(f"WARNING: No INT8 model found for {model_path} (build one with `python -m api.quantize build`)")
+    return None
+
+def compute_model_version(model_path: str) -> str:
+    """Identify model weights by file name and content hash"""
+    digest = hashlib.sha256()
+    with open(model_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return f"{os.path.basename(model_path)}@{digest.hexdigest()[:12]}"
+
+def load_model_file(model_path: Optional[str] = None) -> Dict:
     """
-    Load the trained model
+    Load a model file without serving it
     
     Args:
         model_path: Path to model file. If None, will search for model files.
     
     Returns:
-        Loaded model
+        Dictionary with model, model_type ('yolo', 'pytorch', 'tensorflow' or
+        'onnx'), class_names (class id -> name, when the file carries them),
+        path (the file actually loaded, e.g. the ONNX export) and version
+        ("<file name>@<content hash>")
     """
-    global _model, _model_path, _model_type
-    
     if model_path is None:
         model_path = get_model_path()
     
@@ -81,91 +131,66 @@ def load_model(model_path: Optional[str] = None):
     if not os.path.exists(model_path):
         raise FileNotFoundError(f"Model file not found at: {model_path}")
     
-    print(f"Loading model from: {model_path}")
+    # Fast path: serve the exported (optionally INT8) ONNX model through onnxruntime when available
+    if config.PREFER_ONNX or config.MODEL_PRECISION == "int8":
+        onnx_path = get_exported_onnx_path(model_path, config.MODEL_PRECISION)
+        if onnx_path is None and config.MODEL_PRECISION == "int8" and config.PREFER_ONNX:
+            onnx_path = get_exported_onnx_path(model_path)
+        if onnx_path is not None:
+            try:
+                import onnxruntime  # noqa: F401
+                model_path = onnx_path
+            except ImportError:
+                print("WARNING: onnxruntime not installed, serving the PyTorch model instead of the ONNX export")
     
-    # Determine model format and load accordingly
-    file_ext = os.path.splitext(model_path)[1].lower()
-    filename = os.path.basename(model_path).lower()
+    print(f"Loading model from: {model_path}")
     
     try:
-        # Check if it's a YOLOv8 model (by filename or by trying to load with ultralytics)
-        if 'yolo' in filename or 'yolov8' in filename:
-            try:
-                from ultralytics import YOLO
-                _model = YOLO(model_path)
-                _model_type = 'yolo'
-                print("YOLOv8 model loaded successfully")
-                _model_path = model_path
-                return _model
-            except ImportError:
-                print("WARNING: ultralytics not installed. Trying standard PyTorch loading...")
-            except Exception as e:
-                print(f"WARNING: Failed to load as YOLO model: {e}. Trying standard PyTorch loading...")
-        
-        if file_ext in ['.pth', '.pt']:
-            # PyTorch model
-            device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-            print(f"Using device: {device}")
-            
-            # Try loading as YOLO first (even if filename doesn't suggest it)
-            try:
-                from ultralytics import YOLO
-                _model = YOLO(model_path)
-                _model_type = 'yolo'
-                print("YOLOv8 model loaded successfully")
-                _model_path = model_path
-                return _model
-            except:
-                pass
-            
-            # Try loading as full model first
-            try:
-                _model = torch.load(model_path, map_location=device)
-                if isinstance(_model, nn.Module):
-                    _model.eval()
-                _model_type = 'pytorch'
-                print("Model loaded (full model)")
-            except:
-                # If that fails, try loading as state dict
-                checkpoint = torch.load(model_path, map_location=device)
-                if isinstance(checkpoint, dict) and 'model' in checkpoint:
-                    _model = checkpoint['model']
-                    _model.eval()
-                    _model_type = 'pytorch'
-                elif isinstance(checkpoint, dict) and 'state_dict' in checkpoint:
-                    print("WARNING: State dict found. You need to define your model architecture.")
-                    _model = checkpoint
-                    _model_type = 'pytorch'
-                else:
-                    _model = checkpoint
-                    _model_type = 'pytorch'
-                print("Model loaded (checkpoint/state dict)")
-        
-        elif file_ext == '.onnx':
-            # ONNX model - will need onnxruntime
+        model_format = detect_model_format(model_path, config.MODEL_FORMAT)
+        model, class_names = None, {}
+        if model_format == 'yolo':
+            from ultralytics import YOLO
+            model = YOLO(model_path)
+            model_type = 'yolo'
+            class_names = dict(model.names)
+            print("YOLOv8 model loaded successfully")
+        elif model_format == 'auto-pt':
+            # ultralytics checkpoints are tried once, then plain torch.load
+            model = _load_yolo(model_path, warn='yolo' in os.path.basename(model_path).lower())
+            model_type = 'yolo'
+            if model is None:
+                model = _load_pytorch(model_path)
+                model_type = 'pytorch'
+            else:
+                class_names = dict(model.names)
+        elif model_format == 'pytorch':
+            model = _load_pytorch(model_path)
+            model_type = 'pytorch'
+        elif model_format == 'onnx':
             try:
-                import onnxruntime as ort
-                _model = ort.InferenceSession(model_path)
-                _model_type = 'onnx'
-                print("ONNX model loaded")
+                from .onnx_backend import OnnxModel
             except ImportError:
                 raise ImportError("onnxruntime not installed. Install with: pip install onnxruntime")
-        
-        elif file_ext == '.h5':
-            # TensorFlow/Keras model
+            model = OnnxModel(model_path)
+            model_type = 'onnx'
+            class_names = model.class_names
+            print(f"ONNX model loaded (providers: {', '.join(model.get_providers())})")
+        elif model_format == 'tensorflow':
             try:
                 import tensorflow as tf
-                _model = tf.keras.models.load_model(model_path)
-                _model_type = 'tensorflow'
-                print("TensorFlow/Keras model loaded")
             except ImportError:
                 raise ImportError("TensorFlow not installed. Install with: pip install tensorflow")
+            model = tf.keras.models.load_model(model_path)
+            model_type = 'tensorflow'
+            print("TensorFlow/Keras model loaded")
         
-        else:
-            raise ValueError(f"Unsupported model format: {file_ext}")
-        
-        _model_path = model_path
-        return _model
+        return {
+            "model": model,
+            "model_type": model_type,
+            "class_names": class_names,
+            "path": model_path,
+            "version": compute_model_version(model_path),
+        }
     
     except Exception as e:
         raise Exception(f"Error loading model: {str(e)}\n"
@@ -174,15 +199,138 @@ def load_model(model_path: Optional[str] = None):
                        f"2. Required libraries are installed\n"
                        f"3. Model architecture matches the saved model")
 
+def detect_model_format(model_path: str, model_format: str = "auto") -> str:
+    """
+    Decide how to load a model file, without importing any framework
+    
+    Returns 'yolo', 'pytorch', 'onnx', 'tensorflow', or 'auto-pt' for .pt/.pth
+    weights that may be either an ultralytics checkpoint or a plain PyTorch
+    model (YOLO is tried once, then torch.load). ONNX files (including the
+    export picked by PREFER_ONNX) always load through onnxruntime.
+    """
+    file_ext = os.path.splitext(model_path)[1].lower()
+    if file_ext == '.onnx':
+        return 'onnx'
+    if model_format != "auto":
+        if model_format not in ('yolo', 'pytorch', 'onnx', 'tensorflow'):
+            raise ValueError(f"Unknown MODEL_FORMAT: {model_format}")
+        return model_format
+    if file_ext == '.h5':
+        return 'tensorflow'
+    if file_ext in ('.pt', '.pth'):
+        return 'auto-pt'
+    raise ValueError(f"Unsupported model format: {file_ext}")
+
+def _load_yolo(model_path: str, warn: bool):
+    """Load an ultralytics checkpoint, or return None if that fails (``warn``: say why)"""
+    try:
+        from ultralytics import YOLO
+    except ImportError:
+        if warn:
+            print("WARNING: ultralytics not installed. Trying standard PyTorch loading...")
+        return None
+    try:
+        model = YOLO(model_path)
+    except Exception as e:
+        if warn:
+            print(f"WARNING: Failed to load as YOLO model: {e}. Trying standard PyTorch loading...")
+        return None
+    print("YOLOv8 model loaded successfully")
+    return model
+
+def _load_pytorch(model_path: str):
+    """Load a full PyTorch model or a checkpoint dict with torch.load"""
+    import torch
+    
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    print(f"Using device: {device}")
+    checkpoint = torch.load(model_path, map_location=device)
+    if isinstance(checkpoint, torch.nn.Module):
+        checkpoint.eval()
+        print("Model loaded (full model)")
+        return checkpoint
+    if isinstance(checkpoint, dict) and 'model' in checkpoint:
+        model = checkpoint['model']
+        model.eval()
+    elif isinstance(checkpoint, dict) and 'state_dict' in checkpoint:
+        print("WARNING: State dict found. You need to define your model architecture.")
+        model = checkpoint
+    else:
+        model = checkpoint
+    print("Model loaded (checkpoint/state dict)")
+    return model
+
+# Every served model lives in the registry; the accessors below refer to the default model
+registry = ModelRegistry(load_model_file)
+
+def configured_models() -> List[Tuple[str, Optional[str]]]:
+    """(name, path) of every model to serve at startup, the default model first"""
+    if config.MODELS:
+        models = sorted(config.MODELS.items(), key=lambda item: item[0] != config.DEFAULT_MODEL)
+        return [(name, os.path.abspath(path)) for name, path in models]
+    # Single model: MODEL_PATH, or the first model file found in models/
+    return [(config.DEFAULT_MODEL, get_model_path())]
+
+def reload_model_path(name: str, path: Optional[str] = None) -> str:
+    """
+    Model file for a reload of ``name``
+    
+    Args:
+        name: Registry name
+        path: File relative to MODEL_DIR; None reloads the file ``name`` was
+            configured with (e.g. after it was overwritten in place)
+    
+    Raises:
+        ValueError: if ``path`` points outside MODEL_DIR
+        FileNotFoundError: if the file does not exist or ``name`` has no configured file
+    """
+    if path is None:
+        configured = dict(configured_models())
+        if configured.get(name) is None:
+            raise FileNotFoundError(f"Model {name} has no configured file, pass a path")
+        return configured[name]
+    model_dir = os.path.realpath(config.MODEL_DIR)
+    model_path = os.path.realpath(os.path.join(model_dir, path))
+    if os.path.commonpath([model_dir, model_path]) != model_dir:
+        raise ValueError(f"Model files must be inside {config.MODEL_DIR}")
+    if not os.path.isfile(model_path):
+        raise FileNotFoundError(f"Model file not found: {path}")
+    return model_path
+
+def load_model(model_path: Optional[str] = None, name: Optional[str] = None):
+    """
+    Load a model and serve it as the default model
+    
+    Args:
+        model_path: Path to model file. If None, will search for model files.
+        name: Registry name (default: DEFAULT_MODEL)
+    
+    Returns:
+        Loaded model
+    """
+    return registry.load(name or config.DEFAULT_MODEL, model_path, default=True).model
+
 def get_model():
     """Get the loaded model"""
-    return _model
+    handle = registry.get()
+    return handle.model if handle is not None else None
 
 def get_model_path_loaded():
     """Get the path of the loaded model"""
-    return _model_path
+    handle = registry.get()
+    return handle.path if handle is not None else None
 
 def get_model_type():
     """Get the type of the loaded model"""
-    return _model_type
+    handle = registry.get()
+    return handle.model_type if handle is not None else None
+
+def get_model_version() -> Optional[str]:
+    """Get the version identifier of the loaded model"""
+    handle = registry.get()
+    return handle.version if handle is not None else None
 
+def get_class_names() -> Dict[int, str]:
+    """Get the class names stored with the loaded model (empty if unknown)"""
+    handle = registry.get()
+    return handle.class_names if handle is not None else {}
@@ -0,0 +1,113 @@
+"""
+ONNX Runtime Backend
+Runs exported models with tuned session options (threads, graph optimizations, providers, IO binding)
+"""
+import ast
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from . import config
+
+GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": "ORT_DISABLE_ALL",
+    "basic": "ORT_ENABLE_BASIC",
+    "extended": "ORT_ENABLE_EXTENDED",
+    "all": "ORT_ENABLE_ALL",
+}
+
+
+def build_session_options(ort):
+    """Create SessionOptions from the ORT_* settings"""
+    options = ort.SessionOptions()
+    if config.ORT_INTRA_OP_THREADS > 0:
+        options.intra_op_num_threads = config.ORT_INTRA_OP_THREADS
+    if config.ORT_INTER_OP_THREADS > 0:
+        options.inter_op_num_threads = config.ORT_INTER_OP_THREADS
+
+    level = GRAPH_OPTIMIZATION_LEVELS.get(config.ORT_GRAPH_OPTIMIZATION)
+    if level is None:
+        raise ValueError(
+            f"Unknown ORT_GRAPH_OPTIMIZATION '{config.ORT_GRAPH_OPTIMIZATION}' "
+            f"(expected one of: {', '.join(GRAPH_OPTIMIZATION_LEVELS)})"
+        )
+    options.graph_optimization_level = getattr(ort.GraphOptimizationLevel, level)
+
+    if config.ORT_EXECUTION_MODE == "parallel":
+        options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+    else:
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    return options
+
+
+def select_providers(ort) -> List[str]:
+    """Requested execution providers that this onnxruntime build actually has"""
+    available = ort.get_available_providers()
+    providers = [p for p in config.ORT_PROVIDERS if p in available]
+    missing = [p for p in config.ORT_PROVIDERS if p not in available]
+    if missing:
+        print(f"WARNING: ONNX Runtime providers not available, skipping: {', '.join(missing)}")
+    if "CPUExecutionProvider" not in providers:
+        providers.append("CPUExecutionProvider")
+    return providers
+
+
+def parse_class_names(metadata: Dict[str, str]) -> Dict[int, str]:
+    """Read class names stored by the ultralytics exporter in the model metadata"""
+    names = metadata.get("names")
+    if not names:
+        return {}
+    try:
+        parsed = ast.literal_eval(names)
+    except (ValueError, SyntaxError):
+        return {}
+    if isinstance(parsed, dict):
+        return {int(k): str(v) for k, v in parsed.items()}
+    if isinstance(parsed, (list, tuple)):
+        return {i: str(v) for i, v in enumerate(parsed)}
+    return {}
+
+
+class OnnxModel:
+    """
+    Thin wrapper around ort.InferenceSession
+
+    Exposes the same ``run`` / ``get_inputs`` interface as a plain session, so
+    the predictor treats it like any other ONNX model. With IO binding enabled
+    the input array is bound in place instead of being copied by ``run``.
+    """
+
+    def __init__(self, model_path: str, io_binding: Optional[bool] = None):
+        import onnxruntime as ort
+
+        self.model_path = model_path
+        self.session = ort.InferenceSession(
+            model_path,
+            sess_options=build_session_options(ort),
+            providers=select_providers(ort),
+        )
+        self.io_binding = config.ORT_IO_BINDING if io_binding is None else io_binding
+        self.class_names = parse_class_names(self.session.get_modelmeta().custom_metadata_map)
+        self._output_names = [output.name for output in self.session.get_outputs()]
+
+    def get_inputs(self):
+        return self.session.get_inputs()
+
+    def get_outputs(self):
+        return self.session.get_outputs()
+
+    def get_providers(self) -> List[str]:
+        return self.session.get_providers()
+
+    def run(self, output_names: Optional[List[str]], feed: Dict[str, np.ndarray]) -> List[np.ndarray]:
+        """Run the model (same contract as InferenceSession.run)"""
+        if not self.io_binding:
+            return self.session.run(output_names, feed)
+
+        binding = self.session.io_binding()
+        for name, value in feed.items():
+            binding.bind_cpu_input(name, np.ascontiguousarray(value))
+        for name in output_names or self._output_names:
+            binding.bind_output(name)
+        self.session.run_with_iobinding(binding)
+        return binding.copy_outputs_to_cpu()
@@ -0,0 +1,176 @@
+"""
+Persistence Module
+Write-behind queue that stores uploads and predictions off the request path
+"""
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional
+
+from .executors import ExecutorBusyError
+from .metrics import observe_stage
+
+
+class PendingWrite(NamedTuple):
+    """One prediction waiting to be persisted"""
+    image_bytes: bytes
+    filename: str
+    predictions: Dict
+    device_type: str
+
+
+class WriteBehindWriter:
+    """
+    Background writer for uploads and prediction rows
+
+    Requests only enqueue their result. A single thread writes the original
+    upload bytes to ``upload_dir`` and inserts the rows with one transaction
+    per batch, flushing when ``max_batch`` writes are queued or
+    ``flush_interval_ms`` has passed. ``stop()`` drains everything still queued.
+
+    Every queued write holds its upload bytes, so the queue is bounded by
+    pending bytes (``max_bytes``) as well as by count; when either is full,
+    ``submit`` answers 503 instead of growing memory.
+    """
+
+    def __init__(
+        self,
+        save_batch,
+        upload_dir: str = "uploads",
+        max_batch: int = 64,
+        flush_interval_ms: float = 200.0,
+        max_queue: int = 10000,
+        max_bytes: int = 512 * 1024 * 1024,
+        retry_after: int = 1,
+    ):
+        self.save_batch = save_batch
+        self.upload_dir = upload_dir
+        self.max_batch = max(1, max_batch)
+        self.flush_interval = max(0.0, flush_interval_ms) / 1000.0
+        self.retry_after = retry_after
+        self._queue: "queue.Queue[Optional[PendingWrite]]" = queue.Queue(maxsize=max(0, max_queue))
+        self._thread: Optional[threading.Thread] = None
+        self.max_bytes = max(0, max_bytes)  # 0 = unlimited
+        self._pending_bytes = 0
+        self._bytes_lock = threading.Lock()
+
+        # Metrics
+        self._written = 0
+        self._batches = 0
+        self._failed = 0
+        self._last_flush_ms = 0.0
+
+    def start(self):
+        """Start the writer thread"""
+        if self._thread is not None:
+            return
+        os.makedirs(self.upload_dir, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 30.0):
+        """Flush everything queued, then stop the writer thread"""
+        if self._thread is None:
+            return
+        self._queue.put(None)  # sentinel: drain and exit
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, image_bytes: bytes, filename: str, predictions: Dict, device_type: str = "api"):
+        """Queue a prediction for persistence without waiting for disk or database"""
+        size = len(image_bytes)
+        with self._bytes_lock:
+            # A single upload larger than the limit is still accepted into an empty queue
+            if self.max_bytes and self._pending_bytes and self._pending_bytes + size > self.max_bytes:
+                raise ExecutorBusyError("persistence", self.retry_after)
+            self._pending_bytes += size
+        try:
+            self._queue.put_nowait(PendingWrite(image_bytes, filename or "image", predictions, device_type))
+        except queue.Full:
+            self._release_bytes(size)
+            raise ExecutorBusyError("persistence", self.retry_after)
+
+    def _release_bytes(self, size: int):
+        with self._bytes_lock:
+            self._pending_bytes -= size
+
+    def _collect(self) -> tuple:
+        """Block for the first write, then gather more until the batch is full or the interval expires"""
+        first = self._queue.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = self._collect()
+            if batch:
+                self._flush(batch)
+        # Drain whatever was queued behind the sentinel
+        remaining = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                remaining.append(item)
+        for start in range(0, len(remaining), self.max_batch):
+            self._flush(remaining[start:start + self.max_batch])
+
+    def _flush(self, batch: List[PendingWrite]):
+        """Write upload files, then insert all rows in one transaction"""
+        start = time.perf_counter()
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        records = []
+        for item in batch:
+            # Original bytes, no re-encode; the random part keeps same-second uploads apart
+            name = f"{timestamp}_{uuid.uuid4().hex[:8]}_{os.path.basename(item.filename)}"
+            image_path = os.path.join(self.upload_dir, name)
+            try:
+                with open(image_path, "wb") as f:
+                    f.write(item.image_bytes)
+            except OSError as e:
+                print(f"WARNING: Could not write upload {image_path}: {e}")
+                image_path = None
+            records.append((image_path, item.predictions, item.device_type))
+        written = time.perf_counter()
+        observe_stage("persist_files", written - start)
+
+        try:
+            self.save_batch(records)
+            self._written += len(records)
+            self._batches += 1
+        except Exception as e:
+            self._failed += len(records)
+            print(f"❌ Error saving {len(records)} predictions: {str(e)}")
+        observe_stage("persist_db", time.perf_counter() - written)
+        self._last_flush_ms = (time.perf_counter() - start) * 1000.0
+        self._release_bytes(sum(len(item.image_bytes) for item in batch))
+
+    def stats(self) -> Dict:
+        """Queue depth and write counters"""
+        return {
+            "queued": self._queue.qsize(),
+            "queued_bytes": self._pending_bytes,
+            "written": self._written,
+            "batches": self._batches,
+            "avg_batch_size": round(self._written / self._batches, 3) if self._batches else 0.0,
+            "failed": self._failed,
+            "last_flush_ms": round(self._last_flush_ms, 3),
+        }
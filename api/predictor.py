@@ -2,13 +2,20 @@
 Prediction Module
 Handles image preprocessing and model inference
 """
-import torch
+import sys
+import threading
+import time
+from collections import Counter
 import numpy as np
 from PIL import Image
-from typing import Dict, List, Optional
-from .model_loader import get_model, get_model_type
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+from .model_loader import registry
+from .registry import ModelHandle, ModelLoadingError
+from .preprocessing import LetterboxMeta, buffer_pool, letterbox_into, preprocess_batch
+from .metrics import observe_stage
+from . import config
 
-def preprocess_image(image: Image.Image, target_size: tuple = (640, 640)) -> np.ndarray:
+def preprocess_image(image: Image.Image, target_size: tuple = (640, 640)) -> Tuple[np.ndarray, LetterboxMeta]:
     """
     Preprocess image for model input
     
@@ -17,110 +24,318 @@ def preprocess_image(image: Image.Image, target_size: tuple = (640, 640)) -> np.
         target_size: Target size (width, height)
     
     Returns:
-        Preprocessed image array
+        (Preprocessed [1, 3, H, W] float32 array, letterbox metadata for postprocessing)
     """
-    # Resize image
-    image = image.resize(target_size, Image.LANCZOS)
+    img_array = np.empty((1, 3, target_size[1], target_size[0]), dtype=np.float32)
+    meta = letterbox_into(image, img_array[0])
+    return img_array, meta
+
+def _is_tensor(value) -> bool:
+    """torch.Tensor check that never imports torch (nothing can be a tensor unless it is loaded)"""
+    torch = sys.modules.get("torch")
+    return torch is not None and isinstance(value, torch.Tensor)
+
+class InvalidParamsError(ValueError):
+    """Raised when inference parameters do not fit the model (answered with 400)"""
+
+
+class InferenceParams(NamedTuple):
+    """Detection settings of one request (defaults from config)"""
+    conf: float = config.CONFIDENCE_THRESHOLD
+    iou: float = config.IOU_THRESHOLD
+    max_det: int = config.MAX_DETECTIONS
+    classes: Optional[Tuple[str, ...]] = None  # class names to keep, None = all
+    imgsz: Optional[int] = None  # square model input size, None = the model's own
+
+def fixed_input_size(model) -> Optional[Tuple[int, int]]:
+    """Input size (width, height) an ONNX model was exported with, None for dynamic inputs"""
+    if hasattr(model, 'get_inputs'):
+        shape = model.get_inputs()[0].shape
+        if len(shape) == 4 and isinstance(shape[2], int) and isinstance(shape[3], int):
+            return shape[3], shape[2]
+    return None
+
+def get_input_size(model, imgsz: Optional[int] = None) -> Tuple[int, int]:
+    """Model input size (width, height): fixed by ONNX models, otherwise ``imgsz`` or MODEL_INPUT_SIZE"""
+    size = imgsz or config.MODEL_INPUT_SIZE
+    return fixed_input_size(model) or (size, size)
+
+def check_params(handle: ModelHandle, params: InferenceParams):
+    """Reject settings the model cannot honour (raises InvalidParamsError)"""
+    if params.imgsz:
+        fixed = fixed_input_size(handle.model)
+        if fixed is not None and fixed != (params.imgsz, params.imgsz):
+            raise InvalidParamsError(f"Model {handle.name} has a fixed input size of {fixed[0]}x{fixed[1]}")
+    if params.classes and handle.class_names:
+        unknown = set(params.classes) - set(handle.class_names.values())
+        if unknown:
+            raise InvalidParamsError(f"Unknown classes for model {handle.name}: {', '.join(sorted(unknown))}")
+
+def select_detections(
+    result: Dict,
+    conf: Optional[float] = None,
+    classes: Optional[Tuple[str, ...]] = None,
+    max_det: Optional[int] = None,
+) -> Dict:
+    """
+    Keep the best ``max_det`` detections above ``conf`` of the given classes
+    
+    Gives the same detections as predicting with these settings, as long as
+    the result was predicted with a confidence threshold at or below ``conf``
+    (NMS never lets a weaker box suppress a stronger one). Other keys such as
+    model_version are kept.
+    """
+    order = sorted(range(len(result["confidences"])), key=lambda i: -result["confidences"][i])
+    keep = [
+        i for i in order
+        if (conf is None or result["confidences"][i] > conf)
+        and (not classes or result["classes"][i] in classes)
+    ][:max_det]
+    return {
+        **result,
+        "boxes": [result["boxes"][i] for i in keep],
+        "classes": [result["classes"][i] for i in keep],
+        "confidences": [result["confidences"][i] for i in keep],
+    }
+
+# Above this many candidate boxes NMS works row by row instead of on a full IoU matrix
+_NMS_MATRIX_LIMIT = 2048
+
+def xywh_to_xyxy(boxes: np.ndarray) -> np.ndarray:
+    """Convert [x_center, y_center, w, h] boxes to [x1, y1, x2, y2] (vectorized)"""
+    xy = boxes[:, 0:2]
+    half_wh = boxes[:, 2:4] / 2
+    return np.concatenate([xy - half_wh, xy + half_wh], axis=1)
+
+def non_max_suppression(
+    boxes: np.ndarray,
+    scores: np.ndarray,
+    iou_threshold: float,
+    max_output: Optional[int] = None,
+    metric: str = "iou"
+) -> np.ndarray:
+    """
+    Greedy non-max suppression
+    
+    Args:
+        boxes: [N, 4] array of [x1, y1, x2, y2] boxes
+        scores: [N] array of confidences
+        iou_threshold: Boxes overlapping a better box by more than this are dropped
+        max_output: Stop once this many boxes are kept
+        metric: "iou" (intersection over union) or "ios" (intersection over the
+            smaller box, which also catches partial boxes cut at tile borders)
+
+    Returns:
+        Indices of the kept boxes, best first
+    """
+    order = np.argsort(-scores, kind='stable')
+    boxes = boxes[order]
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    
+    if len(order) <= _NMS_MATRIX_LIMIT:
+        # Small inputs: compute the whole IoU matrix at once, then only walk a boolean mask
+        inter_w = np.clip(np.minimum(x2[:, None], x2[None, :]) - np.maximum(x1[:, None], x1[None, :]), 0, None)
+        inter_h = np.clip(np.minimum(y2[:, None], y2[None, :]) - np.maximum(y1[:, None], y1[None, :]), 0, None)
+        inter = inter_w * inter_h
+        if metric == "ios":
+            denominator = np.minimum(areas[:, None], areas[None, :])
+        else:
+            denominator = areas[:, None] + areas[None, :] - inter
+        overlaps = inter / (denominator + 1e-9) > iou_threshold
+        
+        suppressed = np.zeros(len(order), dtype=bool)
+        keep = []
+        for i in range(len(order)):
+            if suppressed[i]:
+                continue
+            keep.append(i)
+            if max_output is not None and len(keep) >= max_output:
+                break
+            suppressed |= overlaps[i]
+        return order[np.asarray(keep, dtype=np.int64)]
+    
+    # Large inputs: IoU of the best remaining box against all others, one row at a time
+    remaining = np.arange(len(order))
+    keep = []
+    while remaining.size > 0 and (max_output is None or len(keep) < max_output):
+        best = remaining[0]
+        keep.append(best)
+        rest = remaining[1:]
+        
+        inter_w = np.clip(np.minimum(x2[best], x2[rest]) - np.maximum(x1[best], x1[rest]), 0, None)
+        inter_h = np.clip(np.minimum(y2[best], y2[rest]) - np.maximum(y1[best], y1[rest]), 0, None)
+        inter = inter_w * inter_h
+        if metric == "ios":
+            denominator = np.minimum(areas[best], areas[rest])
+        else:
+            denominator = areas[best] + areas[rest] - inter
+        iou = inter / (denominator + 1e-9)
+        
+        remaining = rest[iou <= iou_threshold]
+    
+    return order[np.asarray(keep, dtype=np.int64)]
+
+def batched_nms(
+    boxes: np.ndarray,
+    scores: np.ndarray,
+    class_ids: np.ndarray,
+    iou_threshold: float,
+    max_output: Optional[int] = None,
+    metric: str = "iou"
+) -> np.ndarray:
+    """
+    Per-class non-max suppression
     
-    # Convert to numpy array
-    img_array = np.array(image)
+    Each class is suppressed independently (boxes of different classes never
+    suppress each other); the survivors are merged best first.
+    """
+    if boxes.shape[0] == 0:
+        return np.zeros(0, dtype=np.int64)
+    keep = []
+    for cls_id in np.unique(class_ids):
+        members = np.flatnonzero(class_ids == cls_id)
+        keep.append(members[non_max_suppression(boxes[members], scores[members], iou_threshold, max_output, metric)])
+    keep = np.concatenate(keep)
+    keep = keep[np.argsort(-scores[keep], kind='stable')]
+    return keep[:max_output] if max_output is not None else keep
+
+def decode_raw_output(predictions: np.ndarray, confidence_threshold: float):
+    """
+    Decode a raw detection head output for a single image
     
-    # Normalize to [0, 1]
-    img_array = img_array.astype(np.float32) / 255.0
+    Supported layouts:
+        - YOLOv8 head: [4 + num_classes, num_anchors] (e.g. 7 x 8400), boxes as xywh
+        - [num_detections, 6] rows of [x, y, w, h, conf, class]
+        - YOLOv5 head: [num_anchors, 5 + num_classes] rows of [x, y, w, h, objectness, class scores...]
     
-    # Convert to CHW format (if needed)
-    if len(img_array.shape) == 3:
-        img_array = np.transpose(img_array, (2, 0, 1))
+    Returns:
+        (boxes xyxy [N, 4], scores [N], class_ids [N]) above the confidence threshold
+    """
+    empty = (np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, np.int64))
+    if predictions.ndim == 3 and predictions.shape[0] == 1:
+        predictions = predictions[0]
+    if predictions.ndim != 2 or predictions.shape[1] < 6:
+        return empty
     
-    # Add batch dimension
-    img_array = np.expand_dims(img_array, axis=0)
+    if 5 <= predictions.shape[0] < predictions.shape[1] and predictions.shape[1] > 6:
+        # YOLOv8: channels first, class scores without objectness
+        class_scores = predictions[4:]
+        class_ids = class_scores.argmax(axis=0)
+        scores = class_scores.max(axis=0)
+        mask = scores > confidence_threshold
+        boxes = predictions[:4, mask].T
+    elif predictions.shape[1] == 6:
+        scores = predictions[:, 4]
+        mask = scores > confidence_threshold
+        class_ids = predictions[:, 5].astype(np.int64)
+        boxes = predictions[mask, :4]
+    else:
+        # YOLOv5: objectness times best class score
+        class_scores = predictions[:, 5:]
+        class_ids = class_scores.argmax(axis=1)
+        scores = predictions[:, 4] * class_scores.max(axis=1)
+        mask = scores > confidence_threshold
+        boxes = predictions[mask, :4]
     
-    return img_array
+    return xywh_to_xyxy(boxes), scores[mask], class_ids[mask].astype(np.int64)
 
 def postprocess_predictions(
     predictions: any,
     original_size: tuple,
     target_size: tuple = (640, 640),
-    confidence_threshold: float = 0.5
+    confidence_threshold: float = config.CONFIDENCE_THRESHOLD,
+    iou_threshold: float = config.IOU_THRESHOLD,
+    max_detections: int = config.MAX_DETECTIONS,
+    letterbox: Optional[tuple] = None,
+    class_names: Optional[Dict[int, str]] = None
 ) -> Dict[str, List]:
     """
     Postprocess model predictions to extract bounding boxes and classes
     
+    Everything is vectorized with NumPy: confidence filtering, box format
+    conversion, rescaling to the original image and per-class NMS. Defaults
+    match the ultralytics predictor (conf 0.25, IoU 0.7, 300 detections).
+    
     Args:
-        predictions: Raw model predictions
+        predictions: Raw model predictions for one image
         original_size: Original image size (width, height)
         target_size: Model input size (width, height)
         confidence_threshold: Minimum confidence for detections
+        iou_threshold: IoU above which overlapping boxes of the same class are suppressed
+        max_detections: Maximum number of detections returned
+        letterbox: (scale, pad_x, pad_y) used to letterbox the input; when None
+            the input is assumed to be stretched to target_size
+        class_names: Mapping of class id to name
     
     Returns:
         Dictionary with boxes, classes, and confidences
     """
-    model = get_model()
+    # Supported formats:
+    # 1. Faster R-CNN style: dict with 'boxes' [x1, y1, x2, y2], 'labels', 'scores'
+    # 2. Raw detection head arrays (see decode_raw_output)
+    if _is_tensor(predictions):
+        predictions = predictions.cpu().numpy()
+    
+    if isinstance(predictions, dict) and 'boxes' in predictions:
+        # Handle dictionary outputs (common in PyTorch detection models)
+        def _to_numpy(value):
+            return value.cpu().numpy() if _is_tensor(value) else np.asarray(value)
+        boxes = _to_numpy(predictions['boxes']).reshape(-1, 4).astype(np.float32)
+        scores = _to_numpy(predictions.get('scores', np.zeros(len(boxes)))).astype(np.float32)
+        class_ids = _to_numpy(predictions.get('labels', np.zeros(len(boxes)))).astype(np.int64)
+        mask = scores > confidence_threshold
+        boxes, scores, class_ids = boxes[mask], scores[mask], class_ids[mask]
+    elif isinstance(predictions, np.ndarray):
+        boxes, scores, class_ids = decode_raw_output(predictions, confidence_threshold)
+    else:
+        return {"boxes": [], "classes": [], "confidences": []}
     
-    if model is None:
-        raise ValueError("Model not loaded. Call load_model() first.")
+    # Per-class NMS, best detections first
+    keep = batched_nms(boxes, scores, class_ids, iou_threshold, max_detections)
+    boxes, scores, class_ids = boxes[keep], scores[keep], class_ids[keep]
     
-    # This is a template - you need to adapt based on your model's output format
-    # Common formats:
-    # 1. YOLO: [batch, num_detections, 6] where 6 = [x, y, w, h, conf, class]
-    # 2. Faster R-CNN: dict with 'boxes', 'labels', 'scores'
-    # 3. Custom: depends on your model
+    # Map boxes back to the original image
+    boxes = boxes.astype(np.float32, copy=True)
+    if letterbox is not None:
+        scale, pad_x, pad_y = letterbox
+        boxes -= np.array([pad_x, pad_y, pad_x, pad_y], dtype=np.float32)
+        boxes /= scale
+    else:
+        scale_x = original_size[0] / target_size[0]
+        scale_y = original_size[1] / target_size[1]
+        boxes *= np.array([scale_x, scale_y, scale_x, scale_y], dtype=np.float32)
+    np.clip(boxes[:, 0::2], 0, original_size[0], out=boxes[:, 0::2])
+    np.clip(boxes[:, 1::2], 0, original_size[1], out=boxes[:, 1::2])
     
+    class_names = class_names or {}
+    return {
+        "boxes": boxes.tolist(),
+        "classes": [class_names.get(int(cls_id), f"weed_class_{int(cls_id)}") for cls_id in class_ids],
+        "confidences": scores.astype(float).tolist()
+    }
+
+def _yolo_results_to_dict(result) -> Dict[str, List]:
+    """Convert a single ultralytics Results object to the API prediction format"""
     boxes = []
     classes = []
     confidences = []
     
-    # Scale factors for converting back to original image size
-    scale_x = original_size[0] / target_size[0]
-    scale_y = original_size[1] / target_size[1]
+    # Get class names from model
+    class_names = result.names if hasattr(result, 'names') else {}
     
-    # Example for PyTorch models (adjust based on your model)
-    if isinstance(predictions, torch.Tensor):
-        predictions = predictions.cpu().numpy()
-    
-    if isinstance(predictions, dict):
-        # Handle dictionary outputs (common in PyTorch detection models)
-        if 'boxes' in predictions:
-            pred_boxes = predictions['boxes']
-            pred_scores = predictions.get('scores', [])
-            pred_labels = predictions.get('labels', [])
-            
-            for box, score, label in zip(pred_boxes, pred_scores, pred_labels):
-                if score >= confidence_threshold:
-                    # Convert box format [x1, y1, x2, y2] and scale
-                    x1, y1, x2, y2 = box[:4]
-                    x1 *= scale_x
-                    y1 *= scale_y
-                    x2 *= scale_x
-                    y2 *= scale_y
-                    
-                    boxes.append([float(x1), float(y1), float(x2), float(y2)])
-                    confidences.append(float(score))
-                    classes.append(f"weed_class_{int(label)}")  # Update with your class names
-    
-    elif isinstance(predictions, np.ndarray):
-        # Handle numpy array outputs (e.g., YOLO format)
-        # Shape: [num_detections, 6] where 6 = [x, y, w, h, conf, class]
-        if len(predictions.shape) == 2 and predictions.shape[1] >= 6:
-            for pred in predictions:
-                conf = pred[4]
-                if conf >= confidence_threshold:
-                    x, y, w, h = pred[0:4]
-                    # Convert center+wh to x1y1x2y2
-                    x1 = (x - w/2) * scale_x
-                    y1 = (y - h/2) * scale_y
-                    x2 = (x + w/2) * scale_x
-                    y2 = (y + h/2) * scale_y
-                    
-                    boxes.append([float(x1), float(y1), float(x2), float(y2)])
-                    confidences.append(float(conf))
-                    classes.append(f"weed_class_{int(pred[5])}")  # Update with your class names
-    
-    # TODO: Add your specific model's postprocessing logic here
-    # You need to know:
-    # 1. What format does your model output?
-    # 2. What are your class names?
-    # 3. How are bounding boxes formatted?
+    # Extract boxes, confidences, and classes
+    if result.boxes is not None and len(result.boxes) > 0:
+        boxes_data = result.boxes.xyxy.cpu().numpy()  # [x1, y1, x2, y2]
+        confidences_data = result.boxes.conf.cpu().numpy()
+        classes_data = result.boxes.cls.cpu().numpy().astype(int)
+        
+        for box, conf, cls_id in zip(boxes_data, confidences_data, classes_data):
+            boxes.append([float(box[0]), float(box[1]), float(box[2]), float(box[3])])
+            confidences.append(float(conf))
+            # Use class name if available, otherwise use class ID
+            class_name = class_names.get(cls_id, f"weed_class_{cls_id}")
+            classes.append(class_name)
     
     return {
         "boxes": boxes,
@@ -128,87 +343,350 @@ def postprocess_predictions(
         "confidences": confidences
     }
 
-def predict_image(image: Image.Image) -> Optional[Dict[str, List]]:
+def _run_model(model, batch: np.ndarray):
+    """Run a raw (non-ultralytics) model on a preprocessed NCHW batch"""
+    # Convert to tensor if using PyTorch (torch is only loaded for PyTorch models)
+    torch = sys.modules.get("torch")
+    if torch is not None and isinstance(model, torch.nn.Module):
+        device = next(model.parameters()).device
+        input_tensor = torch.from_numpy(batch).to(device)
+        
+        # Run inference
+        with torch.no_grad():
+            return model(input_tensor)
+    elif hasattr(model, 'run'):  # ONNX model
+        model_input = model.get_inputs()[0]
+        # Models exported with a static batch of 1 have to be fed image by image
+        if model_input.shape and model_input.shape[0] == 1 and batch.shape[0] > 1:
+            outputs = [model.run(None, {model_input.name: batch[i:i + 1]})[0] for i in range(batch.shape[0])]
+            return np.concatenate(outputs, axis=0)
+        return model.run(None, {model_input.name: batch})[0]
+    else:
+        # TensorFlow or other
+        return model.predict(batch)
+
+def _split_batch_output(predictions: any, batch_size: int) -> List[any]:
+    """Split batched raw model output into one entry per image"""
+    if isinstance(predictions, (list, tuple)):
+        # torchvision detection models return one dict per image; other tuples
+        # (e.g. YOLOv5's (inference_out, train_out)) carry the batch in [0]
+        if len(predictions) == batch_size and all(isinstance(p, dict) for p in predictions):
+            return list(predictions)
+        predictions = predictions[0]
+    if _is_tensor(predictions):
+        predictions = predictions.cpu().numpy()
+    if isinstance(predictions, np.ndarray) and predictions.ndim >= 3:
+        return [predictions[i] for i in range(batch_size)]
+    # Unbatched output (only valid for a single image)
+    return [predictions]
+
+def predict_batch(
+    images: List[Image.Image],
+    model: Optional[str] = None,
+    model_version: Optional[str] = None,
+    params: Optional[InferenceParams] = None,
+) -> List[Optional[Dict[str, List]]]:
     """
-    Main prediction function
+    Run one batched forward pass over several images
     
     Args:
-        image: PIL Image to predict on
+        images: List of RGB PIL Images
+        model: Registry name of the model (default model when None)
+        model_version: Exact model version to use instead
+        params: Detection settings (default: from config)
     
     Returns:
-        Dictionary with predictions or None if error
+        List with one prediction dictionary per image (None for images that
+        failed); each carries the model_version that produced it
+    
+    Raises:
+        ModelNotFoundError: if the requested model or version is not served
+        InvalidParamsError: if ``params`` do not fit the model
     """
+    if not images:
+        return []
+    if not (model or model_version) and registry.get() is None:
+        print("Error in batch prediction: Model not loaded")
+        return [None] * len(images)
+    with registry.acquire(model, model_version) as handle:
+        if params is not None:
+            check_params(handle, params)
+        results = predict_with_model(handle, images, params)
+    for result in results:
+        if result is not None:
+            result["model_version"] = handle.version
+    return results
+
+def predict_with_model(
+    handle: ModelHandle,
+    images: List[Image.Image],
+    params: Optional[InferenceParams] = None,
+) -> List[Optional[Dict[str, List]]]:
+    """
+    Run one batched forward pass on a specific model version
+    
+    Args:
+        handle: Model from the registry (held by the caller)
+        images: List of RGB PIL Images
+        params: Detection settings (default: from config)
+    
+    Returns:
+        List with one prediction dictionary per image (None for images that failed)
+    """
+    if not images:
+        return []
+    params = params or InferenceParams()
+    # A class filter is applied after NMS, so NMS keeps extra boxes for it to choose from
+    max_det = config.MAX_DETECTIONS_LIMIT if params.classes else params.max_det
+    
     try:
-        model = get_model()
-        model_type = get_model_type()
-        
-        if model is None:
-            raise ValueError("Model not loaded")
-        
-        original_size = image.size  # (width, height)
+        model = handle.model
+        model_type = handle.model_type
         
         # Handle YOLOv8 models
         if model_type == 'yolo':
-            # YOLOv8 models handle preprocessing internally
-            results = model.predict(image, conf=0.25, verbose=False)
-            
-            boxes = []
-            classes = []
-            confidences = []
-            
-            # YOLOv8 returns a list of Results objects
-            if len(results) > 0:
-                result = results[0]
-                
-                # Get class names from model
-                class_names = result.names if hasattr(result, 'names') else {}
-                
-                # Extract boxes, confidences, and classes
-                if result.boxes is not None and len(result.boxes) > 0:
-                    boxes_data = result.boxes.xyxy.cpu().numpy()  # [x1, y1, x2, y2]
-                    confidences_data = result.boxes.conf.cpu().numpy()
-                    classes_data = result.boxes.cls.cpu().numpy().astype(int)
-                    
-                    for box, conf, cls_id in zip(boxes_data, confidences_data, classes_data):
-                        boxes.append([float(box[0]), float(box[1]), float(box[2]), float(box[3])])
-                        confidences.append(float(conf))
-                        # Use class name if available, otherwise use class ID
-                        class_name = class_names.get(cls_id, f"weed_class_{cls_id}")
-                        classes.append(class_name)
-            
-            return {
-                "boxes": boxes,
-                "classes": classes,
-                "confidences": confidences
-            }
+            # YOLOv8 models handle preprocessing internally and accept a list of images
+            start = time.perf_counter()
+            options = {"imgsz": params.imgsz} if params.imgsz else {}
+            results = model.predict(
+                images,
+                conf=params.conf,
+                iou=params.iou,
+                max_det=max_det,
+                verbose=False,
+                **options
+            )
+            observe_stage("inference", time.perf_counter() - start)
+            results = [_yolo_results_to_dict(result) for result in results]
+            if params.classes:
+                results = [select_detections(result, classes=params.classes, max_det=params.max_det) for result in results]
+            return results
         
         # Handle other model types (PyTorch, TensorFlow, ONNX)
-        # Preprocess image
-        processed_image = preprocess_image(image)
+        # Images are letterboxed straight into a pooled input buffer. Per-request
+        # ?imgsz= sizes are allocated per call, so varying them cannot grow the pool
+        target_size = get_input_size(model, params.imgsz)
+        start = time.perf_counter()
+        batch, metas = preprocess_batch(images, target_size, pooled=target_size == get_input_size(model))
+        observe_stage("preprocess", time.perf_counter() - start)
+        try:
+            start = time.perf_counter()
+            predictions = _split_batch_output(_run_model(model, batch), len(images))
+            observe_stage("inference", time.perf_counter() - start)
+        finally:
+            buffer_pool.release(batch)
         
-        # Convert to tensor if using PyTorch
-        if isinstance(model, torch.nn.Module):
-            device = next(model.parameters()).device
-            input_tensor = torch.from_numpy(processed_image).to(device)
-            
-            # Run inference
-            with torch.no_grad():
-                predictions = model(input_tensor)
-        elif hasattr(model, 'run'):  # ONNX model
-            input_name = model.get_inputs()[0].name
-            predictions = model.run(None, {input_name: processed_image})[0]
-        else:
-            # TensorFlow or other
-            predictions = model.predict(processed_image)
+        if len(predictions) != len(images):
+            raise ValueError(
+                f"Model returned {len(predictions)} outputs for a batch of {len(images)} images"
+            )
         
         # Postprocess predictions
-        results = postprocess_predictions(predictions, original_size)
-        
+        start = time.perf_counter()
+        results = [
+            postprocess_predictions(
+                prediction,
+                meta.original_size,
+                target_size=target_size,
+                confidence_threshold=params.conf,
+                iou_threshold=params.iou,
+                max_detections=max_det,
+                letterbox=(meta.scale, meta.pad_x, meta.pad_y),
+                class_names=handle.class_names
+            )
+            for prediction, meta in zip(predictions, metas)
+        ]
+        if params.classes:
+            results = [select_detections(result, classes=params.classes, max_det=params.max_det) for result in results]
+        observe_stage("postprocess", time.perf_counter() - start)
         return results
     
     except Exception as e:
-        print(f"Error in prediction: {str(e)}")
+        print(f"Error in batch prediction: {str(e)}")
         import traceback
         traceback.print_exc()
-        return None
+        return [None] * len(images)
+
+def predict_image(image: Image.Image) -> Optional[Dict[str, List]]:
+    """
+    Main prediction function
+    
+    Args:
+        image: PIL Image to predict on
+    
+    Returns:
+        Dictionary with predictions or None if error
+    """
+    return predict_batch([image])[0]
+
+class CascadeStats:
+    """Thread-safe counts of cascade outcomes: answered by the fast model, or escalated and why"""
+    
+    REASONS = ("uncertain", "hard", "failed")
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+    
+    def add(self, outcome: str, count: int = 1):
+        with self._lock:
+            self._counts[outcome] += count
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            counts = dict(self._counts)
+        images = sum(counts.values())
+        escalated = sum(counts.get(reason, 0) for reason in self.REASONS)
+        return {
+            "images": images,
+            "fast": counts.get("fast", 0),
+            "escalated": {reason: counts.get(reason, 0) for reason in self.REASONS},
+            "escalation_rate": round(escalated / images, 4) if images else 0.0,
+        }
+
+cascade_stats = CascadeStats()
+
+def count_uncertain(result: Dict, low: float, high: float) -> int:
+    """Detections whose confidence lies in the uncertain band [low, high)"""
+    return sum(1 for confidence in result["confidences"] if low <= confidence < high)
 
+def predict_cascade(
+    images: List[Image.Image],
+    predict_fn: Callable[..., List[Optional[Dict]]] = None,
+    hard: bool = False,
+    params: Optional[InferenceParams] = None,
+) -> List[Optional[Dict[str, List]]]:
+    """
+    Predict with the fast model and re-run only uncertain images on the accurate model
+    
+    The fast model (CASCADE_FAST_MODEL) runs with its confidence threshold
+    lowered to CASCADE_UNCERTAIN_LOW, so weak candidates it would otherwise
+    drop are visible. An image is escalated to CASCADE_ACCURATE_MODEL (all
+    escalated images of the batch in one forward pass) when at least
+    CASCADE_MIN_UNCERTAIN detections fall in [CASCADE_UNCERTAIN_LOW,
+    CASCADE_UNCERTAIN_HIGH), or when the fast model failed on it. Otherwise
+    the fast result is returned, filtered to the requested confidence, i.e.
+    exactly what the fast model alone would have answered.
+    
+    Args:
+        images: List of RGB PIL Images
+        predict_fn: Batched prediction function taking (images, model=...,
+            params=...), e.g. predict_batch or the model host client
+        hard: The caller flagged these images as hard; they go straight to
+            the accurate model
+        params: Detection settings (default: from config)
+    
+    Returns:
+        One prediction dictionary per image (None for failures), with the
+        model_version that produced it and ``escalated``
+    """
+    if not images:
+        return []
+    predict_fn = predict_fn or predict_batch
+    params = params or InferenceParams()
+    accurate_model = config.CASCADE_ACCURATE_MODEL
+    
+    if hard:
+        results = predict_fn(images, model=accurate_model, params=params)
+        cascade_stats.add("hard", len(images))
+        return [dict(result, escalated=True) if result is not None else None for result in results]
+    
+    low, high = config.CASCADE_UNCERTAIN_LOW, config.CASCADE_UNCERTAIN_HIGH
+    fast_params = params._replace(conf=min(low, params.conf))
+    fast_results = predict_fn(images, model=config.CASCADE_FAST_MODEL, params=fast_params)
+    results: List[Optional[Dict]] = [None] * len(images)
+    escalate = []
+    for i, result in enumerate(fast_results):
+        if result is None:
+            escalate.append(i)
+            cascade_stats.add("failed")
+        elif count_uncertain(result, low, high) >= config.CASCADE_MIN_UNCERTAIN:
+            escalate.append(i)
+            cascade_stats.add("uncertain")
+        else:
+            results[i] = dict(select_detections(result, conf=params.conf), escalated=False)
+            cascade_stats.add("fast")
+    
+    if escalate:
+        accurate_results = predict_fn([images[i] for i in escalate], model=accurate_model, params=params)
+        for i, result in zip(escalate, accurate_results):
+            results[i] = dict(result, escalated=True) if result is not None else None
+    return results
+
+def warm_up(
+    batch_sizes: Optional[List[int]] = None,
+    iterations: int = 2,
+    handle: Optional[ModelHandle] = None,
+) -> Dict[int, float]:
+    """
+    Run throwaway forward passes so the first real requests do not pay for
+    lazy initialization (ultralytics setup, kernel selection, allocator growth)
+    
+    Args:
+        batch_sizes: Batch sizes to exercise (each shape is warmed separately);
+            defaults to WARMUP_BATCH_SIZES, or 1 and the sizes the batcher and
+            tiling actually run
+        iterations: Forward passes per batch size
+        handle: Model to warm up (default: the default model); a model that is
+            not serving yet can be warmed up before the registry swaps it in
+    
+    Returns:
+        Seconds spent per batch size
+    
+    Raises:
+        RuntimeError: if a warm-up batch fails, i.e. the model cannot serve
+    """
+    if handle is None:
+        handle = registry.get()
+    if handle is None:
+        raise RuntimeError("Model not loaded")
+    if not batch_sizes:
+        batch_sizes = config.WARMUP_BATCH_SIZES or [1, config.BATCH_MAX_SIZE]
+        if not config.WARMUP_BATCH_SIZES and config.TILING_MODE != "off":
+            batch_sizes.append(config.TILE_BATCH_SIZE)
+    width, height = get_input_size(handle.model)
+    timings = {}
+    for batch_size in sorted(set(b for b in batch_sizes if b > 0)):
+        # Mid-grey, like the letterbox padding: realistic input without any file
+        images = [Image.new("RGB", (width, height), (114, 114, 114)) for _ in range(batch_size)]
+        start = time.perf_counter()
+        for _ in range(max(1, iterations)):
+            if any(result is None for result in predict_with_model(handle, images)):
+                raise RuntimeError(f"Warm-up inference failed at batch size {batch_size}")
+        timings[batch_size] = round(time.perf_counter() - start, 3)
+    return timings
+
+def load_serving_model(name: str, path: Optional[str] = None, default: bool = False) -> ModelHandle:
+    """
+    Load a model into the registry, warming it up before it takes traffic
+    
+    The currently served version of ``name`` (if any) keeps answering requests
+    until the new one is loaded and warmed up; if either step fails nothing
+    is swapped and the exception propagates.
+    """
+    def prepare(handle: ModelHandle):
+        if config.WARMUP_ITERATIONS > 0:
+            timings = warm_up(iterations=config.WARMUP_ITERATIONS, handle=handle)
+            print(f"Model {name} ({handle.version}) warmed up: {timings}")
+    
+    return registry.load(name, path, default=default, prepare=prepare)
+
+def start_model_reload(name: str, path: str) -> threading.Thread:
+    """
+    Load and warm up a new version of ``name`` in a background thread
+    
+    Raises:
+        ModelLoadingError: if ``name`` is already being loaded
+    """
+    if registry.is_loading(name):
+        raise ModelLoadingError(f"Model {name} is already being loaded")
+    
+    def reload():
+        try:
+            load_serving_model(name, path, default=name == config.DEFAULT_MODEL)
+        except Exception as e:
+            print(f"❌ Reloading model {name} from {path} failed: {str(e)}")
+    
+    thread = threading.Thread(target=reload, name=f"model-reload-{name}", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,160 @@
+"""
+Preprocessing Module
+Letterboxes images straight into reusable NCHW float32 input buffers
+"""
+import threading
+from typing import List, NamedTuple, Tuple
+
+import numpy as np
+from PIL import Image
+
+from . import config
+
+# Grey padding used by YOLOv8 letterboxing (114 / 255)
+PAD_VALUE = 114.0 / 255.0
+
+
+class LetterboxMeta(NamedTuple):
+    """How an image was mapped into the model input (needed to map boxes back)"""
+    scale: float
+    pad_x: int
+    pad_y: int
+    original_size: Tuple[int, int]  # (width, height)
+
+
+def letterbox_params(original_size: Tuple[int, int], target_size: Tuple[int, int]) -> Tuple[Tuple[int, int], LetterboxMeta]:
+    """
+    Compute the resized size and padding for letterboxing
+
+    Follows ultralytics' LetterBox so boxes decoded from raw model output map
+    back to the same coordinates as the ultralytics predictor.
+
+    Returns:
+        ((resized width, resized height), LetterboxMeta)
+    """
+    width, height = original_size
+    target_w, target_h = target_size
+    scale = min(target_w / width, target_h / height)
+    new_w, new_h = int(round(width * scale)), int(round(height * scale))
+    pad_x = int(round((target_w - new_w) / 2 - 0.1))
+    pad_y = int(round((target_h - new_h) / 2 - 0.1))
+    return (new_w, new_h), LetterboxMeta(scale, pad_x, pad_y, (width, height))
+
+
+def letterbox_into(image: Image.Image, out: np.ndarray) -> LetterboxMeta:
+    """
+    Resize an RGB image with preserved aspect ratio and write it, normalized
+    to [0, 1] and padded, into ``out`` ([3, H, W] float32) in a single pass
+
+    Args:
+        image: RGB PIL Image
+        out: Destination CHW float32 array (e.g. one slot of a pooled batch buffer)
+
+    Returns:
+        LetterboxMeta for postprocessing
+    """
+    target_h, target_w = out.shape[1], out.shape[2]
+    (new_w, new_h), meta = letterbox_params(image.size, (target_w, target_h))
+
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    if image.size != (new_w, new_h):
+        # Bilinear with a reducing gap: much faster than LANCZOS and close to cv2.INTER_LINEAR
+        image = image.resize((new_w, new_h), Image.BILINEAR, reducing_gap=3.0)
+
+    # Only the padding borders need filling, the image area is overwritten below
+    top, left = meta.pad_y, meta.pad_x
+    bottom, right = top + new_h, left + new_w
+    out[:, :top, :] = PAD_VALUE
+    out[:, bottom:, :] = PAD_VALUE
+    out[:, top:bottom, :left] = PAD_VALUE
+    out[:, top:bottom, right:] = PAD_VALUE
+
+    # HWC uint8 -> CHW float32 [0, 1] without intermediate float copies
+    pixels = np.asarray(image, dtype=np.uint8)
+    np.multiply(pixels.transpose(2, 0, 1), np.float32(1.0 / 255.0), out=out[:, top:bottom, left:right], casting='unsafe')
+    return meta
+
+
+class BufferPool:
+    """
+    Pool of preallocated [max_batch, 3, H, W] float32 input buffers
+
+    Buffers are reused across requests instead of allocating new arrays for
+    every image. When torch with CUDA is available and pinning is enabled the
+    buffers live in page-locked memory for faster host-to-device copies.
+    """
+
+    def __init__(self, max_batch_size: int, max_buffers: int, pin_memory: bool = False):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_buffers = max(1, max_buffers)
+        self.pin_memory = pin_memory
+        self._free = {}  # (height, width) -> list of buffers
+        self._leased = {}  # id(view handed out) -> full pooled buffer
+        self._lock = threading.Lock()
+
+    def _allocate(self, shape: Tuple[int, ...]) -> np.ndarray:
+        if self.pin_memory:
+            try:
+                import torch
+                if torch.cuda.is_available():
+                    return torch.empty(shape, dtype=torch.float32).pin_memory().numpy()
+            except ImportError:
+                pass
+        return np.empty(shape, dtype=np.float32)
+
+    def acquire(self, batch_size: int, target_size: Tuple[int, int], pooled: bool = True) -> np.ndarray:
+        """
+        Get a [batch_size, 3, H, W] buffer for the given (width, height)
+
+        Batches larger than the pool's batch size, and sizes that should not
+        be kept around (``pooled=False``), get a one-off allocation of just
+        ``batch_size`` images.
+        """
+        width, height = target_size
+        if not pooled or batch_size > self.max_batch_size:
+            return self._allocate((batch_size, 3, height, width))
+        with self._lock:
+            free = self._free.get((height, width))
+            buffer = free.pop() if free else None
+        if buffer is None:
+            buffer = self._allocate((self.max_batch_size, 3, height, width))
+        view = buffer[:batch_size]
+        with self._lock:
+            self._leased[id(view)] = buffer
+        return view
+
+    def release(self, view: np.ndarray):
+        """Return a buffer obtained from acquire()"""
+        with self._lock:
+            buffer = self._leased.pop(id(view), None)
+            if buffer is None:
+                return  # one-off allocation
+            free = self._free.setdefault((buffer.shape[2], buffer.shape[3]), [])
+            if len(free) < self.max_buffers:
+                free.append(buffer)
+
+
+# Shared by all inference threads of this process
+buffer_pool = BufferPool(
+    max_batch_size=config.BATCH_MAX_SIZE,
+    max_buffers=config.INFERENCE_WORKERS + 1,
+    pin_memory=config.PREPROCESS_PIN_MEMORY,
+)
+
+
+def preprocess_batch(
+    images: List[Image.Image],
+    target_size: Tuple[int, int],
+    pooled: bool = True,
+) -> Tuple[np.ndarray, List[LetterboxMeta]]:
+    """
+    Letterbox several images into one pooled NCHW buffer
+
+    The caller must hand the buffer back with ``buffer_pool.release`` once the
+    model has consumed it. Only the serving input size should be pooled:
+    every pooled size keeps up to max_buffers full-batch buffers alive.
+    """
+    batch = buffer_pool.acquire(len(images), target_size, pooled)
+    metas = [letterbox_into(image, batch[i]) for i, image in enumerate(images)]
+    return batch, metas
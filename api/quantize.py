@@ -0,0 +1,376 @@
+"""
+INT8 Quantization
+Builds a statically quantized INT8 ONNX model and compares it against FP32
+
+Usage:
+    # Calibrate on field images and write models/<name>_int8.onnx
+    python -m api.quantize build --model models/yolov8n_best_model.onnx --calibration-dir data/calibration
+
+    # Latency, throughput and accuracy of INT8 vs FP32 on a holdout set
+    python -m api.quantize report --fp32 models/yolov8n_best_model.onnx \\
+        --int8 models/yolov8n_best_model_int8.onnx --images data/holdout [--labels data/holdout/labels]
+
+Serve the INT8 model with MODEL_PRECISION=int8.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+
+from .archives import IMAGE_EXTENSIONS
+from .predictor import postprocess_predictions, preprocess_image
+
+# Confidence cut for the mAP pass: the full precision-recall curve needs the
+# low-scoring detections the serving threshold would drop
+MAP_CONFIDENCE_THRESHOLD = 0.001
+
+
+def list_images(folder: str, limit: Optional[int] = None) -> List[str]:
+    """Image files in a folder (recursive), sorted for reproducibility"""
+    paths = sorted(
+        path for path in glob.glob(os.path.join(folder, "**", "*"), recursive=True)
+        if path.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    return paths[:limit] if limit else paths
+
+
+def int8_path_for(model_path: str) -> str:
+    """models/x.onnx -> models/x_int8.onnx"""
+    stem, _ = os.path.splitext(model_path)
+    return stem + "_int8.onnx"
+
+
+def _input_meta(model_path: str):
+    import onnxruntime as ort
+    session = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+    model_input = session.get_inputs()[0]
+    height, width = model_input.shape[2], model_input.shape[3]
+    size = (width, height) if isinstance(width, int) and isinstance(height, int) else (640, 640)
+    return model_input.name, size
+
+
+class FolderCalibrationReader:
+    """Feeds letterboxed field images to the onnxruntime calibrator one at a time"""
+
+    def __init__(self, image_paths: List[str], input_name: str, input_size: tuple):
+        self.image_paths = image_paths
+        self.input_name = input_name
+        self.input_size = input_size
+        self._index = 0
+
+    def get_next(self):
+        if self._index >= len(self.image_paths):
+            return None
+        path = self.image_paths[self._index]
+        self._index += 1
+        with Image.open(path) as image:
+            array, _ = preprocess_image(image.convert("RGB"), self.input_size)
+        return {self.input_name: array}
+
+    def rewind(self):
+        self._index = 0
+
+
+def build_int8(
+    model_path: str,
+    calibration_dir: str,
+    output_path: Optional[str] = None,
+    max_images: int = 200,
+    method: str = "minmax",
+    per_channel: bool = True,
+) -> str:
+    """
+    Statically quantize an FP32 ONNX model to INT8 (QDQ format)
+
+    Only Conv and MatMul are quantized; the YOLO decode head (concat, sigmoid,
+    DFL) stays in FP32 because it is cheap and sensitive to quantization error.
+    """
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    methods = {
+        "minmax": CalibrationMethod.MinMax,
+        "entropy": CalibrationMethod.Entropy,
+        "percentile": CalibrationMethod.Percentile,
+    }
+    if method not in methods:
+        raise ValueError(f"Unknown calibration method '{method}' (expected one of: {', '.join(methods)})")
+
+    images = list_images(calibration_dir, max_images)
+    if not images:
+        raise FileNotFoundError(f"No calibration images found in {calibration_dir}")
+
+    output_path = output_path or int8_path_for(model_path)
+    preprocessed_path = os.path.splitext(output_path)[0] + "_prep.onnx"
+    input_name, input_size = _input_meta(model_path)
+
+    print(f"Calibrating on {len(images)} images from {calibration_dir} ({method})")
+    # ONNX shape inference is enough for conv nets; symbolic inference would need sympy
+    quant_pre_process(model_path, preprocessed_path, skip_symbolic_shape=True)
+    try:
+        quantize_static(
+            preprocessed_path,
+            output_path,
+            FolderCalibrationReader(images, input_name, input_size),
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=per_channel,
+            calibrate_method=methods[method],
+            op_types_to_quantize=["Conv", "MatMul"],
+        )
+    finally:
+        if os.path.exists(preprocessed_path):
+            os.remove(preprocessed_path)
+
+    _copy_metadata(model_path, output_path)
+    return output_path
+
+
+def _copy_metadata(source_path: str, target_path: str):
+    """Keep the exporter metadata (class names etc.) on the quantized model"""
+    import onnx
+    source = onnx.load(source_path, load_external_data=False)
+    target = onnx.load(target_path)
+    existing = {prop.key for prop in target.metadata_props}
+    for prop in source.metadata_props:
+        if prop.key not in existing:
+            target.metadata_props.append(prop)
+    onnx.save(target, target_path)
+
+
+def box_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU of [N, 4] and [M, 4] xyxy boxes"""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    inter_w = np.clip(np.minimum(a[:, None, 2], b[None, :, 2]) - np.maximum(a[:, None, 0], b[None, :, 0]), 0, None)
+    inter_h = np.clip(np.minimum(a[:, None, 3], b[None, :, 3]) - np.maximum(a[:, None, 1], b[None, :, 1]), 0, None)
+    inter = inter_w * inter_h
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def mean_average_precision(predictions: List[Dict], ground_truths: List[Dict], iou_threshold: float = 0.5) -> float:
+    """
+    mAP@iou over all classes (all-point interpolated AP, VOC/COCO style)
+
+    Both arguments are lists (one entry per image) of dicts with boxes,
+    classes and (for predictions) confidences.
+    """
+    classes = {c for gt in ground_truths for c in gt["classes"]}
+    if not classes:
+        return float("nan")
+
+    aps = []
+    for cls in sorted(classes):
+        scores, hits = [], []
+        total = 0
+        for pred, gt in zip(predictions, ground_truths):
+            gt_boxes = np.array([b for b, c in zip(gt["boxes"], gt["classes"]) if c == cls], dtype=np.float32).reshape(-1, 4)
+            total += len(gt_boxes)
+            pred_idx = [i for i, c in enumerate(pred["classes"]) if c == cls]
+            pred_idx.sort(key=lambda i: -pred["confidences"][i])
+            pred_boxes = np.array([pred["boxes"][i] for i in pred_idx], dtype=np.float32).reshape(-1, 4)
+            ious = box_iou(pred_boxes, gt_boxes)
+            matched = np.zeros(len(gt_boxes), dtype=bool)
+            for row, i in enumerate(pred_idx):
+                scores.append(pred["confidences"][i])
+                best = int(ious[row].argmax()) if len(gt_boxes) else -1
+                if best >= 0 and ious[row, best] >= iou_threshold and not matched[best]:
+                    matched[best] = True
+                    hits.append(1)
+                else:
+                    hits.append(0)
+        if total == 0:
+            continue
+        order = np.argsort(-np.asarray(scores)) if scores else np.zeros(0, dtype=int)
+        tp = np.cumsum(np.asarray(hits)[order]) if scores else np.zeros(0)
+        fp = np.cumsum(1 - np.asarray(hits)[order]) if scores else np.zeros(0)
+        recall = np.concatenate([[0.0], tp / total, [1.0]])
+        precision = np.concatenate([[1.0], tp / np.maximum(tp + fp, 1e-9), [0.0]])
+        precision = np.maximum.accumulate(precision[::-1])[::-1]
+        aps.append(float(np.sum((recall[1:] - recall[:-1]) * precision[1:])))
+    return float(np.mean(aps)) if aps else float("nan")
+
+
+def box_agreement(candidate: List[Dict], reference: List[Dict], iou_threshold: float = 0.5) -> Dict[str, float]:
+    """Precision/recall/F1 of candidate detections against reference detections (same class, IoU >= threshold)"""
+    matches = n_candidate = n_reference = 0
+    for cand, ref in zip(candidate, reference):
+        n_candidate += len(cand["boxes"])
+        n_reference += len(ref["boxes"])
+        ious = box_iou(np.asarray(cand["boxes"], np.float32).reshape(-1, 4), np.asarray(ref["boxes"], np.float32).reshape(-1, 4))
+        used = set()
+        for i in np.argsort([-c for c in cand["confidences"]]):
+            for j in np.argsort(-ious[i]) if ious.shape[1] else []:
+                if ious[i, j] < iou_threshold:
+                    break
+                if j not in used and cand["classes"][i] == ref["classes"][j]:
+                    used.add(j)
+                    matches += 1
+                    break
+    precision = matches / n_candidate if n_candidate else 1.0
+    recall = matches / n_reference if n_reference else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"precision": precision, "recall": recall, "f1": f1}
+
+
+def load_yolo_labels(label_dir: str, image_path: str, image_size: tuple, class_names: Dict[int, str]) -> Dict:
+    """Read a YOLO-format label file (class cx cy w h, normalized) as absolute xyxy boxes"""
+    label_path = os.path.join(label_dir, os.path.splitext(os.path.basename(image_path))[0] + ".txt")
+    boxes, classes = [], []
+    if os.path.exists(label_path):
+        width, height = image_size
+        with open(label_path) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) < 5:
+                    continue
+                cls_id, cx, cy, w, h = int(parts[0]), *map(float, parts[1:5])
+                boxes.append([(cx - w / 2) * width, (cy - h / 2) * height, (cx + w / 2) * width, (cy + h / 2) * height])
+                classes.append(class_names.get(cls_id, f"weed_class_{cls_id}"))
+    return {"boxes": boxes, "classes": classes}
+
+
+def _evaluate_model(model_path: str, images: List[Image.Image], batch_size: int, repeats: int) -> Dict:
+    """Run one model over the holdout images, measuring latency and throughput"""
+    from .onnx_backend import OnnxModel
+    from .predictor import get_input_size
+
+    model = OnnxModel(model_path)
+    input_name = model.get_inputs()[0].name
+    input_size = get_input_size(model)
+    # Models exported with --static-batch only accept their fixed batch size
+    fixed_batch = model.get_inputs()[0].shape[0]
+    if isinstance(fixed_batch, int):
+        batch_size = fixed_batch
+    prepared = [preprocess_image(image, input_size) for image in images]
+
+    # Single-image latency (includes postprocessing, excludes decode)
+    model.run(None, {input_name: prepared[0][0]})  # warm-up
+    latencies, results, outputs = [], [], []
+    for _ in range(repeats):
+        results, outputs = [], []
+        for (array, meta), image in zip(prepared, images):
+            start = time.perf_counter()
+            output = model.run(None, {input_name: array})[0][0]
+            outputs.append(output)
+            results.append(postprocess_predictions(
+                output, image.size, target_size=input_size,
+                letterbox=(meta.scale, meta.pad_x, meta.pad_y), class_names=model.class_names
+            ))
+            latencies.append((time.perf_counter() - start) * 1000.0)
+
+    # Same raw outputs, kept down to a low confidence for mAP (not timed)
+    map_results = [
+        postprocess_predictions(
+            output, image.size, target_size=input_size, confidence_threshold=MAP_CONFIDENCE_THRESHOLD,
+            letterbox=(meta.scale, meta.pad_x, meta.pad_y), class_names=model.class_names
+        )
+        for output, (_, meta), image in zip(outputs, prepared, images)
+    ]
+
+    # Batched throughput
+    batches = [np.concatenate([a for a, _ in prepared[i:i + batch_size]]) for i in range(0, len(prepared), batch_size)]
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for batch in batches:
+            model.run(None, {input_name: batch})
+    throughput = repeats * len(prepared) / (time.perf_counter() - start)
+
+    return {
+        "model": model_path,
+        "size_mb": round(os.path.getsize(model_path) / 1e6, 2),
+        "latency_ms_p50": float(np.percentile(latencies, 50)),
+        "latency_ms_p95": float(np.percentile(latencies, 95)),
+        "throughput_images_per_s": throughput,
+        "class_names": model.class_names,
+        "results": results,
+        "map_results": map_results,
+    }
+
+
+def report(fp32_path: str, int8_path: str, image_dir: str, label_dir: Optional[str] = None,
+           batch_size: int = 8, repeats: int = 3, max_images: Optional[int] = None) -> Dict:
+    """Compare latency, throughput and accuracy of INT8 against FP32"""
+    paths = list_images(image_dir, max_images)
+    if not paths:
+        raise FileNotFoundError(f"No holdout images found in {image_dir}")
+    images = []
+    for path in paths:
+        with Image.open(path) as image:
+            images.append(image.convert("RGB"))
+
+    fp32 = _evaluate_model(fp32_path, images, batch_size, repeats)
+    int8 = _evaluate_model(int8_path, images, batch_size, repeats)
+
+    summary = {
+        "images": len(images),
+        "fp32": {k: v for k, v in fp32.items() if k not in ("results", "map_results", "class_names")},
+        "int8": {k: v for k, v in int8.items() if k not in ("results", "map_results", "class_names")},
+        "speedup": fp32["latency_ms_p50"] / max(int8["latency_ms_p50"], 1e-9),
+        "throughput_gain": int8["throughput_images_per_s"] / max(fp32["throughput_images_per_s"], 1e-9),
+        # FP32 detections at the serving threshold used as pseudo ground truth:
+        # how much does INT8 deviate?
+        "agreement_vs_fp32": box_agreement(int8["results"], fp32["results"]),
+        "map50_vs_fp32": mean_average_precision(int8["map_results"], fp32["results"]),
+    }
+    if label_dir:
+        truths = [load_yolo_labels(label_dir, path, image.size, fp32["class_names"]) for path, image in zip(paths, images)]
+        summary["fp32"]["map50"] = mean_average_precision(fp32["map_results"], truths)
+        summary["int8"]["map50"] = mean_average_precision(int8["map_results"], truths)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and evaluate INT8 quantized models")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="Statically quantize an FP32 ONNX model")
+    build.add_argument("--model", required=True, help="FP32 .onnx model (from python -m api.export)")
+    build.add_argument("--calibration-dir", required=True, help="Folder of representative field images")
+    build.add_argument("--output", default=None, help="Output path (default: <model>_int8.onnx)")
+    build.add_argument("--max-images", type=int, default=200, help="Calibration images to use")
+    build.add_argument("--method", default="minmax", choices=["minmax", "entropy", "percentile"])
+    build.add_argument("--per-tensor", action="store_true", help="Per-tensor instead of per-channel weights")
+
+    compare = commands.add_parser("report", help="Compare INT8 against FP32 on a holdout set")
+    compare.add_argument("--fp32", required=True, help="FP32 .onnx model")
+    compare.add_argument("--int8", default=None, help="INT8 .onnx model (default: <fp32>_int8.onnx)")
+    compare.add_argument("--images", required=True, help="Folder of holdout images")
+    compare.add_argument("--labels", default=None, help="Folder of YOLO-format labels for ground-truth mAP")
+    compare.add_argument("--batch-size", type=int, default=8)
+    compare.add_argument("--repeats", type=int, default=3)
+    compare.add_argument("--max-images", type=int, default=None)
+    compare.add_argument("--json", default=None, help="Also write the report to this file")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        output = build_int8(
+            args.model, args.calibration_dir, args.output,
+            max_images=args.max_images, method=args.method, per_channel=not args.per_tensor,
+        )
+        print(f"INT8 model written to {output} ({os.path.getsize(output) / 1e6:.1f} MB)")
+        return 0
+
+    summary = report(
+        args.fp32, args.int8 or int8_path_for(args.fp32), args.images, args.labels,
+        batch_size=args.batch_size, repeats=args.repeats, max_images=args.max_images,
+    )
+    print(json.dumps(summary, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""
+Model Registry Module
+Named, versioned models that can be replaced while the API keeps serving
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+
+class ModelNotFoundError(LookupError):
+    """Raised when a request asks for a model name or version that is not served (answered with 404)"""
+
+
+class ModelLoadingError(RuntimeError):
+    """Raised when a model is loaded while a load of the same name is still running (answered with 409)"""
+
+
+class ModelHandle:
+    """
+    One loaded model version
+
+    Work running on the model holds the handle through
+    ``ModelRegistry.acquire``; a handle that was replaced by a newer version is
+    kept until the last of that work finishes (drained) and then released.
+    """
+
+    def __init__(self, name: str, version: str, path: str, model, model_type: str, class_names: Dict[int, str]):
+        self.name = name
+        self.version = version
+        self.path = path
+        self.model = model
+        self.model_type = model_type
+        self.class_names = class_names
+        self.loaded_at = time.time()
+        self.retired = False
+        self.in_flight = 0
+        self.drained = threading.Event()
+
+    def describe(self) -> Dict:
+        return {
+            "name": self.name,
+            "version": self.version,
+            "path": self.path,
+            "type": self.model_type,
+            "loaded_at": self.loaded_at,
+            "in_flight": self.in_flight,
+        }
+
+
+class ModelRegistry:
+    """
+    Thread-safe set of served models, one live version per name
+
+    ``load`` reads the new weights and runs ``prepare`` (warm-up) while the
+    current version keeps serving, then swaps the new version in under the
+    lock. Nothing is swapped if loading or warm-up fails. The replaced version
+    drains: batches that already acquired it finish on it, new ones get the
+    new version.
+    """
+
+    def __init__(self, load_fn: Callable[[str], Dict]):
+        """``load_fn(path)`` returns a dict with model, model_type, class_names, path and version"""
+        self.load_fn = load_fn
+        self._lock = threading.Lock()
+        self._models: Dict[str, ModelHandle] = {}
+        self._default: Optional[str] = None
+        self._retired: List[ModelHandle] = []
+        self._loading: Dict[str, str] = {}  # name -> path being loaded
+        self._failures: Dict[str, Dict] = {}  # name -> last failed load
+        self._swaps = 0
+
+    def load(
+        self,
+        name: str,
+        path: str,
+        default: bool = False,
+        prepare: Optional[Callable[[ModelHandle], None]] = None,
+    ) -> ModelHandle:
+        """
+        Load ``path`` as the new version of ``name`` (blocking; run it in a thread)
+
+        Args:
+            name: Model name requests select it by
+            path: Model file
+            default: Serve it to requests that do not name a model (the first
+                model loaded is the default anyway)
+            prepare: Called with the new handle before it goes live (e.g.
+                warm-up); an exception aborts the swap
+
+        Raises:
+            ModelLoadingError: if ``name`` is already being loaded
+        """
+        with self._lock:
+            if name in self._loading:
+                raise ModelLoadingError(f"Model {name} is already being loaded from {self._loading[name]}")
+            self._loading[name] = path
+        try:
+            loaded = self.load_fn(path)
+            handle = ModelHandle(name, loaded["version"], loaded["path"], loaded["model"], loaded["model_type"], loaded["class_names"])
+            if prepare is not None:
+                prepare(handle)
+        except Exception as e:
+            with self._lock:
+                self._failures[name] = {"path": path, "error": str(e), "at": time.time()}
+            raise
+        else:
+            self._swap(handle, default)
+            return handle
+        finally:
+            with self._lock:
+                self._loading.pop(name, None)
+
+    def _swap(self, handle: ModelHandle, default: bool):
+        with self._lock:
+            old = self._models.get(handle.name)
+            self._models[handle.name] = handle
+            self._failures.pop(handle.name, None)
+            if default or self._default is None:
+                self._default = handle.name
+            self._swaps += 1
+            if old is not None:
+                old.retired = True
+                if old.in_flight:
+                    self._retired.append(old)
+                else:
+                    old.drained.set()
+        if old is not None:
+            print(f"Model {handle.name}: {old.version} -> {handle.version}" + (f" ({old.in_flight} batches draining)" if old.in_flight else ""))
+
+    def resolve(self, name: Optional[str] = None, version: Optional[str] = None) -> ModelHandle:
+        """Live handle by name, by version, or the default model"""
+        with self._lock:
+            return self._resolve(name, version)
+
+    def _resolve(self, name: Optional[str], version: Optional[str]) -> ModelHandle:
+        if version:
+            # A replaced version stays selectable while it drains, so work pinned to it can finish
+            for handle in list(self._models.values()) + self._retired:
+                if handle.version == version and (not name or handle.name == name):
+                    return handle
+            raise ModelNotFoundError(f"Model version {version} is not served")
+        name = name or self._default
+        handle = self._models.get(name) if name else None
+        if handle is None:
+            raise ModelNotFoundError(f"Model {name} is not loaded" if name else "No model loaded")
+        return handle
+
+    @contextmanager
+    def acquire(self, name: Optional[str] = None, version: Optional[str] = None) -> Iterator[ModelHandle]:
+        """Hold a model version for the duration of some work, so a swap cannot free it underneath"""
+        with self._lock:
+            handle = self._resolve(name, version)
+            handle.in_flight += 1
+        try:
+            yield handle
+        finally:
+            with self._lock:
+                handle.in_flight -= 1
+                if handle.retired and not handle.in_flight:
+                    if handle in self._retired:
+                        self._retired.remove(handle)
+                    handle.drained.set()
+
+    def served(self) -> Dict:
+        """Default model, live version and class names per name, and versions still draining"""
+        with self._lock:
+            return {
+                "default": self._default,
+                "models": {name: handle.version for name, handle in self._models.items()},
+                "class_names": {name: sorted(set(handle.class_names.values())) for name, handle in self._models.items()},
+                "draining": [handle.version for handle in self._retired],
+            }
+
+    def get(self, name: Optional[str] = None) -> Optional[ModelHandle]:
+        """Live handle for ``name`` (default model when None), or None"""
+        try:
+            return self.resolve(name)
+        except ModelNotFoundError:
+            return None
+
+    @property
+    def default_name(self) -> Optional[str]:
+        return self._default
+
+    def is_loading(self, name: str) -> bool:
+        with self._lock:
+            return name in self._loading
+
+    def stats(self) -> Dict:
+        """Served models, versions still draining and loads in progress"""
+        with self._lock:
+            return {
+                "default": self._default,
+                "models": [handle.describe() for handle in self._models.values()],
+                "draining": [handle.describe() for handle in self._retired],
+                "loading": dict(self._loading),
+                "failed": dict(self._failures),
+                "swaps": self._swaps,
+            }
@@ -0,0 +1,117 @@
+"""
+Tiling Module
+Sliced (SAHI-style) inference for large images such as drone orthomosaics
+"""
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from .predictor import batched_nms
+
+Window = Tuple[int, int, int, int]  # x1, y1, x2, y2 in image pixels
+
+
+def tile_windows(width: int, height: int, tile_size: int, overlap: float) -> List[Window]:
+    """
+    Overlapping square windows covering the whole image
+
+    Windows step by ``tile_size * (1 - overlap)``; the last row and column are
+    shifted back so they end exactly at the image border instead of being
+    padded. Dimensions smaller than ``tile_size`` get a single window.
+    """
+    def starts(length: int) -> List[int]:
+        if length <= tile_size:
+            return [0]
+        step = max(1, int(tile_size * (1.0 - overlap)))
+        positions = list(range(0, length - tile_size, step))
+        positions.append(length - tile_size)
+        return positions
+
+    tile_w, tile_h = min(tile_size, width), min(tile_size, height)
+    return [(x, y, x + tile_w, y + tile_h) for y in starts(height) for x in starts(width)]
+
+
+def iter_tile_batches(image: Image.Image, windows: List[Window], batch_size: int) -> Iterator[Tuple[List[Window], List[Image.Image]]]:
+    """Crop tiles lazily, ``batch_size`` at a time, so only one batch of tiles is in memory"""
+    for start in range(0, len(windows), batch_size):
+        batch = windows[start:start + batch_size]
+        yield batch, [image.crop(window) for window in batch]
+
+
+def should_tile(image_size: Tuple[int, int], tile_size: int, min_scale: float) -> bool:
+    """Tile only images clearly larger than one tile (longest side > tile_size * min_scale)"""
+    return max(image_size) > tile_size * min_scale
+
+
+def predict_tiled(
+    image: Image.Image,
+    predict_fn: Callable[[List[Image.Image]], List[Optional[Dict]]],
+    tile_size: int = 640,
+    overlap: float = 0.2,
+    batch_size: int = 8,
+    include_full_image: bool = True,
+    merge_threshold: float = 0.5,
+    max_detections: int = 3000,
+) -> Optional[Dict[str, List]]:
+    """
+    Run the model on overlapping tiles and merge the results
+
+    Tiles are predicted in batches through ``predict_fn`` (the normal batched
+    prediction path, so preprocessing, NMS and thresholds are unchanged), their
+    boxes are shifted back to global coordinates and duplicates across tile
+    borders are merged with class-aware NMS on intersection over the smaller
+    box, which also removes partial boxes cut by a tile edge.
+
+    Args:
+        image: RGB PIL Image
+        predict_fn: Batched prediction function (e.g. predictor.predict_batch)
+        tile_size: Tile edge length in image pixels
+        overlap: Fraction of a tile shared with its neighbour (0 - 0.9)
+        batch_size: Tiles per forward pass
+        include_full_image: Also predict the whole (downscaled) image, for
+            objects larger than a tile
+        merge_threshold: Overlap above which same-class boxes are merged
+        max_detections: Maximum detections returned for the whole image
+
+    Returns:
+        Dictionary with boxes, classes, and confidences (None if any pass failed)
+    """
+    overlap = min(max(overlap, 0.0), 0.9)
+    windows = tile_windows(image.width, image.height, tile_size, overlap)
+
+    boxes, scores, classes = [], [], []
+
+    def collect(results: List[Optional[Dict]], offsets: List[Tuple[int, int]]) -> bool:
+        for result, (dx, dy) in zip(results, offsets):
+            if result is None:
+                return False
+            if not result["boxes"]:
+                continue
+            tile_boxes = np.asarray(result["boxes"], dtype=np.float32).reshape(-1, 4)
+            tile_boxes += np.array([dx, dy, dx, dy], dtype=np.float32)
+            boxes.append(tile_boxes)
+            scores.append(np.asarray(result["confidences"], dtype=np.float32))
+            classes.extend(result["classes"])
+        return True
+
+    if include_full_image and len(windows) > 1:
+        if not collect(predict_fn([image]), [(0, 0)]):
+            return None
+
+    for batch_windows, tiles in iter_tile_batches(image, windows, max(1, batch_size)):
+        if not collect(predict_fn(tiles), [(x1, y1) for x1, y1, _, _ in batch_windows]):
+            return None
+
+    if not boxes:
+        return {"boxes": [], "classes": [], "confidences": []}
+
+    boxes = np.concatenate(boxes)
+    scores = np.concatenate(scores)
+    class_labels, class_ids = np.unique(np.asarray(classes), return_inverse=True)
+    keep = batched_nms(boxes, scores, class_ids, merge_threshold, max_detections, metric="ios")
+    return {
+        "boxes": boxes[keep].tolist(),
+        "classes": [str(class_labels[i]) for i in class_ids[keep]],
+        "confidences": scores[keep].astype(float).tolist(),
+    }
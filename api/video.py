@@ -0,0 +1,257 @@
+"""
+Video Module
+Streaming frame decoding, batched prediction and IoU tracking for videos
+
+Usage:
+    python -m api.video field_run.mp4 --stride 5 --track --output detections.jsonl
+"""
+import argparse
+import json
+import sys
+import time
+from collections import Counter
+from typing import Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+from PIL import Image
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm', '.m4v')
+
+
+def is_video(filename: Optional[str], content_type: Optional[str]) -> bool:
+    """Whether an upload looks like a video (by content type or extension)"""
+    return (content_type or "").lower().startswith("video/") or (filename or "").lower().endswith(VIDEO_EXTENSIONS)
+
+
+class Frame:
+    """One sampled video frame"""
+    __slots__ = ("index", "timestamp_ms", "image")
+
+    def __init__(self, index: int, timestamp_ms: float, image: Image.Image):
+        self.index = index
+        self.timestamp_ms = timestamp_ms
+        self.image = image
+
+
+def iter_video_frames(path: str, stride: int = 1, max_frames: int = 0) -> Iterator[Frame]:
+    """
+    Decode a video lazily, keeping every ``stride``-th frame
+
+    Skipped frames are only grabbed (demuxed and decoded by OpenCV but never
+    converted), so sampling every 5th frame costs much less than decoding all
+    of them to RGB. At most one frame is held in memory at a time.
+
+    Args:
+        path: Video file path (anything cv2.VideoCapture opens)
+        stride: Keep one frame out of ``stride``
+        max_frames: Stop after this many sampled frames (0 = no limit)
+    """
+    import cv2
+
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError(f"Could not open video: {path}")
+    stride = max(1, stride)
+    fps = capture.get(cv2.CAP_PROP_FPS) or 0.0
+    try:
+        index = 0
+        sampled = 0
+        while True:
+            if not capture.grab():
+                break
+            if index % stride == 0:
+                ok, bgr = capture.retrieve()
+                if not ok:
+                    break
+                timestamp_ms = index * 1000.0 / fps if fps > 0 else capture.get(cv2.CAP_PROP_POS_MSEC)
+                yield Frame(index, timestamp_ms, Image.fromarray(cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)))
+                sampled += 1
+                if max_frames and sampled >= max_frames:
+                    break
+            index += 1
+    finally:
+        capture.release()
+
+
+def iter_frame_batches(frames: Iterator[Frame], batch_size: int) -> Iterator[List[Frame]]:
+    """Group frames into lists of up to ``batch_size``"""
+    batch = []
+    for frame in frames:
+        batch.append(frame)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU of [N, 4] and [M, 4] xyxy boxes"""
+    inter_w = np.clip(np.minimum(a[:, None, 2], b[None, :, 2]) - np.maximum(a[:, None, 0], b[None, :, 0]), 0, None)
+    inter_h = np.clip(np.minimum(a[:, None, 3], b[None, :, 3]) - np.maximum(a[:, None, 1], b[None, :, 1]), 0, None)
+    inter = inter_w * inter_h
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+class IoUTracker:
+    """
+    Lightweight multi-object tracker
+
+    Detections are matched to the live tracks of the same class by greedy
+    IoU assignment (highest IoU first). Matching follows ByteTrack's two
+    passes: confident detections are matched first, then the remaining low
+    confidence ones may only extend existing tracks and never start new ones.
+    A track that is not matched for more than ``max_age`` processed frames is
+    closed. Each track keeps its id, so a weed seen in many frames is counted
+    once.
+    """
+
+    def __init__(self, iou_threshold: float = 0.3, max_age: int = 5, high_confidence: float = 0.5):
+        self.iou_threshold = iou_threshold
+        self.max_age = max(0, max_age)
+        self.high_confidence = high_confidence
+        self._next_id = 1
+        self._tracks: Dict[int, Dict] = {}  # id -> {"box", "class", "missed"}
+        self._class_counts = Counter()
+
+    def _match(self, track_ids: List[int], boxes: np.ndarray, classes: List[str], candidates: List[int], assigned: Dict[int, int]):
+        """Greedily assign ``candidates`` (detection indices) to unmatched tracks"""
+        free_tracks = [t for t in track_ids if t not in assigned.values()]
+        if not free_tracks or not candidates:
+            return
+        track_boxes = np.array([self._tracks[t]["box"] for t in free_tracks], dtype=np.float32)
+        ious = _iou_matrix(track_boxes, boxes[candidates])
+        # Never match across classes
+        for i, t in enumerate(free_tracks):
+            for j, d in enumerate(candidates):
+                if self._tracks[t]["class"] != classes[d]:
+                    ious[i, j] = 0.0
+        used_tracks, used_dets = set(), set()
+        for flat in np.argsort(-ious, axis=None):
+            i, j = divmod(int(flat), len(candidates))
+            if ious[i, j] < self.iou_threshold:
+                break
+            if i in used_tracks or j in used_dets:
+                continue
+            used_tracks.add(i)
+            used_dets.add(j)
+            assigned[candidates[j]] = free_tracks[i]
+
+    def update(self, boxes: List[List[float]], classes: List[str], confidences: List[float]) -> List[Optional[int]]:
+        """
+        Feed the detections of the next processed frame
+
+        Returns:
+            Track id for each detection (None for low-confidence detections
+            that matched no existing track)
+        """
+        box_array = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        scores = np.asarray(confidences, dtype=np.float32)
+        track_ids = list(self._tracks)
+        assigned: Dict[int, int] = {}  # detection index -> track id
+
+        high = [i for i in range(len(scores)) if scores[i] >= self.high_confidence]
+        low = [i for i in range(len(scores)) if scores[i] < self.high_confidence]
+        self._match(track_ids, box_array, classes, high, assigned)
+        self._match(track_ids, box_array, classes, low, assigned)
+
+        result: List[Optional[int]] = []
+        for i in range(len(scores)):
+            track_id = assigned.get(i)
+            if track_id is None and scores[i] >= self.high_confidence:
+                track_id = self._next_id
+                self._next_id += 1
+                self._tracks[track_id] = {"class": classes[i], "missed": 0}
+                self._class_counts[classes[i]] += 1
+            if track_id is not None:
+                self._tracks[track_id]["box"] = box_array[i].tolist()
+                self._tracks[track_id]["missed"] = 0
+            result.append(track_id)
+
+        matched = set(result)
+        for track_id in track_ids:
+            if track_id not in matched:
+                self._tracks[track_id]["missed"] += 1
+                if self._tracks[track_id]["missed"] > self.max_age:
+                    del self._tracks[track_id]
+        return result
+
+    def counts(self) -> Dict[str, int]:
+        """Unique tracks started per class"""
+        return dict(self._class_counts)
+
+
+def predict_video(
+    frames: Iterator[Frame],
+    predict_fn: Callable[[List[Image.Image]], List[Optional[Dict]]],
+    batch_size: int = 8,
+    tracker: Optional[IoUTracker] = None,
+) -> Iterator[Dict]:
+    """
+    Run sampled frames through the model in batches and yield one result per frame
+
+    Yields dictionaries with frame, timestamp_ms, boxes, classes, confidences,
+    num_detections (plus track_ids with a tracker, or error for failed frames).
+    """
+    for batch in iter_frame_batches(frames, max(1, batch_size)):
+        results = predict_fn([frame.image for frame in batch])
+        for frame, predictions in zip(batch, results):
+            item = {"frame": frame.index, "timestamp_ms": round(frame.timestamp_ms, 3)}
+            if predictions is None:
+                item["error"] = "Prediction failed"
+            else:
+                item.update(predictions)
+                item["num_detections"] = len(predictions["boxes"])
+                if tracker is not None:
+                    item["track_ids"] = tracker.update(predictions["boxes"], predictions["classes"], predictions["confidences"])
+            yield item
+
+
+def video_summary(frames: int, tracker: Optional[IoUTracker], detections: int) -> Dict:
+    """Final summary line: frames processed, total detections and unique tracked objects"""
+    summary = {"summary": {"frames": frames, "detections": detections}}
+    if tracker is not None:
+        counts = tracker.counts()
+        summary["summary"]["unique_objects"] = sum(counts.values())
+        summary["summary"]["unique_objects_by_class"] = counts
+    return summary
+
+
+def main(argv=None):
+    from . import config
+    from .model_loader import load_model
+    from .predictor import predict_batch
+
+    parser = argparse.ArgumentParser(description="Detect weeds in a video, frame by frame")
+    parser.add_argument("video", help="Video file")
+    parser.add_argument("--model", default=None, help="Model path (default: auto-detect in models/)")
+    parser.add_argument("--stride", type=int, default=config.VIDEO_FRAME_STRIDE, help="Process every n-th frame")
+    parser.add_argument("--batch-size", type=int, default=config.BATCH_MAX_SIZE, help="Frames per forward pass")
+    parser.add_argument("--max-frames", type=int, default=0, help="Stop after this many processed frames")
+    parser.add_argument("--track", action="store_true", help="Assign persistent ids with the IoU tracker")
+    parser.add_argument("--output", default="-", help="JSONL output file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    load_model(args.model)
+    tracker = IoUTracker(config.TRACKER_IOU_THRESHOLD, config.TRACKER_MAX_AGE, config.TRACKER_HIGH_CONFIDENCE) if args.track else None
+    out = sys.stdout if args.output == "-" else open(args.output, "w")
+    start = time.perf_counter()
+    frames = detections = 0
+    try:
+        for item in predict_video(iter_video_frames(args.video, args.stride, args.max_frames), predict_batch, args.batch_size, tracker):
+            frames += 1
+            detections += item.get("num_detections", 0)
+            out.write(json.dumps(item) + "\n")
+        out.write(json.dumps(video_summary(frames, tracker, detections)) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - start
+    print(f"{frames} frames in {elapsed:.1f} s ({frames / elapsed if elapsed else 0:.1f} frames/s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -13,15 +13,22 @@ print(f"DEBUG: Running main.py from: {os.path.abspath(__file__)}", file=sys.stde
 print(f"DEBUG: Python executable: {sys.executable}", file=sys.stderr)
 import requests
 import io
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw, ImageFont, ImageOps
 import time
 from datetime import datetime
 import os
 import json
 from collections import Counter
+from utils import optimize_upload
 
 # Configuration
 API_URL = os.getenv("API_URL", "http://localhost:8000")
+# Upload optimization: photos are downscaled and re-encoded before they are sent,
+# the API maps the boxes back to the original resolution
+UPLOAD_OPTIMIZE = os.getenv("UPLOAD_OPTIMIZE", "true").strip().lower() in ("1", "true", "yes", "on")
+UPLOAD_MAX_SIDE = int(os.getenv("UPLOAD_MAX_SIDE", "1280"))  # longer side in pixels
+UPLOAD_FORMAT = os.getenv("UPLOAD_FORMAT", "JPEG").strip().upper()  # JPEG or WEBP
+UPLOAD_QUALITY = int(os.getenv("UPLOAD_QUALITY", "85"))
 
 # Page configuration
 st.set_page_config(
@@ -205,7 +212,7 @@ def draw_boxes(image, predictions):
     
     return image
 
-def predict_image(image_bytes, max_retries=3, initial_timeout=30):
+def predict_image(image_bytes, max_retries=3, initial_timeout=30, content_type="image/jpeg", original_size=None):
     """
     Send image to API and get predictions with retry logic
     
@@ -213,6 +220,9 @@ def predict_image(image_bytes, max_retries=3, initial_timeout=30):
         image_bytes: The image file bytes to send to the API
         max_retries: Maximum number of retry attempts
         initial_timeout: Initial timeout in seconds (will be increased with each retry)
+        content_type: MIME type of image_bytes
+        original_size: (width, height) of the photo image_bytes was downscaled
+            from; the API returns boxes in that resolution
     """
     import time
     from requests.adapters import HTTPAdapter
@@ -232,10 +242,15 @@ def predict_image(image_bytes, max_retries=3, initial_timeout=30):
     
     try:
         # Try with an initial timeout, will be increased on retries
-        files = {"file": ("image.jpg", image_bytes, "image/jpeg")}
+        extension = "webp" if content_type == "image/webp" else "jpg"
+        files = {"file": (f"image.{extension}", image_bytes, content_type)}
+        params = {}
+        if original_size is not None:
+            params = {"original_width": original_size[0], "original_height": original_size[1]}
         response = session.post(
             f"{API_URL}/predict",
             files=files,
+            params=params,
             timeout=(10, initial_timeout)  # (connect timeout, read timeout)
         )
         
@@ -253,7 +268,6 @@ def predict_image(image_bytes, max_retries=3, initial_timeout=30):
         return None
     finally:
         session.close()
-        return None
 
 def get_background_image_base64():
     """Load background image and convert to base64 for CSS embedding"""
@@ -561,7 +575,17 @@ def main():
             </div>
             """, unsafe_allow_html=True)
             
-            predictions = predict_image(image_bytes)
+            # Send a downscaled copy without metadata instead of the full-size photo
+            upload_bytes, content_type, original_size = image_bytes, "image/jpeg", None
+            if UPLOAD_OPTIMIZE:
+                try:
+                    upload_bytes, content_type, original_size = optimize_upload(
+                        image_bytes, UPLOAD_MAX_SIDE, UPLOAD_FORMAT, UPLOAD_QUALITY
+                    )
+                except Exception as e:
+                    print(f"WARNING: Could not optimize upload, sending the original: {e}", file=sys.stderr)
+            
+            predictions = predict_image(upload_bytes, content_type=content_type, original_size=original_size)
             
             # Clear loading message
             loading_placeholder.empty()
@@ -569,6 +593,7 @@ def main():
             if predictions:
                 st.session_state['last_prediction'] = {
                     'image': image_bytes,
+                    'upright': original_size is not None,  # boxes refer to the EXIF-rotated photo
                     'predictions': predictions,
                     'timestamp': datetime.now()
                 }
@@ -579,6 +604,8 @@ def main():
     if 'last_prediction' in st.session_state:
         pred_data = st.session_state['last_prediction']
         image = Image.open(io.BytesIO(pred_data['image']))
+        if pred_data.get('upright'):
+            image = ImageOps.exif_transpose(image)
         predictions = pred_data['predictions']
         
         # Draw bounding boxes with AR-style
@@ -1,8 +1,11 @@
 """Utility functions for the Streamlit app"""
 import base64
-from PIL import Image
+from PIL import Image, ImageOps
 import io
 
+# EXIF tag holding the camera orientation
+EXIF_ORIENTATION = 0x0112
+
 def image_to_base64(image):
     """Convert PIL Image to base64 string"""
     buffered = io.BytesIO()
@@ -15,3 +18,37 @@ def base64_to_image(base64_string):
     img_data = base64.b64decode(base64_string)
     return Image.open(io.BytesIO(img_data))
 
+def optimize_upload(image_bytes, max_side=1280, image_format="JPEG", quality=85):
+    """
+    Shrink a photo before uploading it
+    
+    The EXIF orientation is applied, metadata is dropped, the image is
+    downscaled so its longer side is at most max_side and re-encoded as JPEG
+    or WEBP. The API maps boxes back to the original size when it is sent
+    along (original_width/original_height).
+    
+    Returns:
+        (encoded bytes, MIME type, (width, height) of the upright original)
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    width, height = image.size
+    # Orientations 5-8 rotate by 90 degrees, so the upright photo is height x width
+    if image.getexif().get(EXIF_ORIENTATION, 1) in (5, 6, 7, 8):
+        width, height = height, width
+    
+    # JPEGs are decoded at a reduced scale that still covers max_side
+    image.draft("RGB", (max_side, max_side))
+    image = ImageOps.exif_transpose(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    
+    # Nothing but the pixels is written: no EXIF, no thumbnail, no ICC profile
+    buffered = io.BytesIO()
+    if image_format.upper() == "WEBP":
+        image.save(buffered, format="WEBP", quality=quality, method=4)
+        mime_type = "image/webp"
+    else:
+        image.save(buffered, format="JPEG", quality=quality, optimize=True)
+        mime_type = "image/jpeg"
+    return buffered.getvalue(), mime_type, (width, height)
@@ -0,0 +1,136 @@
+"""
+Postprocessing Benchmark
+Compares the vectorized postprocess_predictions against the original per-row loop
+
+Run with: python -m benchmarks.bench_postprocess
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from api.predictor import postprocess_predictions
+
+
+def legacy_postprocess(predictions, original_size, target_size=(640, 640), confidence_threshold=0.5):
+    """The original Python loop over [x, y, w, h, conf, class] rows (no NMS)"""
+    boxes = []
+    classes = []
+    confidences = []
+    scale_x = original_size[0] / target_size[0]
+    scale_y = original_size[1] / target_size[1]
+    for pred in predictions:
+        conf = pred[4]
+        if conf >= confidence_threshold:
+            x, y, w, h = pred[0:4]
+            boxes.append([float((x - w / 2) * scale_x), float((y - h / 2) * scale_y),
+                          float((x + w / 2) * scale_x), float((y + h / 2) * scale_y)])
+            confidences.append(float(conf))
+            classes.append(f"weed_class_{int(pred[5])}")
+    return {"boxes": boxes, "classes": classes, "confidences": confidences}
+
+
+def synthetic_rows(num_rows, num_classes, rng):
+    """Random [x, y, w, h, conf, class] rows in a 640x640 input, mostly low confidence like a real head"""
+    rows = np.empty((num_rows, 6), dtype=np.float32)
+    rows[:, 0:2] = rng.uniform(40, 600, size=(num_rows, 2))
+    rows[:, 2:4] = rng.uniform(8, 80, size=(num_rows, 2))
+    rows[:, 4] = rng.beta(0.3, 6, size=num_rows)
+    rows[:, 5] = rng.integers(0, num_classes, size=num_rows)
+    return rows
+
+
+def synthetic_yolov8_head(num_anchors, num_classes, rng):
+    """Random YOLOv8 head output [4 + num_classes, num_anchors] with mostly low scores"""
+    head = np.empty((4 + num_classes, num_anchors), dtype=np.float32)
+    head[0:2] = rng.uniform(40, 600, size=(2, num_anchors))
+    head[2:4] = rng.uniform(8, 80, size=(2, num_anchors))
+    head[4:] = rng.beta(0.3, 6, size=(num_classes, num_anchors))
+    return head
+
+
+def time_call(fn, repeats):
+    """Median wall time of fn() in milliseconds"""
+    fn()  # warm-up
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return float(np.median(samples))
+
+
+def check_agreement(rows, original_size, confidence_threshold):
+    """Without suppression the vectorized path must return exactly the loop's detections"""
+    legacy = legacy_postprocess(rows, original_size, confidence_threshold=confidence_threshold)
+    fast = postprocess_predictions(
+        rows, original_size,
+        confidence_threshold=confidence_threshold,
+        iou_threshold=1.0,
+        max_detections=len(rows)
+    )
+    # The loop does not clip to the image, so compare on rows that lie fully inside it
+    def _key(result):
+        return sorted(
+            (round(c, 5), cls, tuple(round(v, 2) for v in box))
+            for box, cls, c in zip(result["boxes"], result["classes"], result["confidences"])
+            if box[0] >= 0 and box[1] >= 0 and box[2] <= original_size[0] and box[3] <= original_size[1]
+        )
+    return _key(legacy) == _key(fast)
+
+
+def check_ultralytics(head):
+    """Compare against ultralytics' own NMS on the same YOLOv8 head (None if ultralytics is missing)"""
+    try:
+        import torch
+        from ultralytics.utils.ops import non_max_suppression
+    except ImportError:
+        return None
+    reference = non_max_suppression(torch.from_numpy(head[None]), conf_thres=0.25, iou_thres=0.7, max_det=300)[0]
+    reference = reference.numpy()
+    reference[:, 0:4] = reference[:, 0:4].clip(0, 640)
+    fast = postprocess_predictions(head, (640, 640))
+    if len(reference) != len(fast["boxes"]):
+        return False
+    return bool(
+        np.allclose(reference[:, 0:4], np.asarray(fast["boxes"]), atol=1e-3)
+        and np.allclose(reference[:, 4], np.asarray(fast["confidences"]), atol=1e-6)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--anchors", type=int, default=8400, help="Rows / anchors per image")
+    parser.add_argument("--classes", type=int, default=3, help="Number of classes")
+    parser.add_argument("--repeats", type=int, default=50, help="Timed repetitions")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    original_size = (4032, 3024)
+    rows = synthetic_rows(args.anchors, args.classes, rng)
+    head = synthetic_yolov8_head(args.anchors, args.classes, rng)
+
+    results = {
+        "anchors": args.anchors,
+        "classes": args.classes,
+        "legacy_loop_ms": time_call(lambda: legacy_postprocess(rows, original_size, confidence_threshold=0.25), args.repeats),
+        "vectorized_rows_ms": time_call(lambda: postprocess_predictions(rows, original_size), args.repeats),
+        "vectorized_yolov8_head_ms": time_call(lambda: postprocess_predictions(head, original_size), args.repeats),
+        "matches_legacy_without_nms": check_agreement(rows, original_size, 0.25),
+        "matches_ultralytics_nms": check_ultralytics(head),
+        "detections_before_nms": int((rows[:, 4] > 0.25).sum()),
+        "detections_after_nms": len(postprocess_predictions(rows, original_size)["boxes"]),
+    }
+    results["speedup"] = round(results["legacy_loop_ms"] / max(results["vectorized_rows_ms"], 1e-9), 2)
+
+    if args.json:
+        print(json.dumps(results))
+    else:
+        for key, value in results.items():
+            print(f"{key:>28}: {value:.3f}" if isinstance(value, float) else f"{key:>28}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Preprocessing Benchmark
+Compares pooled letterbox preprocessing against the original LANCZOS resize + copies
+
+Run with: python -m benchmarks.bench_preprocess
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+from api.preprocessing import buffer_pool, preprocess_batch
+
+
+def legacy_preprocess(image, target_size=(640, 640)):
+    """The original preprocess_image: stretch resize, then four array copies"""
+    image = image.resize(target_size, Image.LANCZOS)
+    img_array = np.array(image)
+    img_array = img_array.astype(np.float32) / 255.0
+    img_array = np.transpose(img_array, (2, 0, 1))
+    return np.expand_dims(img_array, axis=0)
+
+
+def legacy_batch(images):
+    return np.concatenate([legacy_preprocess(image) for image in images], axis=0)
+
+
+def pooled_batch(images):
+    batch, _ = preprocess_batch(images, (640, 640))
+    buffer_pool.release(batch)
+
+
+def measure(fn, images, repeats):
+    """Median milliseconds per image and peak traced allocation per call"""
+    fn(images)  # warm-up (also fills the buffer pool)
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(images)
+        samples.append((time.perf_counter() - start) * 1000.0 / len(images))
+    tracemalloc.start()
+    fn(images)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return float(np.median(samples)), peak / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--width", type=int, default=4032)
+    parser.add_argument("--height", type=int, default=3024)
+    parser.add_argument("--batch", type=int, default=8)
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, size=(args.height, args.width, 3), dtype=np.uint8)
+    images = [Image.fromarray(pixels) for _ in range(args.batch)]
+
+    legacy_ms, legacy_mb = measure(legacy_batch, images, args.repeats)
+    pooled_ms, pooled_mb = measure(pooled_batch, images, args.repeats)
+    results = {
+        "image_size": [args.width, args.height],
+        "batch": args.batch,
+        "legacy_ms_per_image": legacy_ms,
+        "pooled_ms_per_image": pooled_ms,
+        "legacy_peak_alloc_mb": legacy_mb,
+        "pooled_peak_alloc_mb": pooled_mb,
+        "speedup": round(legacy_ms / max(pooled_ms, 1e-9), 2),
+    }
+
+    if args.json:
+        print(json.dumps(results))
+    else:
+        for key, value in results.items():
+            print(f"{key:>24}: {value:.3f}" if isinstance(value, float) else f"{key:>24}: {value}")
+
+
+if __name__ == "__main__":
+    main()
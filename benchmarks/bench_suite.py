@@ -0,0 +1,328 @@
+"""
+Pipeline Benchmark Suite
+Reproducible per-stage and end-to-end latency/throughput for the serving path
+
+Every input is synthetic and the model is a tiny random ONNX graph with the
+YOLOv8 output layout (see benchmarks/synthetic.py), so the suite runs on any
+CPU-only machine without the trained weights, a GPU or network access. The
+numbers measure the serving code (decode, letterbox, NMS, SQLite, FastAPI,
+batcher and executors), not model FLOPs.
+
+Stages:
+    decode        JPEG decode, full resolution and draft (DCT-scaled)
+    preprocess    letterbox into the pooled input buffer, per batch size
+    inference     onnxruntime forward pass of the tiny model, per batch size
+    postprocess   confidence filter + per-class NMS + box rescale
+    db_write      save_prediction (one transaction per row) and save_predictions
+    predict       end-to-end POST /predict in-process at several concurrencies
+
+Run with: python -m benchmarks.bench_suite --output results.json
+Compare:  python -m benchmarks.bench_suite --compare baseline.json --tolerance 0.15
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+from PIL import Image
+
+from .synthetic import build_tiny_onnx, synthetic_jpegs
+
+SCHEMA_VERSION = 1
+
+
+def summarize(samples_ms: List[float], items: int = 1) -> Dict[str, float]:
+    """Latency percentiles and throughput for per-call samples (each call handling ``items`` items)"""
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    total_s = samples.sum() / 1000.0
+    return {
+        "n": int(samples.size),
+        "mean_ms": round(float(samples.mean()), 4),
+        "p50_ms": round(float(np.percentile(samples, 50)), 4),
+        "p95_ms": round(float(np.percentile(samples, 95)), 4),
+        "p99_ms": round(float(np.percentile(samples, 99)), 4),
+        "items_per_s": round(samples.size * items / total_s, 2) if total_s > 0 else 0.0,
+    }
+
+
+def time_calls(fn: Callable[[], object], repeats: int, warmup: int = 2) -> List[float]:
+    """Milliseconds per call of ``fn`` after ``warmup`` untimed calls"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return samples
+
+
+def bench_decode(jpegs: List[bytes], input_size: int, repeats: int) -> Dict:
+    from api.decoding import decode_image, open_image
+
+    results = {}
+    for name, size in (("full", None), ("draft", input_size)):
+        samples = []
+        for _ in range(repeats):
+            for data in jpegs:
+                start = time.perf_counter()
+                decode_image(open_image(data, 0), size)
+                samples.append((time.perf_counter() - start) * 1000.0)
+        results[name] = summarize(samples)
+    return results
+
+
+def bench_model_stages(images, session, input_size: int, batch_sizes: List[int], repeats: int) -> Dict:
+    """preprocess, inference and postprocess timed separately on the same batches"""
+    from api.predictor import _run_model, _split_batch_output, postprocess_predictions
+    from api.preprocessing import buffer_pool, preprocess_batch
+
+    target_size = (input_size, input_size)
+    results = {"preprocess": {}, "inference": {}, "postprocess": {}}
+    for batch_size in batch_sizes:
+        batch_images = [images[i % len(images)] for i in range(batch_size)]
+
+        def preprocess():
+            batch, _ = preprocess_batch(batch_images, target_size)
+            buffer_pool.release(batch)
+
+        batch, metas = preprocess_batch(batch_images, target_size)
+        try:
+            inference_samples = time_calls(lambda: _run_model(session, batch), repeats)
+            outputs = _split_batch_output(_run_model(session, batch), batch_size)
+        finally:
+            buffer_pool.release(batch)
+
+        def postprocess():
+            for output, meta in zip(outputs, metas):
+                postprocess_predictions(output, meta.original_size, target_size, letterbox=(meta.scale, meta.pad_x, meta.pad_y))
+
+        key = f"batch_{batch_size}"
+        results["preprocess"][key] = summarize(time_calls(preprocess, repeats), batch_size)
+        results["inference"][key] = summarize(inference_samples, batch_size)
+        results["postprocess"][key] = summarize(time_calls(postprocess, repeats), batch_size)
+    return results
+
+
+def bench_db_write(predictions: Dict, rows: int, batch_size: int) -> Dict:
+    from api.database import save_prediction, save_predictions
+
+    single = []
+    for i in range(rows):
+        start = time.perf_counter()
+        save_prediction(f"bench_{i}.jpg", predictions, "bench")
+        single.append((time.perf_counter() - start) * 1000.0)
+    batched = []
+    records = [(f"bench_batch_{i}.jpg", predictions, "bench") for i in range(batch_size)]
+    for _ in range(max(1, rows // batch_size)):
+        start = time.perf_counter()
+        save_predictions(records)
+        batched.append((time.perf_counter() - start) * 1000.0)
+    return {"single": summarize(single), f"batch_{batch_size}": summarize(batched, batch_size)}
+
+
+async def _predict_load(client, jpegs: List[bytes], concurrency: int, requests: int) -> Dict:
+    """Closed-loop load: ``concurrency`` clients each sending requests back to back"""
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            data = jpegs[i % len(jpegs)]
+            start = time.perf_counter()
+            response = await client.post("/predict", files={"file": (f"bench_{i}.jpg", data, "image/jpeg")})
+            elapsed = (time.perf_counter() - start) * 1000.0
+            if response.status_code == 200:
+                latencies.append(elapsed)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall_s = time.perf_counter() - start
+    result = summarize(latencies) if latencies else {"n": 0}
+    # Under concurrency the summed latencies overstate the time spent, so throughput uses wall time
+    result["items_per_s"] = round(len(latencies) / wall_s, 2) if wall_s > 0 else 0.0
+    result["errors"] = errors
+    return result
+
+
+async def bench_predict(model_path: str, jpegs: List[bytes], concurrencies: List[int], requests: int) -> Dict:
+    import httpx
+
+    from api import main as api_main
+
+    app = api_main.app
+    results = {}
+    # The app loads and warms up MODEL_PATH (set in main) in the background
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            while (ready := await client.get("/ready")).status_code != 200:
+                if ready.json()["status"] == "failed":
+                    raise RuntimeError(f"API could not load {model_path}: {ready.json().get('error')}")
+                await asyncio.sleep(0.05)
+            await _predict_load(client, jpegs, 1, min(4, requests))  # warm-up
+            for concurrency in concurrencies:
+                results[f"concurrency_{concurrency}"] = await _predict_load(client, jpegs, concurrency, requests)
+    return results
+
+
+def environment() -> Dict:
+    """Where the numbers came from, so runs can be compared meaningfully"""
+    import onnxruntime
+    from PIL import __version__ as pillow_version
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pillow": pillow_version,
+        "onnxruntime": onnxruntime.__version__,
+    }
+
+
+def flatten(results: Dict, prefix: str = "") -> Dict[str, float]:
+    """``{"a": {"b": {"p50_ms": 1}}}`` -> ``{"a.b.p50_ms": 1}`` for the comparable metrics"""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif key.endswith(("_ms", "_per_s")) and isinstance(value, (int, float)):
+            flat[name] = float(value)
+    return flat
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """
+    Regressions of ``current`` against ``baseline`` beyond ``tolerance`` (relative)
+
+    Latencies (``*_ms``) regress when they grow, throughputs (``*_per_s``)
+    when they shrink. Metrics present in only one run are ignored.
+    """
+    now, before = flatten(current["stages"]), flatten(baseline["stages"])
+    regressions = []
+    for name in sorted(now.keys() & before.keys()):
+        old, new = before[name], now[name]
+        if old <= 0:
+            continue
+        change = (new - old) / old
+        worse = change > tolerance if name.endswith("_ms") else change < -tolerance
+        if worse:
+            regressions.append(f"{name}: {old:g} -> {new:g} ({change:+.1%})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reproducible serving pipeline benchmark (CPU only, synthetic data)")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--input-size", type=int, default=640, help="Tiny model input size")
+    parser.add_argument("--images", type=int, default=8, help="Distinct synthetic images")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--batch-sizes", default="1,4,8")
+    parser.add_argument("--db-rows", type=int, default=200)
+    parser.add_argument("--concurrency", default="1,4,16", help="Client concurrency levels for /predict")
+    parser.add_argument("--requests", type=int, default=64, help="Requests per concurrency level")
+    parser.add_argument("--stages", default="decode,model,db_write,predict", help="Subset of stages to run")
+    parser.add_argument("--output", default=None, help="Write results JSON to this file")
+    parser.add_argument("--compare", default=None, help="Baseline results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative slowdown before --compare fails")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args(argv)
+
+    stages = set(args.stages.split(","))
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",") if b]
+    concurrencies = [int(c) for c in args.concurrency.split(",") if c]
+
+    workdir = tempfile.mkdtemp(prefix="cotton_weed_bench_")
+    # The API reads these at import time: keep the benchmark away from real data, and make
+    # every request do the full work (no cache hits)
+    os.environ["DB_PATH"] = os.path.join(workdir, "bench.db")
+    os.environ["UPLOAD_DIR"] = os.path.join(workdir, "uploads")
+    os.environ["PREDICTION_CACHE_ENABLED"] = "false"
+    os.environ.setdefault("MODEL_SERVING_MODE", "local")
+    os.environ.setdefault("PREFER_ONNX", "false")
+
+    model_path = build_tiny_onnx(os.path.join(workdir, "tiny.onnx"), args.input_size)
+    os.environ["MODEL_PATH"] = model_path
+    jpegs = synthetic_jpegs(args.images, (args.width, args.height))
+
+    import onnxruntime
+
+    session = onnxruntime.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+    images = [Image.open(io.BytesIO(data)).convert("RGB") for data in jpegs]
+
+    results = {}
+    if "decode" in stages:
+        results["decode"] = bench_decode(jpegs, args.input_size, max(1, args.repeats // 4))
+    if "model" in stages:
+        results.update(bench_model_stages(images, session, args.input_size, batch_sizes, args.repeats))
+    if "db_write" in stages:
+        from api.predictor import postprocess_predictions
+        sample = session.run(None, {"images": np.zeros((1, 3, args.input_size, args.input_size), dtype=np.float32)})[0][0]
+        predictions = postprocess_predictions(sample, (args.width, args.height), (args.input_size, args.input_size), confidence_threshold=0.0, max_detections=20)
+        results["db_write"] = bench_db_write(predictions, args.db_rows, max(batch_sizes))
+    if "predict" in stages:
+        results["predict"] = asyncio.run(bench_predict(model_path, jpegs, concurrencies, args.requests))
+
+    report = {
+        "schema": SCHEMA_VERSION,
+        "environment": environment(),
+        "parameters": {
+            "image_size": [args.width, args.height],
+            "input_size": args.input_size,
+            "images": args.images,
+            "repeats": args.repeats,
+            "batch_sizes": batch_sizes,
+            "concurrency": concurrencies,
+            "requests": args.requests,
+        },
+        "stages": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report))
+    else:
+        for name, value in flatten(results).items():
+            print(f"{name:>48}: {value:.3f}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("parameters") != report["parameters"]:
+            print("WARNING: baseline was recorded with different parameters", file=sys.stderr)
+        regressions = compare(report, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.compare}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""
+Synthetic Benchmark Inputs
+Deterministic test images and a tiny randomly initialized YOLOv8-shaped ONNX model
+
+Nothing here needs a GPU, the network or the trained weights.
+"""
+import io
+import os
+from typing import List, Tuple
+
+import numpy as np
+from PIL import Image
+
+# Class names written into the tiny model's metadata (same format as ultralytics exports)
+CLASS_NAMES = {0: "carpetweeds", 1: "morningglory", 2: "palmer_amaranth"}
+
+
+def synthetic_image(width: int, height: int, seed: int = 0) -> Image.Image:
+    """
+    Field-like test image: smooth soil texture with green blobs
+
+    Pure noise would be unrealistically hard for JPEG, and a flat image
+    unrealistically easy, so the texture is low-frequency noise upscaled.
+    """
+    rng = np.random.default_rng(seed)
+    small = rng.integers(60, 160, size=(max(1, height // 16), max(1, width // 16), 3), dtype=np.uint8)
+    image = np.asarray(Image.fromarray(small).resize((width, height), Image.BILINEAR)).copy()
+    for _ in range(12):
+        cx, cy = rng.integers(0, width), rng.integers(0, height)
+        r = int(rng.integers(max(2, min(width, height) // 60), max(3, min(width, height) // 15)))
+        image[max(0, cy - r):cy + r, max(0, cx - r):cx + r] = (40, int(rng.integers(150, 220)), 50)
+    return Image.fromarray(image)
+
+
+def synthetic_jpegs(count: int, size: Tuple[int, int], quality: int = 90) -> List[bytes]:
+    """Distinct JPEG-encoded synthetic images (distinct so prediction caches never hit)"""
+    encoded = []
+    for seed in range(count):
+        buffer = io.BytesIO()
+        synthetic_image(size[0], size[1], seed).save(buffer, "JPEG", quality=quality)
+        encoded.append(buffer.getvalue())
+    return encoded
+
+
+def build_tiny_onnx(path: str, input_size: int = 640, num_classes: int = len(CLASS_NAMES), seed: int = 0) -> str:
+    """
+    Write a tiny random ONNX detector with the YOLOv8 output layout
+
+    Input ``images`` [batch, 3, S, S]; output ``output0`` [batch, 4 + classes,
+    (S / 8)^2], i.e. one candidate per 8x8 cell like the stride-8 head. The
+    graph is average pool -> 1x1 conv -> sigmoid -> per-channel scale, so
+    boxes land inside the input and class scores are mostly below the
+    confidence threshold with some above, giving NMS realistic work.
+    Requires the ``onnx`` package.
+    """
+    import onnx
+    from onnx import TensorProto, helper, numpy_helper
+
+    rng = np.random.default_rng(seed)
+    channels = 4 + num_classes
+    weight = rng.normal(0, 2.0, size=(channels, 3, 1, 1)).astype(np.float32)
+    bias = np.concatenate([np.zeros(4), np.full(num_classes, -2.5)]).astype(np.float32)
+    scale = np.array([input_size, input_size, input_size / 10, input_size / 10] + [1.0] * num_classes, dtype=np.float32)
+
+    graph = helper.make_graph(
+        [
+            helper.make_node("AveragePool", ["images"], ["pooled"], kernel_shape=[8, 8], strides=[8, 8]),
+            helper.make_node("Conv", ["pooled", "weight", "bias"], ["logits"]),
+            helper.make_node("Sigmoid", ["logits"], ["activated"]),
+            helper.make_node("Mul", ["activated", "scale"], ["scaled"]),
+            helper.make_node("Reshape", ["scaled", "shape"], ["output0"]),
+        ],
+        "tiny_yolo",
+        [helper.make_tensor_value_info("images", TensorProto.FLOAT, ["batch", 3, input_size, input_size])],
+        [helper.make_tensor_value_info("output0", TensorProto.FLOAT, ["batch", channels, (input_size // 8) ** 2])],
+        [
+            numpy_helper.from_array(weight, "weight"),
+            numpy_helper.from_array(bias, "bias"),
+            numpy_helper.from_array(scale.reshape(1, channels, 1, 1), "scale"),
+            numpy_helper.from_array(np.array([0, channels, -1], dtype=np.int64), "shape"),
+        ],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 17)])
+    model.ir_version = 8
+    model.metadata_props.append(onnx.StringStringEntryProto(key="names", value=repr(CLASS_NAMES)))
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    onnx.save(model, path)
+    return path